@@ -1,15 +1,16 @@
 import argparse
 import logging
 import math
-import multiprocessing
 import re
 import sqlite3
 from collections import defaultdict
 from typing import List
 
-from lib import utils, logger
+from lib import utils, logger, worker_state
 from lib.arguments_parser import ArgumentsParser
 from lib.constants import SIMPLE_LOGGER_PREFIX
+from lib.executor import Executor
+from lib.metrics import StageMetrics
 
 
 class DeduplicateEvents:
@@ -20,28 +21,31 @@ class DeduplicateEvents:
     IS_WORD_REGEX = re.compile(r'\b\w[^\s]+\b')
     SPECIAL_CHARACTER_REGEX = re.compile(r'([\W+])')
 
-    def __init__(self) -> None:
-        self.args = self._parse_arguments()
+    def __init__(self, args: List[str] = None) -> None:
+        self.args = self._parse_arguments(args)
         self.logger = logger.set_up_script_logger(__file__, log_file=self.args.log_file, log_level=self.args.log_level)
+        self.metrics = StageMetrics(__file__)
         self.connection = utils.create_connection()
 
         if not self.args.dry_run:
             utils.check_db_views(self.connection, ["event_data_view_valid_events_only"])
 
     @staticmethod
-    def _parse_arguments() -> argparse.Namespace:
+    def _parse_arguments(args: List[str] = None) -> argparse.Namespace:
         parser = ArgumentsParser()
         parser.set_description("De-duplicates stored events.")
         parser.add_argument('--event-url', type=str, default=None,
                             help="find duplicates for event from the specified URL")
         parser.add_argument('--deduplicate-all', action='store_true', default=False,
                             help="deduplicate all events in the database; if not used, deduplicate only future ones")
-        return parser.parse_args()
+        return parser.parse_args(args)
 
     def run(self) -> None:
         all_events = self._get_input_events()
+        self.metrics.set_count('input_events', len(all_events))
         duplicates_to_mark = self._find_duplicates(all_events)
         self._update_database(duplicates_to_mark)
+        self.metrics.store(self.logger, self.args.dry_run)
         self.connection.close()
 
     def _get_input_events(self) -> dict:
@@ -124,20 +128,29 @@ class DeduplicateEvents:
 
         logger.set_up_simple_logger(SIMPLE_LOGGER_PREFIX + __file__,
                                     log_file=self.args.log_file, log_level=self.args.log_level)
+        worker_states = {
+            DeduplicateEvents.__name__: {
+                'all_events': input_events
+            }
+        }
         input_tuples = []
         if self.args.event_url is not None:
-            return [self._find_duplicates_process((1, 1, self.args.event_url, input_events))]
-        for index, event_url in enumerate(input_events):
-            input_tuples.append((index + 1, len(input_events), event_url, input_events))
+            input_tuples.append((1, 1, self.args.event_url))
+        else:
+            for index, event_url in enumerate(input_events):
+                input_tuples.append((index + 1, len(input_events), event_url))
 
-        with multiprocessing.Pool(32) as p:
-            return p.map(DeduplicateEvents._find_duplicates_process, input_tuples)
+        executor = Executor(Executor.PROCESS, self.args.workers, self.args.inline_threshold, worker_states,
+                            metrics=self.metrics)
+        return executor.map(DeduplicateEvents._find_duplicates_process, input_tuples,
+                            [input_tuple[2] for input_tuple in input_tuples])
 
     @staticmethod
-    def _find_duplicates_process(input_tuple: (int, int, str, dict)) -> dict:
+    def _find_duplicates_process(input_tuple: (int, int, str)) -> dict:
         simple_logger = logging.getLogger(SIMPLE_LOGGER_PREFIX + __file__)
+        all_events = worker_state.get(DeduplicateEvents.__name__)['all_events']
 
-        input_index, total_length, this_event_url, all_events = input_tuple
+        input_index, total_length, this_event_url = input_tuple
         this_event_dict = all_events[this_event_url]
 
         info_output = "{}/{} | De-duplicating URL: {}".format(input_index, total_length, this_event_url)
@@ -1,10 +1,12 @@
 import argparse
 import os
 import sqlite3
+from datetime import datetime, timedelta
 from typing import List
 
 from lib import utils, logger
 from lib.arguments_parser import ArgumentsParser
+from lib.html_store import HtmlStore
 
 
 class DeleteHtmlFiles:
@@ -16,8 +18,7 @@ class DeleteHtmlFiles:
         self.connection = utils.create_connection()
 
         if not self.args.dry_run:
-            utils.check_db_views(self.connection, ['event_data_view'])
-            utils.check_db_tables(self.connection, ['calendar', 'event_html'])
+            utils.check_db_tables(self.connection, ['calendar', 'event_url', 'event_html', 'http_cache', 'html_blob'])
 
     @staticmethod
     def _parse_arguments() -> argparse.Namespace:
@@ -27,34 +28,64 @@ class DeleteHtmlFiles:
         return parser.parse_args()
 
     def run(self) -> None:
-        all_file_paths, calendar_ids, event_html_ids = self._load_input_paths()
+        calendar_paths, event_html_paths = self._load_input_paths()
+        all_file_paths = self._remove_references(list(calendar_paths.values()) + list(event_html_paths.values()))
         self._delete_files(all_file_paths)
-        self._update_database(calendar_ids, event_html_ids)
+        self._update_database(list(sorted(calendar_paths.keys())), list(sorted(event_html_paths.keys())))
+        self._drop_packs()
 
-    def _load_input_paths(self) -> (List[str], List[int], List[int]):
+    def _load_input_paths(self) -> (dict, dict):
         self.logger.info("Loading input file paths...")
 
+        # rows already marked as deleted don't refer to their snapshots anymore
         query = '''
-                    SELECT calendar__id, calendar__html_file_path, 
-                           event_html__id, event_html__html_file_path
-                    FROM event_data_view
-                    WHERE calendar__downloaded_at < date('now', '-{} days')
+                    SELECT c.id, c.html_file_path, c.is_deleted,
+                           eh.id, eh.html_file_path, eh.is_deleted
+                    FROM calendar c
+                         LEFT OUTER JOIN event_url eu ON eu.calendar_id = c.id
+                         LEFT OUTER JOIN event_html eh ON eh.event_url_id = eu.id
+                    WHERE c.downloaded_at < date('now', '-{} days')
                 '''.format(self.args.days_ago)
         cursor = self.connection.execute(query)
+        old_rows = cursor.fetchall()
 
-        all_file_paths = set()
-        calendar_ids = set()
-        event_html_ids = set()
-        for calendar_id, calendar_file_path, event_html_id, event_html_file_path in cursor.fetchall():
-            if calendar_file_path is not None:
-                all_file_paths.add(calendar_file_path)
-                calendar_ids.add(calendar_id)
-            if event_html_file_path is not None:
-                all_file_paths.add(event_html_file_path)
-                event_html_ids.add(event_html_id)
+        # a snapshot which wasn't modified since is still referred to by newer rows
+        query = '''
+                    SELECT html_file_path
+                    FROM calendar
+                    WHERE downloaded_at >= date('now', '-{days_ago} days')
+                    UNION
+                    SELECT html_file_path
+                    FROM event_html
+                    WHERE downloaded_at >= date('now', '-{days_ago} days')
+                '''.format(days_ago=self.args.days_ago)
+        cursor = self.connection.execute(query)
+        recent_file_paths = set([file_path for file_path, in cursor.fetchall()])
+
+        calendar_paths = {}
+        event_html_paths = {}
+        for calendar_id, calendar_file_path, calendar_is_deleted, \
+                event_html_id, event_html_file_path, event_html_is_deleted in old_rows:
+            if calendar_file_path is not None and calendar_file_path not in recent_file_paths \
+                    and not calendar_is_deleted:
+                calendar_paths[calendar_id] = calendar_file_path
+            if event_html_file_path is not None and event_html_file_path not in recent_file_paths \
+                    and not event_html_is_deleted:
+                event_html_paths[event_html_id] = event_html_file_path
 
         self.logger.info(">> Timestamp older than: {} days ago".format(self.args.days_ago))
-        return list(sorted(all_file_paths)), list(sorted(calendar_ids)), list(sorted(event_html_ids))
+        return calendar_paths, event_html_paths
+
+    def _remove_references(self, file_paths: List[str]) -> List[str]:
+        """ Uncounts the rows' references to the snapshots and gets those no longer referred to by any row. """
+
+        unreferenced_paths = HtmlStore.remove_references(self.connection, file_paths)
+        if self.args.dry_run:
+            self.connection.rollback()
+
+        # records in pack files are dropped with their whole pack
+        return list(sorted(set([file_path for file_path in unreferenced_paths
+                                if not HtmlStore.is_pack_path(file_path)])))
 
     def _delete_files(self, all_file_paths: List[str]) -> None:
         if not self.args.dry_run:
@@ -101,6 +132,42 @@ class DeleteHtmlFiles:
 
         self.connection.commit()
 
+    def _drop_packs(self) -> None:
+        """ Drops pack files of the store older than the specified days ago. Snapshots in them still referred to
+        (by newer rows of pages not modified since) are copied to today's pack first. """
+
+        self.logger.info("Dropping old pack files...")
+
+        oldest_day = datetime.now().date() - timedelta(days=self.args.days_ago)
+        old_pack_paths = [pack_path for pack_path in HtmlStore.list_packs()
+                          if HtmlStore.get_pack_day(pack_path) < oldest_day]
+
+        relocated_count = 0
+        for pack_path in old_pack_paths:
+            referenced_paths = HtmlStore.get_pack_references(self.connection, pack_path)
+            relocated_count += len(referenced_paths)
+            if self.args.dry_run:
+                continue
+
+            for html_file_path in referenced_paths:
+                self._relocate_snapshot(html_file_path, HtmlStore.relocate(html_file_path))
+            self.connection.commit()
+            HtmlStore.drop_pack(pack_path)
+
+        self.logger.info(">> {} pack files count: {} (relocated snapshots: {})".format(
+            "Would-be-dropped" if self.args.dry_run else "Dropped", len(old_pack_paths), relocated_count))
+        if len(old_pack_paths) > 0:
+            self.logger.info('\n'.join(["List of the pack files:"] + old_pack_paths))
+
+    def _relocate_snapshot(self, html_file_path: str, new_html_file_path: str) -> None:
+        for table_name in ["calendar", "event_html", "http_cache", "html_blob"]:
+            query = '''
+                        UPDATE {}
+                        SET html_file_path = ?
+                        WHERE html_file_path = ?
+                    '''.format(table_name)
+            self.connection.execute(query, (new_html_file_path, html_file_path))
+
 
 if __name__ == '__main__':
     delete_html_files = DeleteHtmlFiles()
@@ -1,41 +1,72 @@
 import argparse
-import logging
-import multiprocessing
-import os
 import sqlite3
 import sys
 from datetime import datetime
-from typing import List
+from typing import Iterator, List
 
 from lib import utils, logger
 from lib.arguments_parser import ArgumentsParser
-from lib.constants import DATA_DIR_PATH, INPUT_SITES_BASE_FILE_PATH, SIMPLE_LOGGER_PREFIX
+from lib.cassette import Cassette
+from lib.circuit_breaker import CircuitBreaker
+from lib.constants import INPUT_SITES_BASE_FILE_PATH, SIMPLE_LOGGER_PREFIX, MAX_CONTENT_SIZE
+from lib.download_stats import DownloadStats
+from lib.downloader import Downloader
+from lib.host_scheduler import HostScheduler
+from lib.html_store import HtmlStore
+from lib.http_cache import HttpCache
+from lib.metrics import StageMetrics
+from lib.revisit_scheduler import RevisitScheduler
 
 
 class DownloadCalendars:
     """ Downloads a calendar page HTML content of input websites specified in the base file. """
 
-    def __init__(self) -> None:
-        self.args = self._parse_arguments()
+    COMMIT_INTERVAL = 100
+
+    def __init__(self, args: List[str] = None) -> None:
+        self.args = self._parse_arguments(args)
         self.logger = logger.set_up_script_logger(__file__, log_file=self.args.log_file, log_level=self.args.log_level)
+        self.metrics = StageMetrics(__file__)
         self.connection = utils.create_connection()
 
         if not self.args.dry_run:
             utils.check_file(INPUT_SITES_BASE_FILE_PATH)
-            utils.check_db_tables(self.connection, ["calendar"])
+            utils.check_db_tables(self.connection, ["calendar", "host_profile", "http_cache", "html_blob",
+                                                   "download_stats", "calendar_revisit", "circuit_breaker"])
+            HtmlStore.load_index(self.connection)
 
     @staticmethod
-    def _parse_arguments() -> argparse.Namespace:
+    def _parse_arguments(args: List[str] = None) -> argparse.Namespace:
         parser = ArgumentsParser()
         parser.set_description("Downloads a calendar page HTML content of input websites specified in the base file.")
         parser.add_argument('--domain', type=str, default=None,
                             help="download content only of the specified calendar domain")
-        return parser.parse_args()
+        parser.add_argument('--per-host-limit', type=int, default=Downloader.DEFAULT_PER_HOST_LIMIT,
+                            help="a maximal number of parallel requests to one host")
+        parser.add_argument('--host-rate', type=float, default=HostScheduler.DEFAULT_MAX_RATE,
+                            help="a maximal number of requests per second to one host")
+        parser.add_argument('--max-size', type=int, default=MAX_CONTENT_SIZE,
+                            help="a maximal size of a downloaded page in bytes")
+        parser.add_argument('--revisit-all', action='store_true', default=False,
+                            help="download all the calendars, not only the ones due by their revisit schedule")
+        parser.add_cassette_arguments()
+
+        arguments = parser.parse_args(args)
+        if arguments.replay_latency and not arguments.replay:
+            parser.error("--replay-latency requires --replay")
+
+        return arguments
 
     def run(self) -> None:
         input_calendars = self._load_input_calendars()
+        if not self.args.domain and not self.args.revisit_all:
+            input_calendars = self._filter_due_calendars(input_calendars)
+        self.metrics.set_count('input_calendars', len(input_calendars))
         calendars_to_insert = self._download_calendars(input_calendars)
         self._store_to_database(calendars_to_insert)
+        if not self.args.dry_run and not self.args.replay:
+            RevisitScheduler.load(self.connection).store(self.connection)
+        self.metrics.store(self.logger, self.args.dry_run)
         self.connection.close()
 
     def _load_input_calendars(self) -> List[dict]:
@@ -54,70 +85,139 @@ class DownloadCalendars:
         base_list = utils.get_active_base()
         return base_list
 
-    def _download_calendars(self, input_calendars: List[dict]) -> List[tuple]:
-        self.logger.info("Downloading calendars...")
-
-        logger.set_up_simple_logger(SIMPLE_LOGGER_PREFIX + __file__,
-                                    log_file=self.args.log_file, log_level=self.args.log_level)
-        timestamp = datetime.now()
-        input_tuples = []
-        for index, website_base in enumerate(input_calendars):
-            input_tuples.append((index + 1, len(input_calendars), timestamp, website_base, self.args.dry_run))
-
-        with multiprocessing.Pool(32) as p:
-            return p.map(DownloadCalendars._download_calendars_process, input_tuples)
-
-    @staticmethod
-    def _download_calendars_process(input_tuple: (int, int, datetime, dict, bool)) -> (str, str, datetime):
-        simple_logger = logging.getLogger(SIMPLE_LOGGER_PREFIX + __file__)
+    def _filter_due_calendars(self, input_calendars: List[dict]) -> List[dict]:
+        """ Filters out calendars which are not due by their revisit schedule (see lib.revisit_scheduler). """
 
-        input_index, total_length, timestamp, website_base, dry_run = input_tuple
-        url = website_base["url"]
+        scheduler = RevisitScheduler.load(self.connection)
+        due_calendars = [website_base for website_base in input_calendars if scheduler.is_due(website_base["url"])]
 
-        html_file_dir = os.path.join(DATA_DIR_PATH, website_base["domain"])
-        html_file_path = os.path.join(html_file_dir, timestamp.strftime("%Y-%m-%d_%H-%M-%S") + ".html")
+        self.logger.info(">> Calendars due by the revisit schedule: {}/{}".format(len(due_calendars),
+                                                                                  len(input_calendars)))
+        return due_calendars
 
-        os.makedirs(html_file_dir, exist_ok=True)
-        result = utils.download_html_content(url, html_file_path,
-                                             verify=website_base.get("verify", True), dry_run=dry_run)
-        if result != "200":
-            html_file_path = None
-
-        simple_logger.info("{}/{} | Downloading URL: {} | {}".format(input_index, total_length, str(url), str(result)))
+    def _download_calendars(self, input_calendars: List[dict]) -> Iterator[tuple]:
+        self.logger.info("Downloading calendars...")
 
-        return url, html_file_path, timestamp
+        simple_logger = logger.set_up_simple_logger(SIMPLE_LOGGER_PREFIX + __file__,
+                                                    log_file=self.args.log_file, log_level=self.args.log_level)
+        timestamp = datetime.now()
 
-    def _store_to_database(self, calendars_to_insert: List[tuple]) -> None:
+        if self.args.dry_run:
+            scheduler = HostScheduler(self.args.per_host_limit, self.args.host_rate)
+            breaker = None
+        else:
+            scheduler = HostScheduler.load(self.connection, self.args.per_host_limit, self.args.host_rate)
+            breaker = CircuitBreaker.load(self.connection)
+            input_calendars = self._filter_closed_calendars(input_calendars, breaker)
+
+        downloads = [(website_base["url"], None, website_base.get("verify", True)) for website_base in input_calendars]
+        cache = HttpCache.load(self.connection, [download[0] for download in downloads]) \
+            if not self.args.dry_run else None
+        downloader = Downloader(self.args.workers, scheduler, cache, self.args.dry_run, self.metrics,
+                                self.args.max_size, breaker=breaker,
+                                cassette=Cassette.from_arguments(self.args.record, self.args.replay,
+                                                                 self.args.replay_latency))
+        download_stats = DownloadStats()
+        skipped_count = 0
+        for finished_count, (index, result) in enumerate(downloader.imap(downloads)):
+            url = downloads[index][0]
+            if result['is_skipped']:
+                skipped_count += 1
+                continue
+            download_stats.record(url, url, result, timestamp)
+            if breaker is not None:
+                breaker.record(CircuitBreaker.CALENDAR, url, result['html_file_path'] is None)
+
+            simple_logger.info("{}/{} | Downloading URL: {} | {}{}".format(
+                finished_count + 1, len(downloads), str(url), str(result['status']),
+                "" if result['is_modified'] else " (not modified)"))
+            yield url, result['html_file_path'], result['encoding'], timestamp, result['is_modified']
+
+        if skipped_count > 0:
+            self.logger.info(">> Number of calendars skipped on hosts with an open circuit: {}/{}".format(
+                skipped_count, len(downloads)))
+        # state learned from responses replayed from a cassette (without their real latency) isn't kept
+        if not self.args.dry_run and not self.args.replay:
+            scheduler.store(self.connection)
+            cache.store(self.connection)
+            download_stats.store(self.connection)
+            breaker.store(self.connection)
+
+    def _filter_closed_calendars(self, input_calendars: List[dict], breaker: CircuitBreaker) -> List[dict]:
+        """ Filters out calendars whose circuit is open after their consecutive failures (see lib.circuit_breaker);
+        an open calendar is downloaded again as a probe after its backoff. """
+
+        closed_calendars = [website_base for website_base in input_calendars
+                            if breaker.allow(CircuitBreaker.CALENDAR, website_base["url"]) != CircuitBreaker.REJECT]
+
+        if len(closed_calendars) < len(input_calendars):
+            self.logger.info(">> Calendars skipped by an open circuit: {}/{}".format(
+                len(input_calendars) - len(closed_calendars), len(input_calendars)))
+        return closed_calendars
+
+    def _store_to_database(self, calendars_to_insert: Iterator[tuple]) -> None:
         if not self.args.dry_run:
-            self.logger.info("Inserting into DB...")
+            self.logger.info("Inserting into DB as the calendars are downloaded...")
 
         failed_calendars = []
+        calendars_count = 0
+        not_modified_calendars_count = 0
         for calendar_info in calendars_to_insert:
-            url, html_file_path, downloaded_at = calendar_info
+            url, html_file_path, encoding, downloaded_at, is_modified = calendar_info
+            calendars_count += 1
 
             if html_file_path is None:
                 failed_calendars.append(url)
                 continue
 
             if not self.args.dry_run:
-                query = '''
-                            INSERT INTO calendar(url, html_file_path, downloaded_at)
-                            VALUES (?, ?, ?)
-                        '''
-                values = (url, html_file_path, downloaded_at)
+                values = (url, html_file_path, encoding, downloaded_at)
 
                 try:
-                    self.connection.execute(query, values)
+                    if is_modified or not self._store_not_modified_calendar(values):
+                        query = '''
+                                    INSERT INTO calendar(url, html_file_path, encoding, downloaded_at)
+                                    VALUES (?, ?, ?, ?)
+                                '''
+                        self.connection.execute(query, values)
+                    HtmlStore.add_reference(self.connection, html_file_path)
+                    if not is_modified:
+                        not_modified_calendars_count += 1
                 except sqlite3.Error as e:
                     self.logger.error("Error occurred when storing {} into 'calendar' table: {}".format(values, str(e)))
 
+                if calendars_count % DownloadCalendars.COMMIT_INTERVAL == 0:
+                    self.connection.commit()
+
         if not self.args.dry_run:
             self.connection.commit()
 
-        self.logger.info(">> Number of failed calendars: {}/{}".format(len(failed_calendars), len(calendars_to_insert)))
+        self.logger.info(">> Number of not modified calendars: {}/{}".format(not_modified_calendars_count,
+                                                                           calendars_count))
+        self.logger.info(">> Number of failed calendars: {}/{}".format(len(failed_calendars), calendars_count))
         if len(failed_calendars) > 0:
             self.logger.warning(">> Failed calendar URLs: {}".format(failed_calendars))
 
+    def _store_not_modified_calendar(self, values: tuple) -> bool:
+        """ Stores a calendar which refers to its previous snapshot, so it is parsed only if the snapshot wasn't.
+
+        :param values: a tuple of calendar's URL, the snapshot's file path, its encoding and a timestamp of the download
+        :return: False, if there is no calendar with the snapshot to take the parsing state from
+        """
+
+        query = '''
+                    INSERT INTO calendar(url, html_file_path, encoding, downloaded_at, is_parsed, all_event_url_count)
+                    SELECT ?, html_file_path, ?, ?, is_parsed, all_event_url_count
+                    FROM calendar
+                    WHERE html_file_path = ?
+                      AND url = ?
+                    ORDER BY id DESC
+                    LIMIT 1
+                '''
+        url, html_file_path, encoding, downloaded_at = values
+        cursor = self.connection.execute(query, (url, encoding, downloaded_at, html_file_path, url))
+        return cursor.rowcount > 0
+
 
 if __name__ == '__main__':
     download_calendars = DownloadCalendars()
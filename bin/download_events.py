@@ -1,36 +1,56 @@
 import argparse
 import json
-import logging
-import multiprocessing
 import os
-import random
 import sqlite3
 import sys
 import time
 from collections import defaultdict
 from datetime import datetime
-from typing import List
+from typing import Iterator, List, Optional
 
+from bin.parse_events import ParseEvents
 from lib import utils, logger
 from lib.arguments_parser import ArgumentsParser
-from lib.constants import DATA_DIR_PATH, SIMPLE_LOGGER_PREFIX
+from lib.cassette import Cassette
+from lib.circuit_breaker import CircuitBreaker
+from lib.constants import SIMPLE_LOGGER_PREFIX, MAX_CONTENT_SIZE
+from lib.download_stats import DownloadStats
+from lib.downloader import Downloader
+from lib.event_frontier import EventFrontier
+from lib.host_scheduler import HostScheduler
+from lib.html_store import HtmlStore
+from lib.http_cache import HttpCache
+from lib.metrics import StageMetrics
+from lib.refresh_policy import RefreshPolicy
+from lib.retry_queue import RetryQueue
 
 
 class DownloadEvents:
     """ Downloads an event's page HTML content of found events' URLs. """
 
     EVENTS_FOLDER_NAME = "events"
+    COMMIT_INTERVAL = 100
+    DEFAULT_RETRY_BUDGET = 300
 
-    def __init__(self) -> None:
-        self.args = self._parse_arguments()
+    def __init__(self, args: List[str] = None) -> None:
+        self.args = self._parse_arguments(args)
         self.logger = logger.set_up_script_logger(__file__, log_file=self.args.log_file, log_level=self.args.log_level)
+        self.metrics = StageMetrics(__file__)
         self.connection = utils.create_connection()
+        self.parse_events = None
+        self.event_urls = {}
+        self.deadline = self._get_deadline()
+        # one cassette for the whole run, so repeated requests of an URL are replayed in the recorded order
+        self.cassette = Cassette.from_arguments(self.args.record, self.args.replay, self.args.replay_latency)
 
         if not self.args.dry_run:
-            utils.check_db_tables(self.connection, ["calendar", "event_url", "event_html"])
+            utils.check_db_tables(self.connection, ["calendar", "event_url", "event_html", "host_profile",
+                                                   "http_cache", "html_blob", "event_retry", "download_stats",
+                                                   "circuit_breaker"])
+            HtmlStore.load_index(self.connection)
 
     @staticmethod
-    def _parse_arguments() -> argparse.Namespace:
+    def _parse_arguments(args: List[str] = None) -> argparse.Namespace:
         parser = ArgumentsParser()
         parser.set_description("Downloads an event's page HTML content of found events' URLs.")
         parser.add_argument('--domain', type=str, default=None,
@@ -39,30 +59,130 @@ class DownloadEvents:
                             help="download only event with the specified URL")
         parser.add_argument('--redownload-file', action='store_true', default=False,
                             help="redownload content of the specified URL in --event-url; doesn't update the database")
-
-        arguments = parser.parse_args()
+        parser.add_argument('--per-host-limit', type=int, default=Downloader.DEFAULT_PER_HOST_LIMIT,
+                            help="a maximal number of parallel requests to one host")
+        parser.add_argument('--host-rate', type=float, default=HostScheduler.DEFAULT_MAX_RATE,
+                            help="a maximal number of requests per second to one host")
+        parser.add_argument('--max-size', type=int, default=MAX_CONTENT_SIZE,
+                            help="a maximal size of a downloaded page in bytes")
+        parser.add_argument('--budget', type=float, default=None,
+                            help="a maximal number of seconds to spend by downloading; the events are downloaded "
+                                 "by their priority and the rest is left for the next run")
+        parser.add_argument('--deadline', type=str, default=None,
+                            help="a time ('HH:MM' today or 'YYYY-MM-DD HH:MM') after which no other download is "
+                                 "started; the events are downloaded by their priority and the rest is left for "
+                                 "the next run")
+        parser.add_argument('--retry-budget', type=float, default=DownloadEvents.DEFAULT_RETRY_BUDGET,
+                            help="a maximal number of seconds to spend by retrying previously failed downloads "
+                                 "at the start of the run")
+        parser.add_argument('--no-refresh', action='store_true', default=False,
+                            help="don't download again pages of future events due to be refreshed "
+                                 "(see lib.refresh_policy)")
+        parser.add_argument('--pipeline', action='store_true', default=False,
+                            help="parse the events as they are downloaded (overlapping the parsing with the downloads) "
+                                 "instead of leaving them for parse_events")
+        parser.add_argument('--no-spool', action='store_true', default=False,
+                            help="hand the downloaded pages to the parsers in memory instead of reading them back "
+                                 "from the store")
+        parser.add_argument('--no-archive', action='store_true', default=False,
+                            help="don't store the downloaded pages at all (they can't be parsed again later)")
+        parser.add_cassette_arguments()
+
+        arguments = parser.parse_args(args)
         if arguments.redownload_file and not arguments.event_url:
             parser.error("--redownload-file requires --event-url")
+        if arguments.pipeline and (arguments.dry_run or arguments.redownload_file):
+            parser.error("--pipeline can't be used with --dry-run or --redownload-file")
+        if arguments.no_spool and not arguments.pipeline:
+            parser.error("--no-spool requires --pipeline")
+        if arguments.no_archive and not arguments.no_spool:
+            parser.error("--no-archive requires --no-spool")
+        if arguments.deadline is not None:
+            try:
+                DownloadEvents._parse_deadline(arguments.deadline)
+            except ValueError:
+                parser.error("--deadline has to be 'HH:MM' or 'YYYY-MM-DD HH:MM'")
+        if arguments.replay_latency and not arguments.replay:
+            parser.error("--replay-latency requires --replay")
 
         return arguments
 
     def run(self) -> None:
+        if not self.args.redownload_file:
+            retry_events = self._load_input_events(retries=True)
+            self.metrics.set_count('retry_events', len(retry_events))
+            retry_deadline = time.monotonic() + self.args.retry_budget
+            retried_events = self._download_events(retry_events, min(retry_deadline, self.deadline or retry_deadline))
+            self._store_retries_to_database(retried_events)
+
         input_events = self._load_input_events()
-        events_to_insert = self._download_events(input_events)
+        self.metrics.set_count('input_events', len(input_events))
+        if self.args.pipeline:
+            self._start_parsing(input_events)
+        events_to_insert = self._download_events(input_events, self.deadline)
         self._store_to_database(events_to_insert)
+        if self.parse_events is not None:
+            self.parse_events.finish_pipeline()
+            self.parse_events = None
+
+        if not self.args.redownload_file and not self.args.event_url and not self.args.no_refresh:
+            refresh_events = self._load_refresh_events()
+            self.metrics.set_count('refresh_events', len(refresh_events))
+            refreshed_events = self._download_events(refresh_events, self.deadline)
+            self._store_refreshes_to_database(refreshed_events)
+        self.metrics.store(self.logger, self.args.dry_run)
         self.connection.close()
 
-    def _load_input_events(self) -> List[tuple]:
-        self.logger.info("Loading input events...")
+    @staticmethod
+    def _parse_deadline(deadline: str) -> datetime:
+        if len(deadline) <= len("HH:MM"):
+            return datetime.combine(datetime.now().date(), datetime.strptime(deadline, "%H:%M").time())
+        return datetime.strptime(deadline, "%Y-%m-%d %H:%M")
+
+    def _get_deadline(self) -> Optional[float]:
+        """ Gets the time (of time.monotonic) after which no other download is started by --budget and --deadline.
+
+        :return: the earlier of the two; None, if there is no limit
+        """
+
+        deadlines = []
+        if self.args.budget is not None:
+            deadlines.append(time.monotonic() + self.args.budget)
+        if self.args.deadline is not None:
+            remaining_time = DownloadEvents._parse_deadline(self.args.deadline) - datetime.now()
+            deadlines.append(time.monotonic() + remaining_time.total_seconds())
+        return min(deadlines) if deadlines else None
+
+    def _start_parsing(self, input_events: List[tuple]) -> None:
+        """ Starts parse_events' workers to parse the events as they are downloaded and stored. """
+
+        arguments = ["--log-level", self.args.log_level]
+        if self.args.log_file:
+            arguments.extend(["--log-file", self.args.log_file])
+        if self.args.inline_threshold is not None:
+            arguments.extend(["--inline-threshold", str(self.args.inline_threshold)])
+
+        self.event_urls = {event_url_id: (event_url, calendar_url)
+                           for event_url_id, event_url, calendar_url in input_events}
+        self.parse_events = ParseEvents(arguments)
+        self.parse_events.start_pipeline(len(input_events))
+
+    def _load_input_events(self, retries: bool = False) -> List[tuple]:
+        """ Loads events to download - either new ones or, if retries, failed ones due to be retried
+        (see lib.retry_queue) - ordered by their priority (see lib.event_frontier). """
+
+        self.logger.info("Loading {}...".format("events to retry" if retries else "input events"))
 
         query = '''
                     SELECT eu.id, eu.url,
-                           c.url
+                           c.url,
+                           eu.listing_position
                     FROM event_url eu
-                         LEFT OUTER JOIN event_html eh ON eu.id = eh.event_url_id
+                         {}
                          INNER JOIN calendar c ON eu.calendar_id = c.id
                     WHERE 1 == 1
-                '''
+                '''.format("INNER JOIN event_retry er ON eu.id = er.event_url_id" if retries
+                           else "LEFT OUTER JOIN event_html eh ON eu.id = eh.event_url_id")
 
         if self.args.domain:
             website_base = utils.get_base_by_domain(self.args.domain)
@@ -78,99 +198,166 @@ class DownloadEvents:
         if self.args.event_url:
             query += ''' AND eu.url = "{}"'''.format(self.args.event_url)
 
-        if not self.args.redownload_file:
+        if retries:
+            query += ''' AND er.next_attempt_at <= "{0:%Y-%m-%d %H:%M:%S}"'''.format(datetime.now())
+        elif not self.args.redownload_file:
             query += ''' AND eh.event_url_id IS NULL'''
 
         cursor = self.connection.execute(query)
-        return cursor.fetchall()
+        input_events = cursor.fetchall()
+        listing_positions = {event_url_id: listing_position
+                             for event_url_id, _, _, listing_position in input_events}
+        return EventFrontier.load(self.connection).prioritize(
+            [(event_url_id, event_url, calendar_url) for event_url_id, event_url, calendar_url, _ in input_events],
+            listing_positions)
 
-    def _download_events(self, input_events: List[tuple]) -> List[tuple]:
-        self.logger.info("Downloading events...")
+    def _load_refresh_events(self) -> List[tuple]:
+        """ Loads parsed future events whose pages are due to be downloaded again (see lib.refresh_policy).
+        The last successful download of a page is taken from the HTTP cache (or the event's snapshot),
+        which keeps the content hash even of a page that wasn't archived (see --no-archive). """
 
-        logger.set_up_simple_logger(SIMPLE_LOGGER_PREFIX + __file__,
-                                    log_file=self.args.log_file, log_level=self.args.log_level)
-        timestamp = datetime.now()
-        events_by_calendar = defaultdict(list)
-        for event in input_events:
-            _, _, calendar_url = event
-            events_by_calendar[calendar_url].append(event)
+        self.logger.info("Loading events to refresh...")
+
+        query = '''
+                    SELECT eu.id, eu.url,
+                           c.url,
+                           min(edd.start_date),
+                           coalesce(hc.checked_at, eh.downloaded_at)
+                    FROM event_url eu
+                         INNER JOIN event_html eh ON eu.id = eh.event_url_id
+                         INNER JOIN event_data ed ON eh.id = ed.event_html_id
+                         INNER JOIN event_data_datetime edd ON ed.id = edd.event_data_id
+                         INNER JOIN calendar c ON eu.calendar_id = c.id
+                         LEFT OUTER JOIN http_cache hc ON eu.url = hc.url
+                    WHERE eu.duplicate_of IS NULL
+                      AND edd.start_date >= date('now')
+                '''
+
+        if self.args.domain:
+            website_base = utils.get_base_by_domain(self.args.domain)
+            if website_base is None:
+                self.logger.critical("Unknown domain '{}'!".format(self.args.domain))
+                sys.exit()
+            calendar_url = website_base.get('url', None)
+            if calendar_url is None:
+                self.logger.critical("Specified domain '{}' is no longer active!".format(self.args.domain))
+                sys.exit()
+            query += ''' AND c.url = "{}"'''.format(calendar_url)
+
+        query += ''' GROUP BY eu.id'''
 
-        input_tuples = []
-        for index, calendar_url in enumerate(events_by_calendar):
-            events_list = events_by_calendar[calendar_url]
-            input_tuples.append((index + 1, len(events_by_calendar), events_list, timestamp, self.args.dry_run))
+        cursor = self.connection.execute(query)
+        future_events = cursor.fetchall()
+        refresh_events = [(event_url_id, event_url, calendar_url)
+                          for event_url_id, event_url, calendar_url, start_date, checked_at in future_events
+                          if RefreshPolicy.is_due(start_date, checked_at)]
 
-        with multiprocessing.Pool(32) as p:
-            result = p.map(DownloadEvents._download_events_process, input_tuples)
+        self.logger.info(">> Future events due to be refreshed: {}/{}".format(len(refresh_events),
+                                                                              len(future_events)))
+        return refresh_events
 
-        return [result_tuple for result_list in result for result_tuple in result_list]
+    def _download_events(self, input_events: List[tuple], deadline: float = None) -> Iterator[tuple]:
+        if len(input_events) == 0:
+            return
 
-    @staticmethod
-    def _download_events_process(input_tuple: (int, int, List[tuple], datetime, bool)) -> (int, str, datetime, str):
-        time.sleep(round(random.uniform(0, 5), 2))
-        simple_logger = logging.getLogger(SIMPLE_LOGGER_PREFIX + __file__)
-
-        calendar_index, total_length, events_list, timestamp, dry_run = input_tuple
-        _, _, calendar_url = events_list[0]
-        website_base = utils.get_base_by_url(calendar_url)
-
-        current_dir = os.path.join(DATA_DIR_PATH, website_base["domain"])
-        event_file_dir = os.path.join(current_dir, DownloadEvents.EVENTS_FOLDER_NAME)
-        os.makedirs(event_file_dir, exist_ok=True)
-
-        result_list = []
-        for event_index, event in enumerate(events_list):
-            event_id, event_url, _ = event
-            event_file_name = timestamp.strftime("%Y-%m-%d_%H-%M-%S") + "_" + str(event_id)
-            html_file_path = os.path.join(event_file_dir, event_file_name + ".html")
-
-            result = utils.download_html_content(event_url, html_file_path,
-                                                 encoding=website_base.get("encoding", None),
-                                                 verify=website_base.get("verify", None), dry_run=dry_run)
-            if result != "200":
-                html_file_path = None
-
-            simple_logger.info(
-                "{}/{} ({}/{}) | Downloading URL: {} | {}".format(calendar_index, total_length, event_index + 1,
-                                                                  len(events_list), str(event_url), str(result)))
-
-            result_list.append((event_id, html_file_path, timestamp, result))
-        return result_list
-
-    def _store_to_database(self, events_to_insert: List[tuple]) -> None:
+        self.logger.info("Downloading events...")
+
+        simple_logger = logger.set_up_simple_logger(SIMPLE_LOGGER_PREFIX + __file__,
+                                                    log_file=self.args.log_file, log_level=self.args.log_level)
+        timestamp = datetime.now()
+        base_dict = utils.get_base_dict_per_url()
+        downloads = []
+        for event in input_events:
+            _, event_url, calendar_url = event
+            website_base = base_dict[calendar_url]
+            downloads.append((event_url, website_base.get("encoding", None), website_base.get("verify", None)))
+
+        if self.args.dry_run:
+            scheduler = HostScheduler(self.args.per_host_limit, self.args.host_rate)
+            cache = None
+            breaker = None
+        else:
+            scheduler = HostScheduler.load(self.connection, self.args.per_host_limit, self.args.host_rate)
+            cache = HttpCache.load(self.connection, [download[0] for download in downloads])
+            breaker = CircuitBreaker.load(self.connection)
+        # pages of the retried events are never parsed right away, so they are always kept in the store
+        downloader = Downloader(self.args.workers, scheduler, cache, self.args.dry_run, self.metrics,
+                                self.args.max_size, keep_content=self.parse_events is not None and self.args.no_spool,
+                                archive=self.parse_events is None or not self.args.no_archive, breaker=breaker,
+                                cassette=self.cassette)
+        download_stats = DownloadStats()
+        skipped_counts = defaultdict(int)
+        for finished_count, (index, result) in enumerate(downloader.imap(downloads, deadline)):
+            event_id, event_url, calendar_url = input_events[index]
+            if result['is_skipped']:
+                skipped_counts[result['status']] += 1
+                continue
+            download_stats.record(event_url, calendar_url, result, timestamp)
+
+            simple_logger.info("{}/{} | Downloading URL: {} | {}{}".format(
+                finished_count + 1, len(downloads), str(event_url), str(result['status']),
+                "" if result['is_modified'] else " (not modified)"))
+            yield event_id, result['html_file_path'], result['encoding'], timestamp, result['status'], \
+                RetryQueue.classify(result), result['content'], result['is_modified']
+
+        if skipped_counts[Downloader.DEADLINE_STATUS] > 0:
+            self.logger.info(">> Number of events left for the next run after the time budget: {}/{}".format(
+                skipped_counts[Downloader.DEADLINE_STATUS], len(downloads)))
+        if skipped_counts[Downloader.CIRCUIT_OPEN_STATUS] > 0:
+            self.logger.info(">> Number of events skipped on hosts with an open circuit: {}/{}".format(
+                skipped_counts[Downloader.CIRCUIT_OPEN_STATUS], len(downloads)))
+        # state learned from responses replayed from a cassette (without their real latency) isn't kept
+        if not self.args.dry_run and not self.args.replay:
+            scheduler.store(self.connection)
+            cache.store(self.connection)
+            download_stats.store(self.connection)
+            breaker.store(self.connection)
+
+    def _store_to_database(self, events_to_insert: Iterator[tuple]) -> None:
         if self.args.redownload_file:
-            if not self.args.dry_run:
-                _, html_file_path, _ = events_to_insert[0]
-                print("File was re-downloaded to: {}".format(html_file_path))
+            for _, html_file_path, _, _, _, _, _, _ in events_to_insert:
+                if not self.args.dry_run:
+                    print("File was re-downloaded to: {}".format(html_file_path))
             return
 
         if not self.args.dry_run:
-            self.logger.info("Inserting into DB...")
+            self.logger.info("Inserting into DB as the events are downloaded...")
 
         error_dict = defaultdict(int)
         failed_url_ids = []
         event_url_ids = []
         for event_info in events_to_insert:
-            event_url_id, html_file_path, downloaded_at, status_code = event_info
+            event_url_id, html_file_path, encoding, downloaded_at, status_code, error_class, content, _ = event_info
             event_url_ids.append(event_url_id)
             error_dict[status_code] += 1
 
-            if html_file_path is None:
+            if error_class is not None:
                 failed_url_ids.append(event_url_id)
 
             if not self.args.dry_run:
                 query = '''
-                            INSERT INTO event_html(html_file_path, downloaded_at, event_url_id)
-                            VALUES(?, ?, ?)
+                            INSERT INTO event_html(html_file_path, encoding, downloaded_at, event_url_id)
+                            VALUES(?, ?, ?, ?)
                         '''
-                values = (html_file_path, downloaded_at, event_url_id)
+                values = (html_file_path, encoding, downloaded_at, event_url_id)
 
                 try:
-                    self.connection.execute(query, values)
+                    cursor = self.connection.execute(query, values)
+                    HtmlStore.add_reference(self.connection, html_file_path)
+                    if error_class is not None:
+                        RetryQueue.record_failure(self.connection, event_url_id, error_class, status_code,
+                                                  downloaded_at)
+                    elif self.parse_events is not None:
+                        event_url, calendar_url = self.event_urls[event_url_id]
+                        self.parse_events.submit_event((cursor.lastrowid, html_file_path, encoding, event_url,
+                                                        calendar_url), content)
                 except sqlite3.Error as e:
                     failed_url_ids.append(event_url_id)
                     self.logger.error(
                         "Error occurred when storing {} into 'event_html' table: {}".format(values, str(e)))
+
+                if len(event_url_ids) % DownloadEvents.COMMIT_INTERVAL == 0:
+                    self.connection.commit()
         if not self.args.dry_run:
             self.connection.commit()
 
@@ -179,6 +366,129 @@ class DownloadEvents:
         if len(failed_url_ids) > 0:
             self.logger.warning(">> Failed event_url IDs: {}".format(failed_url_ids))
 
+    def _store_retries_to_database(self, retried_events: Iterator[tuple]) -> None:
+        """ Stores results of the retried downloads - a successful one fills the event's failed 'event_html' row
+        to be parsed, a failed one is scheduled for the next attempt or given up. """
+
+        retried_count = 0
+        recovered_count = 0
+        given_up_url_ids = []
+        for event_url_id, html_file_path, encoding, downloaded_at, status_code, error_class, _, _ in retried_events:
+            retried_count += 1
+            if self.args.dry_run:
+                recovered_count += 1 if error_class is None else 0
+                continue
+
+            try:
+                if error_class is None:
+                    self._store_recovered_event(event_url_id, html_file_path, encoding, downloaded_at)
+                    RetryQueue.record_success(self.connection, event_url_id)
+                    recovered_count += 1
+                elif not RetryQueue.record_failure(self.connection, event_url_id, error_class, status_code,
+                                                   downloaded_at):
+                    given_up_url_ids.append(event_url_id)
+            except sqlite3.Error as e:
+                self.logger.error("Error occurred when storing a retried download of event_url ID {}: {}".format(
+                    event_url_id, str(e)))
+
+            if retried_count % DownloadEvents.COMMIT_INTERVAL == 0:
+                self.connection.commit()
+        if not self.args.dry_run:
+            self.connection.commit()
+
+        if retried_count > 0:
+            self.logger.info(">> Number of recovered events: {}/{}".format(recovered_count, retried_count))
+        if len(given_up_url_ids) > 0:
+            self.logger.warning(">> Given-up event_url IDs: {}".format(given_up_url_ids))
+
+    def _store_recovered_event(self, event_url_id: int, html_file_path: str, encoding: str,
+                               downloaded_at: datetime) -> None:
+        query = '''
+                    UPDATE event_html
+                    SET html_file_path = ?, encoding = ?, downloaded_at = ?, is_parsed = 0
+                    WHERE event_url_id = ?
+                      AND html_file_path IS NULL
+                '''
+        values = (html_file_path, encoding, downloaded_at, event_url_id)
+        updated_count = self.connection.execute(query, values).rowcount
+        if updated_count == 0:
+            query = '''
+                        INSERT INTO event_html(html_file_path, encoding, downloaded_at, event_url_id)
+                        VALUES(?, ?, ?, ?)
+                    '''
+            self.connection.execute(query, values)
+            updated_count = 1
+        HtmlStore.add_reference(self.connection, html_file_path, updated_count)
+
+    def _store_refreshes_to_database(self, refreshed_events: Iterator[tuple]) -> None:
+        """ Stores results of the refreshed downloads - only a page whose content has changed (by its hash)
+        replaces the event's snapshot to be parsed again, a failed one is just refreshed the next time. """
+
+        refreshed_count = 0
+        changed_url_ids = []
+        failed_count = 0
+        for event_url_id, html_file_path, encoding, downloaded_at, _, error_class, _, is_modified in refreshed_events:
+            refreshed_count += 1
+            if error_class is not None:
+                failed_count += 1
+                continue
+            if not is_modified:
+                continue
+
+            changed_url_ids.append(event_url_id)
+            if self.args.dry_run:
+                continue
+
+            try:
+                self._store_refreshed_event(event_url_id, html_file_path, encoding, downloaded_at)
+            except sqlite3.Error as e:
+                self.logger.error("Error occurred when storing a refreshed download of event_url ID {}: {}".format(
+                    event_url_id, str(e)))
+
+            if len(changed_url_ids) % DownloadEvents.COMMIT_INTERVAL == 0:
+                self.connection.commit()
+        if not self.args.dry_run:
+            self.connection.commit()
+
+        if refreshed_count > 0:
+            self.logger.info(">> Number of changed refreshed events: {}/{} ({} failed)".format(
+                len(changed_url_ids), refreshed_count, failed_count))
+        if len(changed_url_ids) > 0:
+            self.logger.debug(">> Changed event_url IDs: {}".format(changed_url_ids))
+
+    def _store_refreshed_event(self, event_url_id: int, html_file_path: str, encoding: str,
+                               downloaded_at: datetime) -> None:
+        """ Replaces the event's snapshot by the changed one, so parse_events parses it again
+        (and replaces the event's data, which makes the enriching stages process it again). """
+
+        query = '''
+                    SELECT id, html_file_path, is_deleted
+                    FROM event_html
+                    WHERE event_url_id = ?
+                      AND html_file_path IS NOT NULL
+                    ORDER BY id DESC
+                '''
+        row = self.connection.execute(query, (event_url_id,)).fetchone()
+        if row is None:
+            # the event's page wasn't archived (see --no-archive), so the refreshed page becomes its snapshot
+            self._store_recovered_event(event_url_id, html_file_path, encoding, downloaded_at)
+            return
+        event_html_id, old_html_file_path, is_deleted = row
+
+        query = '''
+                    UPDATE event_html
+                    SET html_file_path = ?, encoding = ?, downloaded_at = ?, is_parsed = 0, is_deleted = 0
+                    WHERE id = ?
+                '''
+        self.connection.execute(query, (html_file_path, encoding, downloaded_at, event_html_id))
+        HtmlStore.add_reference(self.connection, html_file_path)
+
+        # a deleted snapshot isn't referred to anymore; records in pack files are dropped with their whole pack
+        if not is_deleted:
+            for file_path in HtmlStore.remove_references(self.connection, [old_html_file_path]):
+                if not HtmlStore.is_pack_path(file_path) and os.path.isfile(file_path):
+                    os.remove(file_path)
+
 
 if __name__ == '__main__':
     download_events = DownloadEvents()
@@ -0,0 +1,247 @@
+import argparse
+import json
+import logging
+import sqlite3
+import sys
+from collections import defaultdict
+from typing import List
+
+from bin.extract_keywords import ExtractKeywords
+from bin.geocode_location import GeocodeLocation
+from bin.process_datetime import ProcessDatetime
+from bin.unify_types import UnifyTypes
+from lib import utils, logger
+from lib.arguments_parser import ArgumentsParser
+from lib.constants import SIMPLE_LOGGER_PREFIX
+from lib.executor import Executor
+from lib.metrics import StageMetrics
+
+
+class EnrichEvents:
+    """ Processes datetime, geo-codes location, extracts keywords and unifies types of parsed events in one pass. """
+
+    BATCH_SIZE = 500
+
+    def __init__(self, args: List[str] = None) -> None:
+        self.args = self._parse_arguments(args)
+        self.logger = logger.set_up_script_logger(__file__, log_file=self.args.log_file, log_level=self.args.log_level)
+        self.metrics = StageMetrics(__file__)
+        self.connection = utils.create_connection()
+
+        if not self.args.dry_run:
+            utils.check_db_tables(self.connection, ["calendar", "event_url", "event_html", "event_data",
+                                                    "event_data_datetime", "event_data_gps", "event_data_keywords",
+                                                    "event_data_types"])
+
+    @staticmethod
+    def _parse_arguments(args: List[str] = None) -> argparse.Namespace:
+        parser = ArgumentsParser()
+        parser.set_description("Processes datetime, geo-codes location, extracts keywords and unifies types "
+                               "of parsed events in one pass.")
+        parser.add_argument('--events-ids', type=int, nargs="*",
+                            help="enrich only events with the specified event_data IDs")
+        return parser.parse_args(args)
+
+    def run(self) -> None:
+        input_events = self._load_input_events()
+        self.metrics.set_count('input_events', len(input_events))
+        self.logger.info("Loading czech municipalities, custom keywords and custom types...")
+        municipalities = GeocodeLocation._load_municipalities_csv()
+        keywords_dict = ExtractKeywords._prepare_keywords_dict()
+        types_mapping = UnifyTypes._prepare_types()
+        geocoded_events = self._enrich_events(input_events, municipalities, keywords_dict, types_mapping)
+        self._store_geocoding_stats(geocoded_events)
+        self.metrics.store(self.logger, self.args.dry_run)
+        self.connection.close()
+
+    def _load_input_events(self) -> List[tuple]:
+        self.logger.info("Loading input events...")
+
+        query = '''
+                    SELECT ed.id, ed.title, ed.perex, ed.datetime, ed.location, ed.gps, ed.types,
+                           eu.url,
+                           c.url,
+                           EXISTS (SELECT 1 FROM event_data_datetime WHERE event_data_id = ed.id) AS has_datetime,
+                           EXISTS (SELECT 1 FROM event_data_gps WHERE event_data_id = ed.id) AS has_gps,
+                           EXISTS (SELECT 1 FROM event_data_keywords WHERE event_data_id = ed.id) AS has_keywords,
+                           EXISTS (SELECT 1 FROM event_data_types WHERE event_data_id = ed.id) AS has_types
+                    FROM event_data ed
+                         INNER JOIN event_html eh ON ed.event_html_id = eh.id
+                         INNER JOIN event_url eu ON eh.event_url_id = eu.id
+                         INNER JOIN calendar c ON eu.calendar_id = c.id
+                    WHERE 1 == 1
+                '''
+
+        if self.args.events_ids:
+            query += ''' AND ed.id IN ({})'''.format(",".join(["{}".format(event_id)
+                                                               for event_id in self.args.events_ids]))
+
+        query = '''
+                    SELECT *
+                    FROM ({})
+                    WHERE has_datetime == 0 OR has_gps == 0 OR has_keywords == 0 OR has_types == 0
+                '''.format(query)
+
+        cursor = self.connection.execute(query)
+        input_events = cursor.fetchall()
+
+        stored_keywords = self._load_stored_keywords([event[0] for event in input_events
+                                                      if event[11] and not event[12]])
+        return [event + (stored_keywords[event[0]],) for event in input_events]
+
+    def _load_stored_keywords(self, events_ids: List[int]) -> dict:
+        stored_keywords = defaultdict(list)
+        if len(events_ids) == 0:
+            return stored_keywords
+
+        query = '''
+                    SELECT event_data_id, keyword, source
+                    FROM event_data_keywords
+                    WHERE keyword IS NOT NULL
+                      AND event_data_id IN ({})
+                '''.format(",".join([str(event_id) for event_id in events_ids]))
+        cursor = self.connection.execute(query)
+
+        for event_data_id, keyword, source in cursor.fetchall():
+            stored_keywords[event_data_id].append((keyword, source))
+        return stored_keywords
+
+    def _enrich_events(self, input_events: List[tuple], municipalities: List[dict], keywords_dict: dict,
+                       types_mapping: dict) -> List[dict]:
+        self.logger.info("Enriching events...")
+
+        for file_path in [__file__] + [sys.modules[stage_class.__module__].__file__
+                                       for stage_class in [ProcessDatetime, GeocodeLocation, ExtractKeywords,
+                                                           UnifyTypes]]:
+            logger.set_up_simple_logger(SIMPLE_LOGGER_PREFIX + file_path,
+                                        log_file=self.args.log_file, log_level=self.args.log_level)
+        worker_states = {}
+        worker_states.update(GeocodeLocation._get_worker_states(municipalities))
+        worker_states.update(ExtractKeywords._get_worker_states(keywords_dict))
+        worker_states.update(UnifyTypes._get_worker_states(types_mapping))
+        input_tuples = []
+        for index, event in enumerate(input_events):
+            website_base = utils.get_base_by_url(event[8])
+            input_tuples.append((index + 1, len(input_events), event, website_base))
+
+        geocoded_events = []
+        batch = []
+        executor = Executor(Executor.PROCESS, self.args.workers, self.args.inline_threshold, worker_states,
+                            metrics=self.metrics)
+        for enriched_event in executor.imap(EnrichEvents._enrich_events_process, input_tuples,
+                                            [event[7] for event in input_events]):
+            batch.append(enriched_event)
+            if enriched_event['gps'] is not None:
+                geocoded_events.append(enriched_event['gps'])
+            if len(batch) == EnrichEvents.BATCH_SIZE:
+                self._store_to_database(batch)
+                batch = []
+        self._store_to_database(batch)
+
+        return geocoded_events
+
+    @staticmethod
+    def _enrich_events_process(input_tuple: (int, int, tuple, dict)) -> dict:
+        simple_logger = logging.getLogger(SIMPLE_LOGGER_PREFIX + __file__)
+
+        input_index, total_length, event, website_base = input_tuple
+        event_data_id, title, perex, event_datetime, location, gps, types, event_url, calendar_url, \
+            has_datetime, has_gps, has_keywords, has_types, stored_keywords = event
+
+        enriched_event = {
+            'id': event_data_id,
+            'datetimes': None,
+            'gps': None,
+            'keywords': None,
+            'types': None
+        }
+
+        if not has_datetime:
+            datetime_tuple = (event_data_id, event_datetime, event_url, calendar_url)
+            enriched_event['datetimes'], _ = ProcessDatetime._process_datetimes_process(
+                (input_index, total_length, datetime_tuple, website_base))
+
+        if not has_gps:
+            gps_tuple = (event_data_id, title, perex, location, gps, calendar_url)
+            enriched_event['gps'] = GeocodeLocation._geocode_locations_process(
+                (input_index, total_length, gps_tuple))
+
+        keywords = stored_keywords
+        if not has_keywords:
+            keywords_tuple = (event_data_id, title, perex, types)
+            _, keywords, _, _, _ = ExtractKeywords._extract_keywords_process(
+                (input_index, total_length, keywords_tuple))
+            enriched_event['keywords'] = keywords
+
+        if not has_types:
+            types_dict = {
+                'id': event_data_id,
+                'title': title,
+                'types': json.loads(types) if types else [],
+                'keywords': defaultdict(list)
+            }
+            for keyword, source in keywords:
+                types_dict['keywords'][source].append(keyword)
+            _, enriched_event['types'], _ = UnifyTypes._unify_types_process(
+                (input_index, total_length, types_dict))
+
+        simple_logger.debug("{}/{} | Enriched event: {}".format(input_index, total_length, event_data_id))
+
+        return enriched_event
+
+    def _store_to_database(self, enriched_events: List[dict]) -> None:
+        if self.args.dry_run or len(enriched_events) == 0:
+            return
+
+        self.logger.info("Inserting a batch of {} events into DB...".format(len(enriched_events)))
+
+        datetime_rows, gps_rows, keywords_rows, types_rows = [], [], [], []
+        for enriched_event in enriched_events:
+            event_data_id = enriched_event['id']
+            if enriched_event['datetimes'] is not None:
+                datetime_rows.extend(ProcessDatetime._get_rows_to_insert(enriched_event['datetimes'], event_data_id))
+            if enriched_event['gps'] is not None:
+                gps_rows.append(GeocodeLocation._get_values_to_insert(enriched_event['gps']))
+            if enriched_event['keywords'] is not None:
+                keywords_rows.extend(ExtractKeywords._get_rows_to_insert(event_data_id, enriched_event['keywords']))
+            if enriched_event['types'] is not None:
+                types_rows.extend(UnifyTypes._get_rows_to_insert(event_data_id, enriched_event['types']))
+
+        queries = [('''
+                        INSERT OR IGNORE INTO event_data_datetime(start_date, start_time, end_date, end_time, event_data_id)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', datetime_rows),
+                   ('''
+                        INSERT OR IGNORE INTO event_data_gps(online, has_default, gps, location, municipality, district, event_data_id)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''', gps_rows),
+                   ('''
+                        INSERT OR IGNORE INTO event_data_keywords(keyword, source, event_data_id)
+                        VALUES (?, ?, ?)
+                    ''', keywords_rows),
+                   ('''
+                        INSERT OR IGNORE INTO event_data_types(type, event_data_id)
+                        VALUES (?, ?)
+                    ''', types_rows)]
+
+        try:
+            for query, values in queries:
+                self.connection.executemany(query, values)
+            self.connection.commit()
+        except sqlite3.Error as e:
+            self.connection.rollback()
+            self.logger.error("Error occurred when storing a batch of event_data IDs {} into DB: {}".format(
+                [enriched_event['id'] for enriched_event in enriched_events], str(e)))
+
+    def _store_geocoding_stats(self, geocoded_events: List[dict]) -> None:
+        self.logger.info("Preparing geocoding statistics...")
+
+        result_dict, without_default_online = GeocodeLocation._prepare_stats(geocoded_events)
+        if not self.args.dry_run:
+            utils.store_to_json_file(result_dict, GeocodeLocation.OUTPUT_FILE_PATH)
+        GeocodeLocation._log_stats(self.logger, result_dict, without_default_online)
+
+
+if __name__ == '__main__':
+    enrich_events = EnrichEvents()
+    enrich_events.run()
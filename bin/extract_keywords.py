@@ -1,14 +1,15 @@
 import argparse
 import json
 import logging
-import multiprocessing
 import re
 import sqlite3
 from typing import List
 
-from lib import utils, logger
+from lib import utils, logger, worker_state
 from lib.arguments_parser import ArgumentsParser
 from lib.constants import SIMPLE_LOGGER_PREFIX
+from lib.executor import Executor
+from lib.metrics import StageMetrics
 
 
 class ExtractKeywords:
@@ -16,29 +17,33 @@ class ExtractKeywords:
 
     EVENT_KEYWORDS_JSON_FILE_PATH = "resources/event_keywords.json"
 
-    def __init__(self) -> None:
-        self.args = self._parse_arguments()
+    def __init__(self, args: List[str] = None) -> None:
+        self.args = self._parse_arguments(args)
         self.logger = logger.set_up_script_logger(__file__, log_file=self.args.log_file, log_level=self.args.log_level)
+        self.metrics = StageMetrics(__file__)
         self.connection = utils.create_connection()
 
         if not self.args.dry_run:
             utils.check_db_tables(self.connection, ["event_data", "event_data_keywords"])
 
     @staticmethod
-    def _parse_arguments() -> argparse.Namespace:
+    def _parse_arguments(args: List[str] = None) -> argparse.Namespace:
         parser = ArgumentsParser()
         parser.set_description("Extracts keywords of parsed events.")
         parser.add_argument('--events-ids', type=int, nargs="*",
                             help="extract keywords only from events with the specified event_data IDs")
         parser.add_argument('--extract-all', action='store_true', default=False,
                             help="extract keywords even from already processed events")
-        return parser.parse_args()
+        return parser.parse_args(args)
 
     def run(self) -> None:
         input_events = self._load_input_events()
+        self.metrics.set_count('input_events', len(input_events))
+        self.logger.info("Preparing custom keywords...")
         keywords_dict = self._prepare_keywords_dict()
         keywords_to_insert = self._extract_keywords(input_events, keywords_dict)
         self._store_to_db(keywords_to_insert)
+        self.metrics.store(self.logger, self.args.dry_run)
         self.connection.close()
 
     def _load_input_events(self) -> List[tuple]:
@@ -61,9 +66,8 @@ class ExtractKeywords:
         cursor = self.connection.execute(query)
         return cursor.fetchall()
 
-    def _prepare_keywords_dict(self) -> dict:
-        self.logger.info("Preparing custom keywords...")
-
+    @staticmethod
+    def _prepare_keywords_dict() -> dict:
         with open(ExtractKeywords.EVENT_KEYWORDS_JSON_FILE_PATH, 'r') as keywords_file:
             keywords_mapping = json.load(keywords_file)
             for keyword in keywords_mapping:
@@ -75,19 +79,30 @@ class ExtractKeywords:
 
         logger.set_up_simple_logger(SIMPLE_LOGGER_PREFIX + __file__,
                                     log_file=self.args.log_file, log_level=self.args.log_level)
+        worker_states = ExtractKeywords._get_worker_states(keywords_dict)
         input_tuples = []
         for index, event in enumerate(input_events):
-            input_tuples.append((index + 1, len(input_events), event, keywords_dict))
+            input_tuples.append((index + 1, len(input_events), event))
+
+        executor = Executor(Executor.PROCESS, self.args.workers, self.args.inline_threshold, worker_states,
+                            metrics=self.metrics)
+        return executor.map(ExtractKeywords._extract_keywords_process, input_tuples,
+                            ["event_data {}".format(event[0]) for event in input_events])
 
-        with multiprocessing.Pool(32) as p:
-            return p.map(ExtractKeywords._extract_keywords_process, input_tuples)
+    @staticmethod
+    def _get_worker_states(keywords_dict: dict) -> dict:
+        return {
+            ExtractKeywords.__name__: {
+                'keywords_dict': keywords_dict
+            }
+        }
 
     @staticmethod
-    def _extract_keywords_process(input_tuple: (int, int, (int, str, str, str),
-                                                dict)) -> (int, List[tuple], str, str, str):
+    def _extract_keywords_process(input_tuple: (int, int, (int, str, str, str))) -> (int, List[tuple], str, str, str):
         simple_logger = logging.getLogger(SIMPLE_LOGGER_PREFIX + __file__)
+        keywords_dict = worker_state.get(ExtractKeywords.__name__)['keywords_dict']
 
-        input_index, total_length, event, keywords_dict = input_tuple
+        input_index, total_length, event = input_tuple
         event_data_id, title, perex, types = event
 
         info_output = "{}/{} | Extracting keywords from: {}".format(input_index, total_length, event_data_id)
@@ -130,6 +145,12 @@ class ExtractKeywords:
 
         return event_data_id, list(matched_keywords), title, perex, types
 
+    @staticmethod
+    def _get_rows_to_insert(event_data_id: int, matched_keywords: List[tuple]) -> List[tuple]:
+        if len(matched_keywords) == 0:
+            return [(None, None, event_data_id)]
+        return [(event_keyword, source, event_data_id) for event_keyword, source in matched_keywords]
+
     def _store_to_db(self, keywords_to_insert: List[tuple]) -> None:
         self.logger.info("Inserting into DB...")
 
@@ -143,22 +164,18 @@ class ExtractKeywords:
                 'types': types,
                 'matched_keywords': matched_keywords
             }
-            values = []
             if len(matched_keywords) == 0:
                 nok += 1
                 events_without_keywords.append(event_data_id)
-                values = ['({}, {}, {})'.format("null", "null", str(event_data_id))]
-            else:
-                for event_keyword, source in matched_keywords:
-                    values.append('("{}", "{}", {})'.format(event_keyword, source, str(event_data_id)))
+            values = ExtractKeywords._get_rows_to_insert(event_data_id, matched_keywords)
 
             if not self.args.dry_run:
                 query = '''
                             INSERT OR IGNORE INTO event_data_keywords(keyword, source, event_data_id)
-                            VALUES {}
-                        '''.format(', '.join(values))
+                            VALUES (?, ?, ?)
+                        '''
                 try:
-                    self.connection.execute(query)
+                    self.connection.executemany(query, values)
                 except sqlite3.Error as e:
                     self.logger.error(
                         "Error occurred when storing {} into 'event_data_types' table: {}".format(values, str(e)))
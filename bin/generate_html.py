@@ -11,6 +11,7 @@ from typing import List, Set
 from lib import utils, logger
 from lib.arguments_parser import ArgumentsParser
 from lib.constants import EVENT_TYPES_JSON_FILE_PATH
+from lib.metrics import StageMetrics
 
 
 class GenerateHTML:
@@ -24,9 +25,10 @@ class GenerateHTML:
     CRAWLER_STATUS_GENERATED_HTML_FILE_PATH = os.path.join(TEMP_WEB_FOLDER, "crawler_status.html")
     FALLBACK_EVENT_TYPE = "ostatní"
 
-    def __init__(self) -> None:
-        self.args = self._parse_arguments()
+    def __init__(self, args: List[str] = None) -> None:
+        self.args = self._parse_arguments(args)
         self.logger = logger.set_up_script_logger(__file__, log_file=self.args.log_file, log_level=self.args.log_level)
+        self.metrics = StageMetrics(__file__)
         self.connection = utils.create_connection()
         self.latest_execution_log_path = self._get_latest_execution_log_path()
         self.latest_clean_up_log_path = self._get_latest_clean_up_log_path()
@@ -35,10 +37,10 @@ class GenerateHTML:
             utils.check_db_views(self.connection, ["event_data_view_valid_events_only"])
 
     @staticmethod
-    def _parse_arguments() -> argparse.Namespace:
+    def _parse_arguments(args: List[str] = None) -> argparse.Namespace:
         parser = ArgumentsParser()
         parser.set_description("Generates website's HTML.")
-        return parser.parse_args()
+        return parser.parse_args(args)
 
     def run(self) -> None:
         self.logger.info("Generating HTML...")
@@ -49,6 +51,7 @@ class GenerateHTML:
         self._complete_crawler_status_template(status_info)
         self._copy_other_files()
 
+        self.metrics.store(self.logger, self.args.dry_run)
         self.logger.info("DONE")
 
     def _get_events(self) -> dict:
@@ -257,8 +260,12 @@ class GenerateHTML:
                      json.dumps(status_info['statistics']['count_per_calendar'], indent=4, ensure_ascii=True)) \
             .replace('{{events_per_parser}}',
                      json.dumps(status_info['statistics']['count_per_parser'], indent=4, ensure_ascii=True)) \
+            .replace('{{downloads_per_calendar}}',
+                     json.dumps(status_info['statistics']['downloads_per_calendar'], indent=4, ensure_ascii=True)) \
             .replace('{{failing_calendars}}',
                      json.dumps(status_info['failures']['failed_calendars'], indent=4, ensure_ascii=True)) \
+            .replace('{{open_circuits}}',
+                     json.dumps(status_info['failures']['open_circuits'], indent=4, ensure_ascii=True)) \
             .replace('{{empty_calendars}}',
                      json.dumps(status_info['failures']['empty_calendars'], indent=4, ensure_ascii=True)) \
             .replace('{{calendars_with_failed_events}}',
@@ -2,14 +2,15 @@ import argparse
 import csv
 import json
 import logging
-import multiprocessing
 import re
 import sqlite3
 from typing import List
 
-from lib import utils, logger
+from lib import utils, logger, worker_state
 from lib.arguments_parser import ArgumentsParser
 from lib.constants import MUNICIPALITIES_OF_CR_FILE_PATH, SIMPLE_LOGGER_PREFIX
+from lib.executor import Executor
+from lib.metrics import StageMetrics
 
 
 class GeocodeLocation:
@@ -18,9 +19,10 @@ class GeocodeLocation:
     ONLINE_REGEX = re.compile(r'\bonlin|Onlin|ONLIN|On-line|on-line|ON-LINE|Virtuáln|virtuáln|VIRTUÁLN|Live Stream\w*')
     OUTPUT_FILE_PATH = "data/tmp/geocode_location_output.json"
 
-    def __init__(self) -> None:
-        self.args = self._parse_arguments()
+    def __init__(self, args: List[str] = None) -> None:
+        self.args = self._parse_arguments(args)
         self.logger = logger.set_up_script_logger(__file__, log_file=self.args.log_file, log_level=self.args.log_level)
+        self.metrics = StageMetrics(__file__)
         self.connection = utils.create_connection()
 
         if not self.args.dry_run:
@@ -28,23 +30,26 @@ class GeocodeLocation:
                                   ["calendar", "event_url", "event_html", "event_data", "event_data_gps"])
 
     @staticmethod
-    def _parse_arguments() -> argparse.Namespace:
+    def _parse_arguments(args: List[str] = None) -> argparse.Namespace:
         parser = ArgumentsParser()
         parser.set_description("Geo-codes a location of parsed events without GPS.")
         parser.add_argument('--events-ids', type=int, nargs="*",
                             help="geocode locations only of events with the specified event_data IDs")
 
-        arguments = parser.parse_args()
+        arguments = parser.parse_args(args)
         if arguments.events_ids and not arguments.dry_run:
             parser.error("--events-ids requires --dry-run")
         return arguments
 
     def run(self) -> None:
         input_events = self._load_input_events()
+        self.metrics.set_count('input_events', len(input_events))
+        self.logger.info("Loading czech municipalities...")
         municipalities = self._load_municipalities_csv()
         info_to_insert = self._geocode_locations(input_events, municipalities)
         self._get_stats(info_to_insert)
         self._store_to_db(info_to_insert, )
+        self.metrics.store(self.logger, self.args.dry_run)
         self.connection.close()
 
     def _load_input_events(self) -> List[tuple]:
@@ -68,9 +73,8 @@ class GeocodeLocation:
         cursor = self.connection.execute(query)
         return cursor.fetchall()
 
-    def _load_municipalities_csv(self) -> List[dict]:
-        self.logger.info("Loading czech municipalities...")
-
+    @staticmethod
+    def _load_municipalities_csv() -> List[dict]:
         municipalities = []
         with open(MUNICIPALITIES_OF_CR_FILE_PATH, 'r') as csv_file:
             csv_reader = csv.reader(csv_file)
@@ -112,19 +116,33 @@ class GeocodeLocation:
 
         logger.set_up_simple_logger(SIMPLE_LOGGER_PREFIX + __file__,
                                     log_file=self.args.log_file, log_level=self.args.log_level)
-        calendars_with_default_gps = utils.get_base_dict_per_url(utils.get_base_with_default_gps())
+        worker_states = GeocodeLocation._get_worker_states(municipalities)
         input_tuples = []
         for index, event in enumerate(input_events):
-            input_tuples.append((index + 1, len(input_events), event, municipalities, calendars_with_default_gps))
+            input_tuples.append((index + 1, len(input_events), event))
+
+        executor = Executor(Executor.PROCESS, self.args.workers, self.args.inline_threshold, worker_states,
+                            metrics=self.metrics)
+        return executor.map(GeocodeLocation._geocode_locations_process, input_tuples,
+                            ["event_data {}".format(event[0]) for event in input_events])
 
-        with multiprocessing.Pool(32) as p:
-            return p.map(GeocodeLocation._geocode_locations_process, input_tuples)
+    @staticmethod
+    def _get_worker_states(municipalities: List[dict]) -> dict:
+        return {
+            GeocodeLocation.__name__: {
+                'municipalities': municipalities,
+                'calendars_with_default_gps': utils.get_base_dict_per_url(utils.get_base_with_default_gps())
+            }
+        }
 
     @staticmethod
-    def _geocode_locations_process(input_tuple: (int, int, (int, str, str, str, str, str), List[dict], dict)) -> dict:
+    def _geocode_locations_process(input_tuple: (int, int, (int, str, str, str, str, str))) -> dict:
         simple_logger = logging.getLogger(SIMPLE_LOGGER_PREFIX + __file__)
+        state = worker_state.get(GeocodeLocation.__name__)
+        municipalities = state['municipalities']
+        calendars_with_default_gps = state['calendars_with_default_gps']
 
-        input_index, total_length, event, municipalities, calendars_with_default_gps = input_tuple
+        input_index, total_length, event = input_tuple
         event_id, title, perex, location, gps, calendar_url = event
         event_dict = {
             "id": event_id,
@@ -238,6 +256,16 @@ class GeocodeLocation:
     def _get_stats(self, info_to_insert: List[dict]) -> None:
         self.logger.info("Preparing statistics...")
 
+        result_dict, without_default_online = GeocodeLocation._prepare_stats(info_to_insert)
+
+        if self.args.dry_run:
+            print(json.dumps(result_dict, indent=4, ensure_ascii=False))
+        else:
+            utils.store_to_json_file(result_dict, GeocodeLocation.OUTPUT_FILE_PATH)
+        GeocodeLocation._log_stats(self.logger, result_dict, without_default_online)
+
+    @staticmethod
+    def _prepare_stats(info_to_insert: List[dict]) -> (dict, int):
         result_dict = {
             "all": len(info_to_insert),
             "-online": 0,
@@ -286,18 +314,38 @@ class GeocodeLocation:
                 del match_without_default["base"]
                 result_dict["---results"].append(match_without_default)
 
-        if self.args.dry_run:
-            print(json.dumps(result_dict, indent=4, ensure_ascii=False))
-        else:
-            utils.store_to_json_file(result_dict, GeocodeLocation.OUTPUT_FILE_PATH)
-        self.logger.info(">> Online: {} / {}".format(result_dict["-online"], result_dict["all"]))
-        self.logger.info(">> No GPS: {} / {}".format(result_dict["-without_gps"], result_dict["all"]))
-        self.logger.info(">> No GPS and no default GPS: {} / {}".format(result_dict["--without_default_gps"],
-                                                                        result_dict["-without_gps"]))
+        return result_dict, without_default_online
+
+    @staticmethod
+    def _log_stats(script_logger: logging.LoggerAdapter, result_dict: dict, without_default_online: int) -> None:
+        script_logger.info(">> Online: {} / {}".format(result_dict["-online"], result_dict["all"]))
+        script_logger.info(">> No GPS: {} / {}".format(result_dict["-without_gps"], result_dict["all"]))
+        script_logger.info(">> No GPS and no default GPS: {} / {}".format(result_dict["--without_default_gps"],
+                                                                          result_dict["-without_gps"]))
         without_default_not_online = result_dict["--without_default_gps"] - without_default_online
-        self.logger.info(">> Successfully geocoded: {} / ({} + {})".format(result_dict["---geocoded"],
-                                                                           without_default_not_online,
-                                                                           without_default_online))
+        script_logger.info(">> Successfully geocoded: {} / ({} + {})".format(result_dict["---geocoded"],
+                                                                             without_default_not_online,
+                                                                             without_default_online))
+
+    @staticmethod
+    def _get_values_to_insert(info: dict) -> tuple:
+        online = info["online"]
+        gps = None
+        location = None
+        municipality = None
+        district = None
+
+        if not online:
+            if info["has_default"]:
+                gps = info["base"]["default_gps"]
+                if "default_location" in info["base"]:
+                    location = info["base"]["default_location"]
+            elif info["geocoded_location"] is not None:
+                gps = info["geocoded_location"]["gps"]
+                municipality = info["geocoded_location"]["municipality"]
+                district = info["geocoded_location"]["district"]
+
+        return online, info["has_default"], gps, location, municipality, district, info["id"]
 
     def _store_to_db(self, info_to_insert: List[dict]) -> None:
         if not self.args.dry_run:
@@ -308,23 +356,11 @@ class GeocodeLocation:
         data_to_insert = []
         for info in info_to_insert:
             event_id = info["id"]
-            online = info["online"]
             has_gps = info["has_gps"]
             has_default = info["has_default"]
-            gps = None
-            location = None
-            municipality = None
-            district = None
-
-            if not online:
-                if has_default:
-                    gps = info["base"]["default_gps"]
-                    if "default_location" in info["base"]:
-                        location = info["base"]["default_location"]
-                elif info["geocoded_location"] is not None:
-                    gps = info["geocoded_location"]["gps"]
-                    municipality = info["geocoded_location"]["municipality"]
-                    district = info["geocoded_location"]["district"]
+
+            values = GeocodeLocation._get_values_to_insert(info)
+            online, _, _, _, municipality, _, _ = values
 
             if not has_gps and not has_default:
                 geocoded += 1
@@ -332,7 +368,6 @@ class GeocodeLocation:
             if not has_gps and not has_default and not online and not municipality:
                 nok_list.add(event_id)
 
-            values = (online, has_default, gps, location, municipality, district, event_id)
             if self.args.dry_run:
                 data_to_insert.append(values)
             else:
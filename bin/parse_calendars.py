@@ -1,7 +1,6 @@
 import argparse
 import json
 import logging
-import multiprocessing
 import os
 import sqlite3
 import sys
@@ -9,47 +8,51 @@ import urllib.parse as urllib
 from datetime import datetime
 from typing import List
 
-from lxml import etree
-
 from lib import utils, logger
 from lib.arguments_parser import ArgumentsParser
 from lib.constants import SIMPLE_LOGGER_PREFIX
+from lib.executor import Executor
+from lib.html_store import HtmlStore
+from lib.metrics import StageMetrics
 from lib.parser import Parser
 
 
 class ParseCalendars:
     """ Parses a downloaded calendar page HTML content for events' URLs. """
 
-    def __init__(self) -> None:
-        self.args = self._parse_arguments()
+    def __init__(self, args: List[str] = None) -> None:
+        self.args = self._parse_arguments(args)
         self.logger = logger.set_up_script_logger(__file__, log_file=self.args.log_file, log_level=self.args.log_level)
+        self.metrics = StageMetrics(__file__)
         self.connection = utils.create_connection()
 
         if not self.args.dry_run:
             utils.check_db_tables(self.connection, ["calendar", "event_url"])
 
     @staticmethod
-    def _parse_arguments() -> argparse.Namespace:
+    def _parse_arguments(args: List[str] = None) -> argparse.Namespace:
         parser = ArgumentsParser()
         parser.set_description("Parses a downloaded calendar page HTML content for events' URLs.")
         parser.add_argument('--domain', type=str, default=None,
                             help="parse calendars only of the specified domain")
         parser.add_argument('--parse-all', action='store_true', default=False,
                             help="parse even already parsed calendars")
-        return parser.parse_args()
+        return parser.parse_args(args)
 
     def run(self) -> None:
         input_calendars = self._load_input_calendars()
+        self.metrics.set_count('input_calendars', len(input_calendars))
         events_to_insert = self._parse_calendars(input_calendars)
         events_counts = self._store_to_database(events_to_insert)
         self._update_database(events_counts)
+        self.metrics.store(self.logger, self.args.dry_run)
         self.connection.close()
 
     def _load_input_calendars(self) -> List[tuple]:
         self.logger.info("Loading input calendars...")
 
         query = '''
-                    SELECT id, url, html_file_path 
+                    SELECT id, url, html_file_path, encoding
                     FROM calendar 
                     WHERE 1 == 1
                 '''
@@ -79,12 +82,13 @@ class ParseCalendars:
         timestamp = datetime.now()
         input_tuples = []
         for index, calendar_tuple in enumerate(input_calendars):
-            _, calendar_url, _ = calendar_tuple
+            _, calendar_url, _, _ = calendar_tuple
             website_base = utils.get_base_by_url(calendar_url)
             input_tuples.append((index + 1, len(input_calendars), calendar_tuple, timestamp, website_base))
 
-        with multiprocessing.Pool(32) as p:
-            events_lists = p.map(ParseCalendars._parse_calendars_process, input_tuples)
+        executor = Executor(Executor.PROCESS, self.args.workers, self.args.inline_threshold, metrics=self.metrics)
+        events_lists = executor.map(ParseCalendars._parse_calendars_process, input_tuples,
+                                    [calendar_tuple[1] for calendar_tuple in input_calendars])
 
         events_to_insert = {calendar_id: events_list
                             for element in events_lists
@@ -92,23 +96,22 @@ class ParseCalendars:
         return events_to_insert
 
     @staticmethod
-    def _parse_calendars_process(input_tuple: (int, int, (int, str, str), datetime, dict)) -> dict:
+    def _parse_calendars_process(input_tuple: (int, int, (int, str, str, str), datetime, dict)) -> dict:
         simple_logger = logging.getLogger(SIMPLE_LOGGER_PREFIX + __file__)
 
         input_index, total_length, calendar_tuple, timestamp, website_base = input_tuple
-        calendar_id, calendar_url, calendar_html_file_path = calendar_tuple
+        calendar_id, calendar_url, calendar_html_file_path, calendar_encoding = calendar_tuple
         file = os.path.basename(calendar_html_file_path)
 
         info_output = "{}/{} | {}/{}".format(input_index, total_length, website_base["domain"], file)
 
-        if not os.path.isfile(calendar_html_file_path):
+        if not HtmlStore.exists(calendar_html_file_path):
             simple_logger.warning(info_output + " | 0 (File '{}' does not exist!)".format(calendar_html_file_path))
             return {
                 calendar_id: []
             }
 
-        with open(calendar_html_file_path, encoding="utf-8") as html_file:
-            dom = etree.parse(html_file, etree.HTMLParser())
+        dom = HtmlStore.parse(calendar_html_file_path, calendar_encoding)
 
         parser = Parser(website_base["parser"])
         parser.set_dom(dom)
@@ -118,7 +121,7 @@ class ParseCalendars:
             event_url = url_path
             if not bool(urllib.urlparse(event_url).netloc):
                 event_url = urllib.urljoin(calendar_url, url_path)
-            events_to_insert.append((event_url, timestamp))
+            events_to_insert.append((event_url, timestamp, index))
 
         simple_logger.info(info_output + " | {}".format(len(events_to_insert)))
 
@@ -127,7 +130,7 @@ class ParseCalendars:
                 simple_logger.debug("Parser's errors: {}".format(json.dumps(parser.error_messages, indent=4)))
         else:
             simple_logger.debug(
-                "Found URLs: {}".format(json.dumps([event_url for event_url, _ in events_to_insert], indent=4)))
+                "Found URLs: {}".format(json.dumps([event_url for event_url, _, _ in events_to_insert], indent=4)))
 
         return {
             calendar_id: events_to_insert
@@ -160,12 +163,12 @@ class ParseCalendars:
             cursor = self.connection.execute(count_query)
             events_count_before = int(cursor.fetchone()[0])
 
-            for url, parsed_at in events_list:
+            for url, parsed_at, listing_position in events_list:
                 query = '''
-                            INSERT OR IGNORE INTO event_url(url, parsed_at, calendar_id)
-                            VALUES(?, ?, ?)
+                            INSERT OR IGNORE INTO event_url(url, parsed_at, calendar_id, listing_position)
+                            VALUES(?, ?, ?, ?)
                         '''
-                values = (url, parsed_at, calendar_id)
+                values = (url, parsed_at, calendar_id, listing_position)
 
                 try:
                     self.connection.execute(query, values)
@@ -1,35 +1,43 @@
 import argparse
+import io
 import json
 import logging
-import multiprocessing
-import os
 import sqlite3
 import sys
 from collections import defaultdict
 from datetime import datetime
-from typing import List
-
-from lxml import etree
+from typing import List, Optional
 
 from lib import utils, logger
 from lib.arguments_parser import ArgumentsParser
 from lib.constants import SIMPLE_LOGGER_PREFIX
+from lib.executor import Executor
+from lib.html_codec import HtmlCodec
+from lib.html_store import HtmlStore
+from lib.metrics import StageMetrics
 from lib.parser import Parser
 
 
 class ParseEvents:
     """ Parses a downloaded event's page HTML content for events' detail information. """
 
-    def __init__(self) -> None:
-        self.args = self._parse_arguments()
+    PIPELINE_MODE = "pipeline"
+
+    def __init__(self, args: List[str] = None) -> None:
+        self.args = self._parse_arguments(args)
         self.logger = logger.set_up_script_logger(__file__, log_file=self.args.log_file, log_level=self.args.log_level)
+        self.metrics = StageMetrics(__file__)
         self.connection = utils.create_connection()
+        self.executor = None
+        self.pipeline_events = []
+        self.pipeline_total_length = 0
+        self.pipeline_timestamp = None
 
         if not self.args.dry_run:
             utils.check_db_tables(self.connection, ["calendar", "event_url", "event_html", "event_data"])
 
     @staticmethod
-    def _parse_arguments() -> argparse.Namespace:
+    def _parse_arguments(args: List[str] = None) -> argparse.Namespace:
         parser = ArgumentsParser()
         parser.set_description("Parses a downloaded event's page HTML content for events' detail information.")
         parser.add_argument('--domain', type=str, default=None,
@@ -39,7 +47,7 @@ class ParseEvents:
         parser.add_argument('--parse-all', action='store_true', default=False,
                             help="parse even already parsed events")
 
-        arguments = parser.parse_args()
+        arguments = parser.parse_args(args)
         if arguments.domain and not arguments.dry_run:
             parser.error("--domain requires --dry-run")
         if arguments.event_url and not arguments.dry_run:
@@ -51,16 +59,18 @@ class ParseEvents:
 
     def run(self) -> None:
         input_events = self._load_input_events()
+        self.metrics.set_count('input_events', len(input_events))
         events_to_insert = self._parse_events(input_events)
         self._store_to_database(events_to_insert)
         self._update_database(input_events)
+        self.metrics.store(self.logger, self.args.dry_run)
         self.connection.close()
 
     def _load_input_events(self) -> List[tuple]:
         self.logger.info("Loading input events...")
 
         query = '''
-                    SELECT eh.id, eh.html_file_path, 
+                    SELECT eh.id, eh.html_file_path, eh.encoding,
                            eu.url, 
                            c.url
                     FROM event_html eh
@@ -97,32 +107,80 @@ class ParseEvents:
         timestamp = datetime.now()
         input_tuples = []
         for index, event_tuple in enumerate(input_events):
-            _, _, _, calendar_url = event_tuple
+            _, _, _, _, calendar_url = event_tuple
             website_base = utils.get_base_by_url(calendar_url)
-            input_tuples.append((index + 1, len(input_events), event_tuple, timestamp, website_base))
+            input_tuples.append((index + 1, len(input_events), event_tuple, timestamp, website_base, None))
+
+        executor = Executor(Executor.PROCESS, self.args.workers, self.args.inline_threshold, metrics=self.metrics)
+        return executor.map(ParseEvents._parse_events_process, input_tuples,
+                            [event_tuple[3] for event_tuple in input_events])
+
+    def start_pipeline(self, total_length: int) -> None:
+        """ Starts parsing of events handed over one by one as they are downloaded (see submit_event),
+        so the parsing overlaps with the downloads instead of waiting for all of them.
+
+        :param total_length: a number of the events to be downloaded
+        """
 
-        with multiprocessing.Pool(32) as p:
-            return p.map(ParseEvents._parse_events_process, input_tuples)
+        self.logger.info("Parsing events as they are downloaded...")
+
+        logger.set_up_simple_logger(SIMPLE_LOGGER_PREFIX + __file__,
+                                    log_file=self.args.log_file, log_level=self.args.log_level)
+        self.pipeline_events = []
+        self.pipeline_total_length = total_length
+        self.pipeline_timestamp = datetime.now()
+        # parse_events still runs after download_events (for events not parsed in the pipeline), so the metrics
+        # of the pipeline are stored apart
+        self.metrics = StageMetrics(__file__, ParseEvents.PIPELINE_MODE)
+        self.executor = Executor(Executor.PROCESS, self.args.workers, self.args.inline_threshold, metrics=self.metrics)
+        self.executor.start()
+
+    def submit_event(self, event_tuple: tuple, content: Optional[bytes] = None) -> None:
+        """ Starts parsing of the downloaded event in the background.
+
+        :param event_tuple: a tuple of (event_html ID, its file path, encoding, event's URL, calendar's URL)
+        :param content: the page's content to parse instead of reading it from the file path
+        """
+
+        self.pipeline_events.append(event_tuple)
+        website_base = utils.get_base_by_url(event_tuple[4])
+        self.executor.submit(ParseEvents._parse_events_process,
+                             (len(self.pipeline_events), self.pipeline_total_length, event_tuple,
+                              self.pipeline_timestamp, website_base, content), event_tuple[3])
+
+    def finish_pipeline(self) -> None:
+        """ Waits for parsing of all the submitted events and stores the results. """
+
+        events_to_insert = self.executor.finish()
+        self._store_to_database(events_to_insert)
+        self._update_database(self.pipeline_events)
+        self.metrics.set_count('input_events', len(self.pipeline_events))
+        self.metrics.store(self.logger, self.args.dry_run)
+        self.connection.close()
 
     @staticmethod
-    def _parse_events_process(input_tuple: (int, int, (int, str, str, str), datetime, dict)) -> (dict, datetime, tuple):
+    def _parse_events_process(input_tuple: (int, int, (int, str, str, str, str), datetime, dict, Optional[bytes])
+                              ) -> (dict, datetime, tuple):
         simple_logger = logging.getLogger(SIMPLE_LOGGER_PREFIX + __file__)
 
-        input_index, total_length, event_tuple, timestamp, website_base = input_tuple
-        event_html_id, event_html_file_path, event_url, _ = event_tuple
+        input_index, total_length, event_tuple, timestamp, website_base, content = input_tuple
+        event_html_id, event_html_file_path, event_encoding, event_url, _ = event_tuple
 
         info_output = "{}/{} | Parsing event: {}".format(input_index, total_length, event_url)
 
-        if not event_html_file_path:
+        if content is not None:
+            dom = HtmlCodec.parse_stream(io.BytesIO(content), event_encoding)
+
+        elif not event_html_file_path:
             simple_logger.error(info_output + " | NOK - (Filepath is None!)".format(event_url))
             return {"error": "Filepath is None!"}, timestamp, event_tuple
 
-        elif not os.path.isfile(event_html_file_path):
+        elif not HtmlStore.exists(event_html_file_path):
             simple_logger.error(info_output + " | NOK - (File '{}' does not exist!)".format(event_html_file_path))
             return {"error": "File does not exist!"}, timestamp, event_tuple
 
-        with open(event_html_file_path, encoding="utf-8") as html_file:
-            dom = etree.parse(html_file, etree.HTMLParser(encoding="utf-8"))
+        else:
+            dom = HtmlStore.parse(event_html_file_path, event_encoding)
 
         parser = Parser(website_base["parser"])
         parser.set_dom(dom)
@@ -157,7 +215,7 @@ class ParseEvents:
         ok = 0
         for event_data in events_to_insert:
             data_dict, parsed_at, event_tuple = event_data
-            event_html_id, event_html_file_path, event_url, _ = event_tuple
+            event_html_id, event_html_file_path, _, event_url, _ = event_tuple
 
             if "error" in data_dict:
                 nok_list.append(event_html_id)
@@ -201,6 +259,7 @@ class ParseEvents:
                           data_dict.get("types", None), event_html_id)
 
                 try:
+                    self._delete_event_data(event_html_id)
                     self.connection.execute(query, values)
                 except sqlite3.Error as e:
                     self.logger.error(
@@ -231,6 +290,23 @@ class ParseEvents:
         if len(nok_list) > 0:
             self.logger.warning(">> Failed event_html IDs: {}".format(nok_list))
 
+    def _delete_event_data(self, event_html_id: int) -> None:
+        """ Deletes data parsed from the event's previous snapshot (see download_events' refreshes)
+        together with their enrichment, so the enriching stages process the event again. """
+
+        query = '''
+                    SELECT id
+                    FROM event_data
+                    WHERE event_html_id = ?
+                '''
+        row = self.connection.execute(query, (event_html_id,)).fetchone()
+        if row is None:
+            return
+
+        for table in ["event_data_datetime", "event_data_gps", "event_data_keywords", "event_data_types"]:
+            self.connection.execute('''DELETE FROM {} WHERE event_data_id = ?'''.format(table), row)
+        self.connection.execute('''DELETE FROM event_data WHERE id = ?''', row)
+
     def _update_database(self, input_events: List[tuple]) -> None:
         if self.args.dry_run:
             return
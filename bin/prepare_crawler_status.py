@@ -6,6 +6,9 @@ from typing import Optional, List
 
 from lib import utils, logger
 from lib.arguments_parser import ArgumentsParser
+from lib.circuit_breaker import CircuitBreaker
+from lib.download_stats import DownloadStats
+from lib.metrics import StageMetrics
 
 
 class PrepareCrawlerStatus:
@@ -15,22 +18,24 @@ class PrepareCrawlerStatus:
     EMAIL_TEMPLATE_FILE_PATH = "resources/email/success_template.txt"
     EMAIL_RESULT_FILE_PATH = "data/tmp/email.txt"
 
-    def __init__(self) -> None:
-        self.args = self._parse_arguments()
+    def __init__(self, args: List[str] = None) -> None:
+        self.args = self._parse_arguments(args)
         self.logger = logger.set_up_script_logger(__file__, log_file=self.args.log_file, log_level=self.args.log_level)
+        self.metrics = StageMetrics(__file__)
         self.connection = utils.create_connection()
         self.active_calendars = [base['url'] for base in utils.get_active_base()]
         self.all_calendars_bases = utils.get_base_dict_per_url()
 
         if not self.args.dry_run:
-            utils.check_db_tables(self.connection, ["calendar"])
+            utils.check_db_tables(self.connection, ["calendar", "download_stats", "calendar_revisit",
+                                                   "circuit_breaker"])
             utils.check_db_views(self.connection, ["event_data_view", "event_data_view_valid_events_only"])
 
     @staticmethod
-    def _parse_arguments() -> argparse.Namespace:
+    def _parse_arguments(args: List[str] = None) -> argparse.Namespace:
         parser = ArgumentsParser()
         parser.set_description("Prepares statistics for a crawler's status.")
-        return parser.parse_args()
+        return parser.parse_args(args)
 
     def run(self):
         self.logger.info('Preparing Crawler Status...')
@@ -39,6 +44,7 @@ class PrepareCrawlerStatus:
         self._write_to_output(crawler_status_dict)
         self._generate_email(crawler_status_dict['statistics']['count_per_week'][1])
 
+        self.metrics.store(self.logger, self.args.dry_run)
         self.logger.info("DONE")
 
     def _prepare_crawler_status_dict(self) -> dict:
@@ -49,10 +55,12 @@ class PrepareCrawlerStatus:
                 'count_per_day': self._get_events_count_per_day(14),
                 'count_per_week': self._get_events_count_per_week(52),
                 'count_per_calendar': self._get_events_count_per_calendar(),
-                'count_per_parser': []
+                'count_per_parser': [],
+                'downloads_per_calendar': self._get_downloads_per_calendar(7)
             },
             'failures': {
                 'failed_calendars': self._get_failed_calendars(3),
+                'open_circuits': CircuitBreaker.get_open_circuits(self.connection),
                 'empty_calendars': self._get_empty_calendars(),
                 'failed_events_errors': self._get_failed_events_errors(7),
                 'failure_percentage_per_calendar': []
@@ -174,6 +182,34 @@ class PrepareCrawlerStatus:
             result_dict[current_active_url] += events_count
         return result_dict
 
+    def _get_downloads_per_calendar(self, last_n: int) -> List[dict]:
+        """ Sums up telemetry of the calendars' downloads (see lib.download_stats) per active calendar. """
+
+        rollup_per_calendar = defaultdict(lambda: defaultdict(float))
+        for rollup in DownloadStats.get_rollup_per_calendar(self.connection, last_n):
+            calendar_url = rollup.pop('calendar_url')
+            if calendar_url not in self.all_calendars_bases:
+                continue
+            current_active_url = self._get_active_url(calendar_url)
+            for key, value in rollup.items():
+                rollup_per_calendar[current_active_url][key] += value or 0
+
+        downloads_per_calendar = []
+        for calendar_url, rollup in rollup_per_calendar.items():
+            responses_count = rollup['responses_count']
+            downloads_per_calendar.append({
+                'calendar_url': calendar_url,
+                'requests_count': int(rollup['requests_count']),
+                'failure_percentage': round(rollup['failed_count'] / rollup['requests_count'] * 100, 2),
+                'redirect_count': int(rollup['redirect_count']),
+                'megabytes': round(rollup['bytes'] / (1024 * 1024), 2),
+                'avg_response_time': round(rollup['response_time_sum'] / rollup['requests_count'], 3),
+                'avg_first_byte_time': round(rollup['first_byte_time_sum'] / responses_count, 3)
+                if responses_count > 0 else None
+            })
+
+        return downloads_per_calendar
+
     @staticmethod
     def _get_events_count_per_parser(events_per_calendar: dict) -> dict:
         events_per_parser_dict = defaultdict(int)
@@ -186,10 +222,15 @@ class PrepareCrawlerStatus:
         return events_per_parser_dict
 
     def _get_failed_calendars(self, consecutive_last_n: int) -> List[dict]:
+        # calendars backed off by their revisit schedule aren't failing until they're overdue
         query = '''
                     SELECT DISTINCT calendar.url
                     FROM calendar
-                    WHERE date(calendar.downloaded_at) > date('now','-{} day')
+                    WHERE date(calendar.downloaded_at) > date('now','-{0} day')
+                    UNION
+                    SELECT url
+                    FROM calendar_revisit
+                    WHERE date(next_visit_at) > date('now','-{0} day')
                 '''.format(consecutive_last_n)
         cursor = self.connection.execute(query)
 
@@ -244,6 +285,7 @@ class PrepareCrawlerStatus:
                     WHERE event_url__url IS NOT NULL
                       AND date(calendar__downloaded_at)  > date('now', '-{} day')
                       AND event_html__html_file_path IS NULL
+                      AND event_data__id IS NULL
                 '''.format(last_n)
         cursor = self.connection.execute(query)
         failed_events_dict['event_html_not_downloaded'] = cursor.fetchall()
@@ -262,7 +304,6 @@ class PrepareCrawlerStatus:
                     SELECT event_url__id, event_url__url, calendar__downloaded_at
                     FROM event_data_view
                     WHERE  date(calendar__downloaded_at) > date('now','-{} day')
-                      AND event_html__html_file_path IS NOT NULL
                       AND event_data__id IS NOT NULL
                       AND event_data_datetime__start_date IS NULL
                 '''.format(last_n)
@@ -273,7 +314,6 @@ class PrepareCrawlerStatus:
                     SELECT event_url__id, event_url__url, calendar__downloaded_at
                     FROM event_data_view
                     WHERE  date(calendar__downloaded_at) > date('now','-{} day')
-                      AND event_html__html_file_path IS NOT NULL
                       AND event_data__id IS NOT NULL
                       AND event_data_datetime__start_date IS NOT NULL
                       AND (event_data__gps IS NULL AND event_data_gps__gps IS NULL AND event_data_gps__online == 0)
@@ -0,0 +1,182 @@
+import argparse
+import concurrent.futures
+import time
+from typing import List, Set
+
+from bin.deduplicate_events import DeduplicateEvents
+from bin.download_calendars import DownloadCalendars
+from bin.download_events import DownloadEvents
+from bin.enrich_events import EnrichEvents
+from bin.generate_html import GenerateHTML
+from bin.parse_calendars import ParseCalendars
+from bin.parse_events import ParseEvents
+from bin.prepare_crawler_status import PrepareCrawlerStatus
+from lib import logger
+from lib.arguments_parser import ArgumentsParser
+
+
+class Process:
+    """ Runs all the stages of the tool in one process in the order given by their dependencies. """
+
+    # since the enriching stages are fused into enrich_events, each stage needs data of the previous one
+    # (prepare_crawler_status and generate_html read only events left after the de-duplication and generate_html
+    # reads the crawler status), so the stages run one by one; others can be added with their own dependencies
+    STAGES = {
+        "download_calendars": (DownloadCalendars, []),
+        "parse_calendars": (ParseCalendars, ["download_calendars"]),
+        "download_events": (DownloadEvents, ["parse_calendars"]),
+        "parse_events": (ParseEvents, ["download_events"]),
+        "enrich_events": (EnrichEvents, ["parse_events"]),
+        "deduplicate_events": (DeduplicateEvents, ["enrich_events"]),
+        "prepare_crawler_status": (PrepareCrawlerStatus, ["deduplicate_events"]),
+        "generate_html": (GenerateHTML, ["prepare_crawler_status"])
+    }
+
+    def __init__(self) -> None:
+        self.args = self._parse_arguments()
+        self.logger = logger.set_up_script_logger(__file__, log_file=self.args.log_file, log_level=self.args.log_level)
+
+    @staticmethod
+    def _parse_arguments() -> argparse.Namespace:
+        parser = ArgumentsParser()
+        parser.set_description("Runs all the stages of the tool in one process in the order given by their "
+                               "dependencies.")
+        parser.add_argument('--stages', type=str, nargs="*", choices=list(Process.STAGES.keys()), default=None,
+                            help="run only the specified stages; order between them is kept, other stages are not run")
+        parser.add_argument('--sequential', action='store_true', default=False,
+                            help="run the stages one by one even if they don't depend on each other")
+        parser.add_argument('--pipeline', action='store_true', default=False,
+                            help="parse the events as they are downloaded by download_events (see its --pipeline)")
+        parser.add_argument('--no-spool', action='store_true', default=False,
+                            help="with --pipeline, hand the downloaded pages to the parsers in memory "
+                                 "(see download_events' --no-spool)")
+        parser.add_argument('--download-deadline', type=str, default=None,
+                            help="a time ('HH:MM' or 'YYYY-MM-DD HH:MM') after which download_events starts no other "
+                                 "download (see its --deadline)")
+        parser.add_cassette_arguments()
+
+        arguments = parser.parse_args()
+        if arguments.replay_latency and not arguments.replay:
+            parser.error("--replay-latency requires --replay")
+        return arguments
+
+    def run(self) -> None:
+        stages = self._load_stages()
+        durations = self._run_stages(stages)
+        self._print_summary(stages, durations)
+
+    def _load_stages(self) -> dict:
+        if not self.args.stages:
+            return dict(Process.STAGES)
+
+        stages = {}
+        for stage_name, (stage_class, _) in Process.STAGES.items():
+            if stage_name in self.args.stages:
+                dependencies = [ancestor for ancestor in self._get_ancestors(stage_name)
+                                if ancestor in self.args.stages]
+                stages[stage_name] = (stage_class, dependencies)
+        return stages
+
+    @staticmethod
+    def _get_ancestors(stage_name: str) -> Set[str]:
+        ancestors = set()
+        for dependency in Process.STAGES[stage_name][1]:
+            ancestors.add(dependency)
+            ancestors.update(Process._get_ancestors(dependency))
+        return ancestors
+
+    def _get_stage_arguments(self, stage_class: type) -> List[str]:
+        stage_arguments = ["--log-level", self.args.log_level]
+        if self.args.log_file:
+            stage_arguments.extend(["--log-file", self.args.log_file])
+        if self.args.dry_run:
+            stage_arguments.append("--dry-run")
+        if self.args.workers:
+            stage_arguments.extend(["--workers", str(self.args.workers)])
+        if self.args.inline_threshold is not None:
+            stage_arguments.extend(["--inline-threshold", str(self.args.inline_threshold)])
+        if stage_class is DownloadEvents and self.args.pipeline and not self.args.dry_run:
+            stage_arguments.append("--pipeline")
+            if self.args.no_spool:
+                stage_arguments.append("--no-spool")
+        if stage_class is DownloadEvents and self.args.download_deadline:
+            stage_arguments.extend(["--deadline", self.args.download_deadline])
+        # both download stages share one cassette (their requests are of different URLs)
+        if stage_class in [DownloadCalendars, DownloadEvents]:
+            if self.args.record:
+                stage_arguments.extend(["--record", self.args.record])
+            if self.args.replay:
+                stage_arguments.extend(["--replay", self.args.replay])
+                if self.args.replay_latency:
+                    stage_arguments.append("--replay-latency")
+        return stage_arguments
+
+    def _run_stages(self, stages: dict) -> dict:
+        self.logger.info("Running stages...")
+
+        durations = {}
+        pending = dict(stages)
+        finished = set()
+        running = {}
+        max_workers = 1 if self.args.sequential else len(stages)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+            while pending or running:
+                for stage_name, (stage_class, dependencies) in list(pending.items()):
+                    if any(dependency in pending or dependency in running.values() for dependency in dependencies):
+                        continue
+                    del pending[stage_name]
+
+                    failed_dependencies = [dependency for dependency in dependencies if dependency not in finished]
+                    if failed_dependencies:
+                        self.logger.error("Skipping '{}' stage, its dependencies failed: {}".format(
+                            stage_name, failed_dependencies))
+                        durations[stage_name] = None
+                        continue
+
+                    print("{} | {} | STARTED".format(time.strftime("%Y-%m-%d %H:%M:%S"), stage_name.upper()),
+                          flush=True)
+                    future = executor.submit(self._run_stage, stage_class)
+                    running[future] = stage_name
+
+                if not running:
+                    continue
+
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    stage_name = running.pop(future)
+                    succeeded, duration = future.result()
+                    durations[stage_name] = duration
+                    if succeeded:
+                        finished.add(stage_name)
+
+                    print("{} | {} | {} in {:.2f} s".format(time.strftime("%Y-%m-%d %H:%M:%S"), stage_name.upper(),
+                                                           "FINISHED" if succeeded else "FAILED", duration),
+                          flush=True)
+
+        return durations
+
+    def _run_stage(self, stage_class: type) -> (bool, float):
+        start = time.perf_counter()
+        try:
+            stage = stage_class(self._get_stage_arguments(stage_class))
+            stage.run()
+            succeeded = True
+        except BaseException as e:
+            self.logger.critical("Stage '{}' failed: {}".format(stage_class.__name__, repr(e)))
+            succeeded = False
+        return succeeded, time.perf_counter() - start
+
+    def _print_summary(self, stages: dict, durations: dict) -> None:
+        summary = ["============================================================",
+                   "STAGES' WALL-CLOCK TIMES"]
+        for stage_name in stages:
+            duration = durations.get(stage_name, None)
+            duration_text = "skipped" if duration is None else "{:.2f} s".format(duration)
+            summary.append("{:<25} {}".format(stage_name, duration_text))
+        print("\n".join(summary), flush=True)
+
+
+if __name__ == '__main__':
+    process = Process()
+    process.run()
@@ -25,49 +25,7 @@ mkdir -p "${LOG_DATA_DIR}"
 {
   echo "====================$current_time====================="
 
-  echo "============================================================"
-  echo "DOWNLOAD CALENDARS"
-  python3 -u bin/download_calendars.py --log-file "${log_file_path}"
-
-  echo "============================================================"
-  echo "PARSE CALENDARS"
-  python3 -u bin/parse_calendars.py --log-file "${log_file_path}"
-
-  echo "============================================================"
-  echo "DOWNLOAD EVENTS"
-  python3 -u bin/download_events.py --log-file "${log_file_path}"
-
-  echo "============================================================"
-  echo "PARSE EVENTS"
-  python3 -u bin/parse_events.py --log-file "${log_file_path}"
-
-  echo "============================================================"
-  echo "PROCESS EVENTS' DATETIME"
-  python3 -u bin/process_datetime.py --log-file "${log_file_path}"
-
-  echo "============================================================"
-  echo "GEOCODE EVENTS' LOCATION"
-  python3 -u bin/geocode_location.py --log-file "${log_file_path}"
-
-  echo "============================================================"
-  echo "EXTRACT EVENTS' KEYWORDS"
-  python3 -u bin/extract_keywords.py --log-file "${log_file_path}"
-
-  echo "============================================================"
-  echo "UNIFY EVENTS' TYPES"
-  python3 -u bin/unify_types.py --log-file "${log_file_path}"
-
-  echo "============================================================"
-  echo "DEDUPLICATE EVENTS"
-  python3 -u bin/deduplicate_events.py --log-file "${log_file_path}"
-
-  echo "============================================================"
-  echo "PREPARE CRAWLER'S STATUS"
-  python3 -u bin/prepare_crawler_status.py --log-file "${log_file_path}"
-
-  echo "============================================================"
-  echo "GENERATE WEBSITE'S HTML"
-  python3 -u bin/generate_html.py --log-file "${log_file_path}"
+  python3 -u bin/process.py --log-file "${log_file_path}"
 } >>"${log_file_path}"
 
 mkdir -p "${PUBLIC_HTML_DIR}"
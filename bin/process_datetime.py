@@ -1,7 +1,6 @@
 import argparse
 import json
 import logging
-import multiprocessing
 import sqlite3
 import sys
 from typing import List
@@ -10,14 +9,17 @@ from lib import utils, logger
 from lib.arguments_parser import ArgumentsParser
 from lib.constants import SIMPLE_LOGGER_PREFIX
 from lib.datetime_parser import DatetimeParser
+from lib.executor import Executor
+from lib.metrics import StageMetrics
 
 
 class ProcessDatetime:
     """ Processes datetime of parsed events. """
 
-    def __init__(self):
-        self.args = self._parse_arguments()
+    def __init__(self, args: List[str] = None) -> None:
+        self.args = self._parse_arguments(args)
         self.logger = logger.set_up_script_logger(__file__, log_file=self.args.log_file, log_level=self.args.log_level)
+        self.metrics = StageMetrics(__file__)
         self.connection = utils.create_connection()
 
         if not self.args.dry_run:
@@ -25,7 +27,7 @@ class ProcessDatetime:
                                   ["calendar", "event_url", "event_html", "event_data", "event_data_datetime"])
 
     @staticmethod
-    def _parse_arguments() -> argparse.Namespace:
+    def _parse_arguments(args: List[str] = None) -> argparse.Namespace:
         parser = ArgumentsParser()
         parser.set_description("Processes datetime of parsed events.")
         parser.add_argument('--domain', type=str, default=None,
@@ -36,12 +38,14 @@ class ProcessDatetime:
                             help="process datetime only of events with the specified event_data IDs")
         parser.add_argument('--process-all', action='store_true', default=False,
                             help="process datetime of even already processed events")
-        return parser.parse_args()
+        return parser.parse_args(args)
 
     def run(self) -> None:
         input_events = self._load_input_events()
+        self.metrics.set_count('input_events', len(input_events))
         datetimes_to_insert = self._process_datetimes(input_events)
         self._store_to_database(datetimes_to_insert)
+        self.metrics.store(self.logger, self.args.dry_run)
         self.connection.close()
 
     def _load_input_events(self) -> List[tuple]:
@@ -94,8 +98,9 @@ class ProcessDatetime:
             website_base = utils.get_base_by_url(calendar_url)
             input_tuples.append((index + 1, len(input_events), event_tuple, website_base))
 
-        with multiprocessing.Pool(32) as p:
-            return p.map(ProcessDatetime._process_datetimes_process, input_tuples)
+        executor = Executor(Executor.PROCESS, self.args.workers, self.args.inline_threshold, metrics=self.metrics)
+        return executor.map(ProcessDatetime._process_datetimes_process, input_tuples,
+                            [event_tuple[2] for event_tuple in input_events])
 
     @staticmethod
     def _process_datetimes_process(input_tuple: (int, int, (int, str, str, str), dict)) -> (List[tuple], int):
@@ -126,6 +131,12 @@ class ProcessDatetime:
 
         return processed_datetimes, event_data_id
 
+    @staticmethod
+    def _get_rows_to_insert(processed_datetimes: List[tuple], event_data_id: int) -> List[tuple]:
+        if not processed_datetimes:
+            processed_datetimes = [(None, None, None, None)]
+        return list(set([tpl + (event_data_id,) for tpl in processed_datetimes]))
+
     def _store_to_database(self, datetimes_to_insert: List[tuple]) -> None:
         if not self.args.dry_run:
             self.logger.info("Inserting into DB...")
@@ -137,10 +148,9 @@ class ProcessDatetime:
 
             if not processed_datetimes:
                 nok.append(event_data_id)
-                processed_datetimes = [(None, None, None, None)]
 
-            tuples_to_insert = [tpl + (event_data_id,) for tpl in processed_datetimes]
-            tuples_to_insert = ", ".join([tpl.__str__().replace('None', 'null') for tpl in set(tuples_to_insert)])
+            tuples_to_insert = ProcessDatetime._get_rows_to_insert(processed_datetimes, event_data_id)
+            tuples_to_insert = ", ".join([tpl.__str__().replace('None', 'null') for tpl in tuples_to_insert])
 
             if not self.args.dry_run:
                 curr_percentage = (index + 1) / len(datetimes_to_insert) * 100
@@ -1,3 +1,5 @@
+import sqlite3
+
 from lib import utils, logger
 
 
@@ -19,7 +21,13 @@ class SetupDB:
             schema = schema_file.read().split(";")
 
             for command in schema:
-                self.connection.execute(command)
+                try:
+                    self.connection.execute(command)
+                except sqlite3.OperationalError as e:
+                    # columns added to existing tables by ALTER TABLE are already there on a repeated set-up
+                    if not (command.strip().upper().startswith("ALTER TABLE") and
+                            str(e).startswith("duplicate column name")):
+                        raise e
 
         self.connection.commit()
         self.connection.close()
@@ -1,43 +1,48 @@
 import argparse
 import json
 import logging
-import multiprocessing
 import re
 import sqlite3
 from collections import defaultdict
 from typing import List
 
-from lib import utils, logger
+from lib import utils, logger, worker_state
 from lib.arguments_parser import ArgumentsParser
 from lib.constants import EVENT_TYPES_JSON_FILE_PATH, SIMPLE_LOGGER_PREFIX
+from lib.executor import Executor
+from lib.metrics import StageMetrics
 
 
 class UnifyTypes:
     """ Unifies types of parsed events. """
 
-    def __init__(self) -> None:
-        self.args = self._parse_arguments()
+    def __init__(self, args: List[str] = None) -> None:
+        self.args = self._parse_arguments(args)
         self.logger = logger.set_up_script_logger(__file__, log_file=self.args.log_file, log_level=self.args.log_level)
+        self.metrics = StageMetrics(__file__)
         self.connection = utils.create_connection()
 
         if not self.args.dry_run:
             utils.check_db_tables(self.connection, ["event_data", "event_data_keywords", "event_data_types"])
 
     @staticmethod
-    def _parse_arguments() -> argparse.Namespace:
+    def _parse_arguments(args: List[str] = None) -> argparse.Namespace:
         parser = ArgumentsParser()
         parser.set_description("Unifies types of parsed events.")
         parser.add_argument('--events-ids', type=int, nargs="*",
                             help="unify types only of events with the specified event_data IDs")
         parser.add_argument('--unify-all', action='store_true', default=False,
                             help="unify types even of already processed events")
-        return parser.parse_args()
+        return parser.parse_args(args)
 
     def run(self) -> None:
         input_events = self._load_input_events()
+        self.metrics.set_count('input_events', len(input_events))
+        self.logger.info("Preparing custom types...")
         types_mapping = self._prepare_types()
         types_to_insert = self._unify_types(input_events, types_mapping)
         self._store_to_db(types_to_insert)
+        self.metrics.store(self.logger, self.args.dry_run)
         self.connection.close()
 
     def _load_input_events(self) -> dict:
@@ -76,9 +81,8 @@ class UnifyTypes:
 
         return input_event_dict
 
-    def _prepare_types(self) -> dict:
-        self.logger.info("Preparing custom types...")
-
+    @staticmethod
+    def _prepare_types() -> dict:
         with open(EVENT_TYPES_JSON_FILE_PATH, 'r') as types_file:
             types_list = json.load(types_file)
 
@@ -97,18 +101,30 @@ class UnifyTypes:
 
         logger.set_up_simple_logger(SIMPLE_LOGGER_PREFIX + __file__,
                                     log_file=self.args.log_file, log_level=self.args.log_level)
+        worker_states = UnifyTypes._get_worker_states(types_mapping)
         input_tuples = []
         for index, event_id in enumerate(input_events):
-            input_tuples.append((index + 1, len(input_events), input_events[event_id], types_mapping))
+            input_tuples.append((index + 1, len(input_events), input_events[event_id]))
 
-        with multiprocessing.Pool(32) as p:
-            return p.map(UnifyTypes._unify_types_process, input_tuples)
+        executor = Executor(Executor.PROCESS, self.args.workers, self.args.inline_threshold, worker_states,
+                            metrics=self.metrics)
+        return executor.map(UnifyTypes._unify_types_process, input_tuples,
+                            ["event_data {}".format(event_id) for event_id in input_events])
 
     @staticmethod
-    def _unify_types_process(input_tuple: (int, int, dict, dict)) -> (int, List[str], List[str]):
+    def _get_worker_states(types_mapping: dict) -> dict:
+        return {
+            UnifyTypes.__name__: {
+                'types_mapping': types_mapping
+            }
+        }
+
+    @staticmethod
+    def _unify_types_process(input_tuple: (int, int, dict)) -> (int, List[str], List[str]):
         simple_logger = logging.getLogger(SIMPLE_LOGGER_PREFIX + __file__)
+        types_mapping = worker_state.get(UnifyTypes.__name__)['types_mapping']
 
-        input_index, total_length, event_dict, types_mapping = input_tuple
+        input_index, total_length, event_dict = input_tuple
         event_id = event_dict['id']
 
         info_output = "{}/{} | Unifying types of: {}".format(input_index, total_length, event_id)
@@ -144,6 +160,12 @@ class UnifyTypes:
                 return True
         return False
 
+    @staticmethod
+    def _get_rows_to_insert(event_data_id: int, types: List[str]) -> List[tuple]:
+        if len(types) == 0:
+            return [(None, event_data_id)]
+        return [(event_type, event_data_id) for event_type in types]
+
     def _store_to_db(self, types_to_insert: List[tuple]) -> None:
         self.logger.info("Inserting into DB...")
 
@@ -155,22 +177,18 @@ class UnifyTypes:
                 'original_types': old_types,
                 'matched_types': types
             }
-            values = []
             if len(types) == 0:
                 nok += 1
                 events_without_type.append(event_data_id)
-                values = ['({}, {})'.format("null", str(event_data_id))]
-            else:
-                for event_type in types:
-                    values.append('("{}", {})'.format(event_type, str(event_data_id)))
+            values = UnifyTypes._get_rows_to_insert(event_data_id, types)
 
             if not self.args.dry_run:
                 query = '''
                             INSERT OR IGNORE INTO event_data_types(type, event_data_id)
-                            VALUES {}
-                        '''.format(', '.join(values))
+                            VALUES (?, ?)
+                        '''
                 try:
-                    self.connection.execute(query)
+                    self.connection.executemany(query, values)
                 except sqlite3.Error as e:
                     self.logger.error(
                         "Error occurred when storing {} into 'event_data_types' table: {}".format(values, str(e)))
@@ -0,0 +1,217 @@
+import argparse
+import csv
+import json
+import os
+import random
+import shutil
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from string import Template
+from typing import List
+
+from lib import utils
+from lib.constants import BENCHMARK_DATA_DIR_PATH, EVENT_TYPES_JSON_FILE_PATH, MUNICIPALITIES_OF_CR_FILE_PATH
+
+
+class GenerateCorpus:
+    """ Generates a synthetic corpus of calendar and event HTML pages for the existing parsers. """
+
+    TEMPLATES_DIR_PATH = "resources/benchmark/templates"
+    OUTPUT_DIR_PATH = os.path.join(BENCHMARK_DATA_DIR_PATH, "corpus")
+    MANIFEST_FILE_NAME = "corpus.json"
+
+    MONTHS = ["ledna", "února", "března", "dubna", "května", "června",
+              "července", "srpna", "září", "října", "listopadu", "prosince"]
+    WEEKDAYS = ["Pondělí", "Úterý", "Středa", "Čtvrtek", "Pátek", "Sobota", "Neděle"]
+    WEEKDAYS_SHORT = ["Po", "Út", "St", "Čt", "Pá", "So", "Ne"]
+
+    TITLE_PREFIXES = ["Jarní", "Letní", "Podzimní", "Zimní", "Tradiční", "Dětská", "Benefiční", "Obecní",
+                      "Sousedská", "Rodinná", "Historická"]
+    ORGANIZERS = ["Obecní úřad", "Kulturní dům", "Sbor dobrovolných hasičů", "Tělovýchovná jednota Sokol",
+                  "Místní knihovna", "Římskokatolická farnost", "Spolek rodičů", "Městské muzeum"]
+    PEREX_SENTENCES = ["Srdečně vás zveme na {keyword}, který se koná v {locative}.",
+                       "Těšit se můžete na bohatý program pro celou rodinu.",
+                       "Vstupné je dobrovolné, občerstvení zajištěno.",
+                       "Akce se koná za každého počasí.",
+                       "Součástí programu bude také {keyword} pro nejmenší.",
+                       "Výtěžek akce bude věnován na obnovu místní kaple.",
+                       "Přijďte strávit příjemné odpoledne v {locative}."]
+
+    def __init__(self) -> None:
+        self.args = self._parse_arguments()
+
+    @staticmethod
+    def _parse_arguments() -> argparse.Namespace:
+        parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+                                         description="Generates a synthetic corpus of calendar and event HTML pages "
+                                                     "for the existing parsers.")
+        GenerateCorpus.add_arguments(parser)
+        return parser.parse_args()
+
+    @staticmethod
+    def add_arguments(parser: argparse.ArgumentParser) -> None:
+        parser.add_argument('--output-dir', type=str, default=GenerateCorpus.OUTPUT_DIR_PATH,
+                            help="generate the corpus into the specified directory (its content is replaced)")
+        parser.add_argument('--calendars', type=int, default=100,
+                            help="generate the specified number of calendars")
+        parser.add_argument('--events-per-calendar', type=int, default=20,
+                            help="generate the specified number of events for each calendar")
+        parser.add_argument('--parsers', type=str, nargs="*", default=None,
+                            help="generate calendars only for the specified parsers; by default all the parsers "
+                                 "in the proportion of the input websites base")
+        parser.add_argument('--seed', type=int, default=42,
+                            help="a seed of the random generator to get a reproducible corpus")
+
+    def run(self) -> None:
+        manifest = GenerateCorpus.generate(self.args.output_dir, self.args.calendars, self.args.events_per_calendar,
+                                           self.args.parsers, self.args.seed)
+        print("Generated {} calendars with {} events into: {}".format(
+            len(manifest), len(manifest) * self.args.events_per_calendar, self.args.output_dir))
+
+    @staticmethod
+    def generate(output_dir: str, calendars_count: int, events_per_calendar: int, parsers: List[str] = None,
+                 seed: int = 42) -> List[dict]:
+        """ Generates a synthetic corpus of calendar and event HTML pages into the specified directory.
+        Each calendar gets its own subdirectory with a 'calendar.html' page and an 'events' subdirectory.
+
+        :param output_dir: a directory to generate the corpus into (its content is replaced)
+        :param calendars_count: a number of calendars to generate
+        :param events_per_calendar: a number of events to generate for each calendar
+        :param parsers: names of parsers to generate the calendars for;
+                        if None, all the parsers in the proportion of the input websites base
+        :param seed: a seed of the random generator
+        :return: a manifest of the generated calendars (domain, parser, path and default location)
+        """
+
+        randomizer = random.Random(seed)
+        templates = GenerateCorpus._load_templates(parsers)
+        municipalities = GenerateCorpus._load_municipalities()
+        event_types = GenerateCorpus._load_event_types()
+        calendar_parsers = GenerateCorpus._choose_calendar_parsers(randomizer, calendars_count, list(templates.keys()))
+
+        shutil.rmtree(output_dir, ignore_errors=True)
+        os.makedirs(output_dir)
+
+        manifest = []
+        for calendar_index, parser_name in enumerate(calendar_parsers):
+            template = templates[parser_name]
+            municipality = randomizer.choice(municipalities)
+            domain = "benchmark_{}_{}".format(parser_name, calendar_index + 1)
+            calendar_dir = os.path.join(output_dir, domain)
+            os.makedirs(os.path.join(calendar_dir, "events"))
+
+            calendar_items = []
+            for event_index in range(events_per_calendar):
+                event = GenerateCorpus._generate_event(randomizer, municipality, municipalities, event_types)
+                event_html = GenerateCorpus._render_event(template, event)
+                with open(os.path.join(calendar_dir, "events", "{}.html".format(event_index + 1)), 'w',
+                          encoding="utf-8") as event_file:
+                    event_file.write(event_html)
+                calendar_items.append(Template(template["calendar_item"]).substitute(
+                    href="events/{}.html".format(event_index + 1), title=event["title"]))
+
+            with open(os.path.join(calendar_dir, "calendar.html"), 'w', encoding="utf-8") as calendar_file:
+                calendar_file.write(Template(template["calendar"]).substitute(items="".join(calendar_items)))
+
+            manifest.append({
+                "domain": domain,
+                "parser": parser_name,
+                "path": "{}/calendar.html".format(domain),
+                "default_gps": municipality["gps"],
+                "default_location": "Obec {}".format(municipality["name"])
+            })
+
+        utils.store_to_json_file(manifest, os.path.join(output_dir, GenerateCorpus.MANIFEST_FILE_NAME))
+        return manifest
+
+    @staticmethod
+    def _load_templates(parsers: List[str] = None) -> dict:
+        templates = {}
+        for file_name in sorted(os.listdir(GenerateCorpus.TEMPLATES_DIR_PATH)):
+            parser_name = file_name[:-len(".json")]
+            if parsers and parser_name not in parsers:
+                continue
+            with open(os.path.join(GenerateCorpus.TEMPLATES_DIR_PATH, file_name), encoding="utf-8") as template_file:
+                templates[parser_name] = json.load(template_file)
+
+        unknown_parsers = set(parsers or []) - set(templates.keys())
+        if unknown_parsers:
+            exception_msg = "There are no benchmark templates for parsers: {}".format(sorted(unknown_parsers))
+            raise Exception(exception_msg)
+        return templates
+
+    @staticmethod
+    def _load_municipalities() -> List[dict]:
+        with open(MUNICIPALITIES_OF_CR_FILE_PATH, encoding="utf-8") as municipalities_file:
+            reader = csv.reader(municipalities_file)
+            next(reader)
+            return [{'name': row[0], 'locative': row[2], 'gps': row[3]} for row in reader]
+
+    @staticmethod
+    def _load_event_types() -> List[dict]:
+        with open(EVENT_TYPES_JSON_FILE_PATH, encoding="utf-8") as event_types_file:
+            return [event_type for event_type in json.load(event_types_file) if event_type.get("keywords")]
+
+    @staticmethod
+    def _choose_calendar_parsers(randomizer: random.Random, calendars_count: int, parsers: List[str]) -> List[str]:
+        """ Chooses a parser for each calendar - every parser once and the rest in the proportion of the base. """
+
+        base_counts = Counter([website_base["parser"] for website_base in utils.get_active_base()])
+        weights = [base_counts.get(parser_name, 1) for parser_name in parsers]
+
+        calendar_parsers = parsers[:calendars_count]
+        calendar_parsers.extend(randomizer.choices(parsers, weights=weights, k=calendars_count - len(calendar_parsers)))
+        return calendar_parsers
+
+    @staticmethod
+    def _generate_event(randomizer: random.Random, municipality: dict, municipalities: List[dict],
+                        event_types: List[dict]) -> dict:
+        location = municipality if randomizer.random() < 0.8 else randomizer.choice(municipalities)
+        types = randomizer.sample(event_types, randomizer.randint(1, 2))
+        keyword = randomizer.choice(types[0]["keywords"])
+
+        perex = " ".join(randomizer.sample(GenerateCorpus.PEREX_SENTENCES, 3))
+        perex = perex.format(keyword=keyword, locative=location["locative"])
+
+        start = datetime.combine(date.today() + timedelta(days=randomizer.randint(-30, 180)),
+                                 time(randomizer.randint(8, 19), randomizer.choice([0, 15, 30, 45])))
+        end = start + timedelta(hours=randomizer.randint(1, 4), minutes=randomizer.choice([0, 15, 30]))
+        lat, lon = location["gps"].split(",")
+
+        return {
+            'title': "{} akce v {}: {}".format(randomizer.choice(GenerateCorpus.TITLE_PREFIXES), location["locative"],
+                                               types[0]["type"]),
+            'perex': perex,
+            'start': start,
+            'end': end,
+            'location': location["name"],
+            'lat': lat.strip(),
+            'lon': lon.strip(),
+            'organizer': "{} {}".format(randomizer.choice(GenerateCorpus.ORGANIZERS), municipality["name"]),
+            'types': [event_type["type"] for event_type in types]
+        }
+
+    @staticmethod
+    def _render_event(template: dict, event: dict) -> str:
+        start, end = event['start'], event['end']
+        event_datetime = Template(template["datetime"]).substitute(
+            day="{:02d}".format(start.day), day_unpadded=str(start.day),
+            month="{:02d}".format(start.month), month_unpadded=str(start.month),
+            month_name=GenerateCorpus.MONTHS[start.month - 1],
+            year=str(start.year), year_short="{:02d}".format(start.year % 100),
+            weekday=GenerateCorpus.WEEKDAYS[start.weekday()],
+            weekday_short=GenerateCorpus.WEEKDAYS_SHORT[start.weekday()],
+            start_hour="{:02d}".format(start.hour), start_minute="{:02d}".format(start.minute),
+            end_hour="{:02d}".format(end.hour), end_minute="{:02d}".format(end.minute))
+        types = template["type_separator"].join([Template(template["type_item"]).substitute(type=event_type)
+                                                 for event_type in event['types']])
+
+        return Template(template["event"]).substitute(
+            title=event['title'], perex=event['perex'], datetime=event_datetime, location=event['location'],
+            lat=event['lat'], lon=event['lon'], organizer=event['organizer'], types=types,
+            start_hour="{:02d}".format(start.hour), start_minute="{:02d}".format(start.minute))
+
+
+if __name__ == '__main__':
+    generate_corpus_script = GenerateCorpus()
+    generate_corpus_script.run()
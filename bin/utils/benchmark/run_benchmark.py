@@ -0,0 +1,241 @@
+import argparse
+import functools
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+from bin.parse_events import ParseEvents
+from bin.process import Process
+from bin.utils.benchmark.generate_corpus import GenerateCorpus
+from lib import utils
+from lib.constants import BENCHMARK_DATA_DIR_PATH, DATABASE_PATH, INPUT_SITES_BASE_FILE_PATH, METRICS_DIR_PATH
+
+
+class CorpusRequestHandler(SimpleHTTPRequestHandler):
+    """ Serves files of a synthetic corpus as UTF-8 HTML pages with an optional simulated latency. """
+
+    extensions_map = dict(SimpleHTTPRequestHandler.extensions_map, **{'.html': "text/html; charset=utf-8"})
+    latency = 0.0
+
+    def do_GET(self) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+        super().do_GET()
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class RunBenchmark:
+    """ Runs the whole pipeline against a synthetic corpus served locally and reports throughput of its stages. """
+
+    SCRATCH_DIR_PATH = os.path.join(BENCHMARK_DATA_DIR_PATH, "scratch")
+    REPORT_FILE_PATH = os.path.join(BENCHMARK_DATA_DIR_PATH, "report.json")
+    MAX_HOSTS = 254
+
+    def __init__(self) -> None:
+        self.args = self._parse_arguments()
+        self.repository_dir = os.getcwd()
+        self.hosts_count = None
+
+    @staticmethod
+    def _parse_arguments() -> argparse.Namespace:
+        parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+                                         description="Runs the whole pipeline against a synthetic corpus served "
+                                                     "locally and reports throughput of its stages.")
+        GenerateCorpus.add_arguments(parser)
+        parser.add_argument('--reuse-corpus', action='store_true', default=False,
+                            help="don't generate the corpus, use the one already in the output directory")
+        parser.add_argument('--scratch-dir', type=str, default=RunBenchmark.SCRATCH_DIR_PATH,
+                            help="run the pipeline in the specified directory (its content is replaced)")
+        parser.add_argument('--port', type=int, default=0,
+                            help="serve the corpus on the specified port; by default on any free port")
+        parser.add_argument('--hosts', type=int, default=None,
+                            help="serve the calendars from the specified number of loopback hosts (127.0.0.X) to "
+                                 "simulate distinct websites; by default one per calendar (at most {}); "
+                                 "use 1 on systems without the whole 127.0.0.0/8 loopback range".format(
+                                RunBenchmark.MAX_HOSTS))
+        parser.add_argument('--latency', type=float, default=0.0,
+                            help="simulate the specified latency (in seconds) of every HTTP request")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="run the stages with the specified number of parallel workers")
+        parser.add_argument('--stages', type=str, nargs="*", choices=list(Process.STAGES.keys()), default=None,
+                            help="run only the specified stages of the pipeline")
+        parser.add_argument('--pipeline', action='store_true', default=False,
+                            help="parse the events as they are downloaded (see bin/process.py)")
+        parser.add_argument('--no-spool', action='store_true', default=False,
+                            help="with --pipeline, hand the downloaded pages to the parsers in memory")
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument('--record', type=str, default=None,
+                           help="record the HTTP responses of the download stages into the specified cassette file")
+        group.add_argument('--replay', type=str, default=None,
+                           help="replay the HTTP responses of the download stages from the specified cassette file "
+                                "(recorded with the same --port and --hosts, so the URLs match)")
+        parser.add_argument('--replay-latency', action='store_true', default=False,
+                            help="with --replay, replay the HTTP responses with their recorded latency")
+
+        arguments = parser.parse_args()
+        if arguments.replay_latency and not arguments.replay:
+            parser.error("--replay-latency requires --replay")
+        return arguments
+
+    def run(self) -> None:
+        manifest = self._prepare_corpus()
+        self.hosts_count = min(self.args.hosts or len(manifest), RunBenchmark.MAX_HOSTS)
+        servers = [self._start_server("127.0.0.{}".format(index + 1)) for index in range(self.hosts_count)]
+        try:
+            self._prepare_scratch_dir(manifest, [server.server_address for server in servers])
+            pipeline_duration = self._run_pipeline()
+        finally:
+            for server in servers:
+                server.shutdown()
+                server.server_close()
+
+        report = self._prepare_report(manifest, pipeline_duration)
+        os.makedirs(os.path.dirname(RunBenchmark.REPORT_FILE_PATH), exist_ok=True)
+        utils.store_to_json_file(report, RunBenchmark.REPORT_FILE_PATH)
+        self._print_report(report)
+
+    def _prepare_corpus(self) -> List[dict]:
+        if self.args.reuse_corpus:
+            with open(os.path.join(self.args.output_dir, GenerateCorpus.MANIFEST_FILE_NAME)) as manifest_file:
+                return json.load(manifest_file)
+
+        print("Generating corpus of {} calendars with {} events each...".format(self.args.calendars,
+                                                                                 self.args.events_per_calendar))
+        return GenerateCorpus.generate(self.args.output_dir, self.args.calendars, self.args.events_per_calendar,
+                                       self.args.parsers, self.args.seed)
+
+    def _start_server(self, host: str) -> ThreadingHTTPServer:
+        CorpusRequestHandler.latency = self.args.latency
+        handler = functools.partial(CorpusRequestHandler, directory=os.path.abspath(self.args.output_dir))
+        server = ThreadingHTTPServer((host, self.args.port), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        print("Serving corpus on {}:{}...".format(*server.server_address))
+        return server
+
+    def _prepare_scratch_dir(self, manifest: List[dict], server_addresses: List[tuple]) -> None:
+        """ Prepares a working directory of the pipeline with a fresh DB and a base of the corpus calendars. """
+
+        scratch_dir = self.args.scratch_dir
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+        os.makedirs(os.path.join(scratch_dir, "data", "log"))
+
+        resources_dir = os.path.join(self.repository_dir, "resources")
+        os.makedirs(os.path.join(scratch_dir, "resources"))
+        for file_name in os.listdir(resources_dir):
+            if file_name != os.path.basename(INPUT_SITES_BASE_FILE_PATH):
+                os.symlink(os.path.join(resources_dir, file_name), os.path.join(scratch_dir, "resources", file_name))
+        os.symlink(os.path.join(self.repository_dir, "web"), os.path.join(scratch_dir, "web"))
+
+        base = [{
+            "domain": calendar["domain"],
+            "url": "http://{}:{}/{}".format(*server_addresses[index % len(server_addresses)], calendar["path"]),
+            "parser": calendar["parser"],
+            "default_gps": calendar["default_gps"],
+            "default_location": calendar["default_location"]
+        } for index, calendar in enumerate(manifest)]
+        utils.store_to_json_file(base, os.path.join(scratch_dir, INPUT_SITES_BASE_FILE_PATH))
+
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        open(os.path.join(scratch_dir, "data", "log", "cron_clean_up_files_{}.txt".format(timestamp)), 'w').close()
+        self._run_script("bin/setup_db.py", [])
+
+    def _run_pipeline(self) -> float:
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        arguments = ["--log-file", "data/log/cron_process_{}.txt".format(timestamp)]
+        if self.args.workers:
+            arguments.extend(["--workers", str(self.args.workers)])
+        if self.args.stages:
+            arguments.extend(["--stages"] + self.args.stages)
+        if self.args.pipeline:
+            arguments.append("--pipeline")
+        if self.args.no_spool:
+            arguments.append("--no-spool")
+        # the pipeline runs in the scratch directory
+        if self.args.record:
+            arguments.extend(["--record", os.path.abspath(self.args.record)])
+        if self.args.replay:
+            arguments.extend(["--replay", os.path.abspath(self.args.replay)])
+            if self.args.replay_latency:
+                arguments.append("--replay-latency")
+
+        print("Running pipeline in '{}'...".format(self.args.scratch_dir))
+        start = time.perf_counter()
+        self._run_script("bin/process.py", arguments)
+        return time.perf_counter() - start
+
+    def _run_script(self, script_path: str, arguments: List[str]) -> None:
+        environment = dict(os.environ, PYTHONPATH=self.repository_dir)
+        subprocess.run([sys.executable, "-u", os.path.join(self.repository_dir, script_path)] + arguments,
+                       cwd=self.args.scratch_dir, env=environment, check=True)
+
+    def _prepare_report(self, manifest: List[dict], pipeline_duration: float) -> dict:
+        connection = sqlite3.connect(os.path.join(self.args.scratch_dir, DATABASE_PATH))
+        counts = {}
+        for table in ["calendar", "event_url", "event_html", "event_data", "event_data_datetime", "event_data_gps",
+                      "event_data_keywords", "event_data_types"]:
+            counts[table] = connection.execute('''SELECT count(*) FROM {}'''.format(table)).fetchone()[0]
+        connection.close()
+
+        stages = {}
+        # events parsed in the pipeline of download_events are reported apart from the parse_events stage
+        for stage_name in list(Process.STAGES) + ["parse_events_" + ParseEvents.PIPELINE_MODE]:
+            metrics_file_path = os.path.join(self.args.scratch_dir, METRICS_DIR_PATH, "{}.json".format(stage_name))
+            if not os.path.isfile(metrics_file_path):
+                continue
+            with open(metrics_file_path) as metrics_file:
+                metrics = json.load(metrics_file)
+            items = sum(metrics['counts'].values())
+            stages[stage_name] = {
+                'wall_time': metrics['wall_time'],
+                'cpu_time': metrics['cpu_time'],
+                'items': items,
+                'tasks': metrics['tasks']['count'],
+                'throughput': items / metrics['wall_time'] if items and metrics['wall_time'] else None,
+                'p95': metrics['tasks']['p95'],
+                'pool_utilization': metrics['pool_utilization']
+            }
+
+        return {
+            'calendars': len(manifest),
+            'events_per_calendar': self.args.events_per_calendar,
+            'workers': self.args.workers,
+            'hosts': self.hosts_count,
+            'latency': self.args.latency,
+            'pipeline_wall_time': pipeline_duration,
+            'counts': counts,
+            'stages': stages
+        }
+
+    @staticmethod
+    def _print_report(report: dict) -> None:
+        lines = ["============================================================",
+                 "BENCHMARK: {} calendars, {} events, {} hosts, {:.2f} s".format(
+                     report['calendars'], report['calendars'] * report['events_per_calendar'], report['hosts'],
+                     report['pipeline_wall_time']),
+                 "{:<25} {:>10} {:>10} {:>8} {:>8} {:>12} {:>10}".format("stage", "wall [s]", "CPU [s]", "items",
+                                                                          "tasks", "items/s", "p95 [s]")]
+        for stage_name, stage in report['stages'].items():
+            lines.append("{:<25} {:>10.2f} {:>10.2f} {:>8} {:>8} {:>12} {:>10}".format(
+                stage_name, stage['wall_time'], stage['cpu_time'], stage['items'], stage['tasks'],
+                "-" if stage['throughput'] is None else "{:.1f}".format(stage['throughput']),
+                "-" if stage['p95'] is None else "{:.3f}".format(stage['p95'])))
+        lines.append("DB rows: {}".format(", ".join(["{}: {}".format(table, count)
+                                                     for table, count in report['counts'].items()])))
+        print("\n".join(lines))
+
+
+if __name__ == '__main__':
+    run_benchmark = RunBenchmark()
+    run_benchmark.run()
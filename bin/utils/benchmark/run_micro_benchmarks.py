@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import timeit
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Optional
+
+from lxml import etree
+
+from bin.deduplicate_events import DeduplicateEvents
+from bin.extract_keywords import ExtractKeywords
+from bin.geocode_location import GeocodeLocation
+from bin.unify_types import UnifyTypes
+from lib import utils, worker_state
+from lib.constants import BENCHMARK_DATA_DIR_PATH
+from lib.datetime_parser import DatetimeParser
+from lib.parser import Parser
+
+
+class RunMicroBenchmarks:
+    """ Measures the hot functions of the tool on checked-in fixtures and stores the results as JSON. """
+
+    FIXTURES_DIR_PATH = "resources/benchmark/fixtures"
+    FIXTURES_FILE_PATH = os.path.join(FIXTURES_DIR_PATH, "micro_benchmarks.json")
+    EVENTS_FIXTURES_DIR_PATH = os.path.join(FIXTURES_DIR_PATH, "events")
+    OUTPUT_FILE_PATH = os.path.join(BENCHMARK_DATA_DIR_PATH, "micro_benchmarks.json")
+
+    def __init__(self) -> None:
+        self.args = self._parse_arguments()
+        with open(RunMicroBenchmarks.FIXTURES_FILE_PATH, encoding="utf-8") as fixtures_file:
+            self.fixtures = json.load(fixtures_file)
+        self.benchmarks = {
+            "parser_get_event_data": self._benchmark_parser_get_event_data,
+            "datetime_parser_process_datetimes": self._benchmark_datetime_parser_process_datetimes,
+            "geocode_match_municipality_in_text": self._benchmark_geocode_match_municipality_in_text,
+            "extract_keywords_process": self._benchmark_extract_keywords_process,
+            "unify_types_process": self._benchmark_unify_types_process,
+            "deduplicate_are_short_texts_almost_equal": self._benchmark_deduplicate_are_short_texts_almost_equal,
+            "deduplicate_are_long_texts_almost_equal": self._benchmark_deduplicate_are_long_texts_almost_equal,
+            "deduplicate_are_gps_coords_almost_equal": self._benchmark_deduplicate_are_gps_coords_almost_equal
+        }
+
+    @staticmethod
+    def _parse_arguments() -> argparse.Namespace:
+        parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+                                         description="Measures the hot functions of the tool on checked-in fixtures "
+                                                     "and stores the results as JSON.")
+        parser.add_argument('--benchmarks', type=str, nargs="*", default=None,
+                            help="run only the specified benchmarks (see --list)")
+        parser.add_argument('--list', action='store_true', default=False,
+                            help="only list names of the available benchmarks")
+        parser.add_argument('--repeat', type=int, default=5,
+                            help="repeat each measurement the specified number of times")
+        parser.add_argument('--min-time', type=float, default=0.2,
+                            help="make each measurement last at least the specified number of seconds")
+        parser.add_argument('--output', type=str, default=RunMicroBenchmarks.OUTPUT_FILE_PATH,
+                            help="store the results into the specified JSON file")
+        return parser.parse_args()
+
+    def run(self) -> None:
+        if self.args.list:
+            print("\n".join(self.benchmarks.keys()))
+            return
+
+        results = {}
+        for name, benchmark in self.benchmarks.items():
+            if self.args.benchmarks and name not in self.args.benchmarks:
+                continue
+            results[name] = self._measure(benchmark)
+            print("{:<45} {}".format(name, self._format_result(results[name])))
+
+        output = {
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'commit': self._get_commit(),
+            'python': platform.python_version(),
+            'results': results
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(self.args.output)), exist_ok=True)
+        utils.store_to_json_file(output, self.args.output)
+
+    def _measure(self, benchmark: Callable) -> dict:
+        """ Measures a benchmark which prepares its inputs and returns a function processing all of them once. """
+
+        try:
+            function, items_count = benchmark()
+            function()
+        except Exception as e:
+            return {'error': "{}: {}".format(type(e).__name__, str(e))}
+
+        timer = timeit.Timer(function)
+        number, _ = timer.autorange()
+        number = max(1, int(number * self.args.min_time / 0.2))
+        timings = [timing / number for timing in timer.repeat(repeat=self.args.repeat, number=number)]
+
+        return {
+            'items': items_count,
+            'loops': number,
+            'repeat': self.args.repeat,
+            'min': min(timings),
+            'median': statistics.median(timings),
+            'per_item': min(timings) / items_count
+        }
+
+    @staticmethod
+    def _format_result(result: dict) -> str:
+        if 'error' in result:
+            return "ERROR ({})".format(result['error'])
+        return "{:10.3f} ms (median {:.3f} ms, {:.1f} us per item)".format(
+            result['min'] * 1000, result['median'] * 1000, result['per_item'] * 1000000)
+
+    @staticmethod
+    def _get_commit() -> Optional[str]:
+        try:
+            return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def _benchmark_parser_get_event_data(self) -> (Callable, int):
+        pages = []
+        for file_name in sorted(os.listdir(RunMicroBenchmarks.EVENTS_FIXTURES_DIR_PATH)):
+            with open(os.path.join(RunMicroBenchmarks.EVENTS_FIXTURES_DIR_PATH, file_name),
+                      encoding="utf-8") as html_file:
+                pages.append((file_name[:-len(".html")], etree.parse(html_file, etree.HTMLParser())))
+
+        def function():
+            for parser_name, dom in pages:
+                parser = Parser(parser_name)
+                parser.set_dom(dom)
+                parser.get_event_data()
+
+        return function, len(pages)
+
+    def _benchmark_datetime_parser_process_datetimes(self) -> (Callable, int):
+        datetimes = self.fixtures['datetimes']
+
+        def function():
+            for parser_name, db_datetimes in datetimes.items():
+                DatetimeParser(parser_name).process_datetimes(db_datetimes)
+
+        return function, sum([len(db_datetimes) for db_datetimes in datetimes.values()])
+
+    def _benchmark_geocode_match_municipality_in_text(self) -> (Callable, int):
+        municipalities = GeocodeLocation._load_municipalities_csv()
+        texts = self.fixtures['texts']
+
+        def function():
+            for text in texts:
+                GeocodeLocation._match_municipality_in_text(text, municipalities)
+
+        return function, len(texts)
+
+    def _benchmark_extract_keywords_process(self) -> (Callable, int):
+        worker_state.set_up(ExtractKeywords._get_worker_states(ExtractKeywords._prepare_keywords_dict()))
+        input_tuples = [(index + 1, len(self.fixtures['events']),
+                         (event['id'], event['title'], event['perex'], json.dumps(event['types'], ensure_ascii=False)))
+                        for index, event in enumerate(self.fixtures['events'])]
+
+        def function():
+            for input_tuple in input_tuples:
+                ExtractKeywords._extract_keywords_process(input_tuple)
+
+        return function, len(input_tuples)
+
+    def _benchmark_unify_types_process(self) -> (Callable, int):
+        worker_state.set_up(UnifyTypes._get_worker_states(UnifyTypes._prepare_types()))
+        input_tuples = [(index + 1, len(self.fixtures['events']),
+                         dict(event, keywords=defaultdict(list, event['keywords'])))
+                        for index, event in enumerate(self.fixtures['events'])]
+
+        def function():
+            for input_tuple in input_tuples:
+                UnifyTypes._unify_types_process(input_tuple)
+
+        return function, len(input_tuples)
+
+    def _benchmark_deduplicate_are_short_texts_almost_equal(self) -> (Callable, int):
+        pairs = [pair['title'] for pair in self.fixtures['pairs']]
+
+        def function():
+            for this_text, other_text in pairs:
+                DeduplicateEvents._are_short_texts_almost_equal(this_text, other_text)
+
+        return function, len(pairs)
+
+    def _benchmark_deduplicate_are_long_texts_almost_equal(self) -> (Callable, int):
+        pairs = [pair['perex'] for pair in self.fixtures['pairs']]
+
+        def function():
+            for this_text, other_text in pairs:
+                DeduplicateEvents._are_long_texts_almost_equal(this_text, other_text)
+
+        return function, len(pairs)
+
+    def _benchmark_deduplicate_are_gps_coords_almost_equal(self) -> (Callable, int):
+        pairs = [pair['gps'] for pair in self.fixtures['pairs']]
+
+        def function():
+            for this_gps, other_gps in pairs:
+                DeduplicateEvents._are_gps_coords_almost_equal(this_gps, other_gps)
+
+        return function, len(pairs)
+
+
+if __name__ == '__main__':
+    run_micro_benchmarks = RunMicroBenchmarks()
+    run_micro_benchmarks.run()
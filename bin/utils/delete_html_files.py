@@ -1,10 +1,12 @@
 import argparse
 import os
+from datetime import datetime, timedelta
 from typing import List
 
 from bin.download_events import DownloadEvents
 from lib import utils
 from lib.constants import DATA_DIR_PATH
+from lib.html_store import HtmlStore
 
 
 class DeleteHTMLFiles:
@@ -37,6 +39,7 @@ class DeleteHTMLFiles:
         input_domains = self._load_input_domains()
         removed_files = self._delete_html_files(input_domains)
         self._delete_db_rows(removed_files)
+        self._delete_html_blobs(input_domains)
 
     def _load_input_domains(self) -> List[str]:
         print("Loading input domains...")
@@ -99,6 +102,78 @@ class DeleteHTMLFiles:
                 '''.format(table_name, ', '.join(["{}".format(str(file_path)) for file_path in removed_files]))
         self.connection.execute(query)
 
+    def _delete_html_blobs(self, domain_list: List[str]) -> None:
+        """ Deletes snapshots in the content-addressed store (see lib.html_store) downloaded at the timestamp
+        unless they are still referred to by other rows. """
+
+        print("Deleting snapshots in the store...")
+
+        base_dict = utils.get_base_dict_per_url()
+        domains = set(domain_list)
+        calendar_urls = [url for url, calendar_base in base_dict.items() if calendar_base['domain'] in domains]
+
+        date_prefix, _, time_prefix = self.args.file_name_prefix.partition('_')
+        downloaded_at_prefix = date_prefix + (" " + time_prefix.replace('-', ':') if time_prefix else "")
+
+        if self.args.type == "calendars":
+            query = '''
+                        SELECT c.id, c.html_file_path
+                        FROM calendar c
+                        WHERE c.is_deleted == 0
+                    '''
+            table_name, table_alias = "calendar", "c"
+        else:
+            query = '''
+                        SELECT eh.id, eh.html_file_path
+                        FROM event_html eh
+                             INNER JOIN event_url eu ON eh.event_url_id = eu.id
+                             INNER JOIN calendar c ON eu.calendar_id = c.id
+                        WHERE eh.is_deleted == 0
+                    '''
+            table_name, table_alias = "event_html", "eh"
+        query += ''' AND {alias}.downloaded_at LIKE ? AND c.url IN ({urls})'''.format(
+            alias=table_alias, urls=', '.join(['?'] * len(calendar_urls)))
+        values = [downloaded_at_prefix + '%'] + calendar_urls
+        rows = [(row_id, file_path) for row_id, file_path in self.connection.execute(query, values).fetchall()
+                if HtmlStore.is_blob_path(file_path)]
+
+        removed_files = HtmlStore.remove_references(self.connection, [file_path for _, file_path in rows])
+        if not self.args.dry_run:
+            for file_path in removed_files:
+                if not HtmlStore.is_pack_path(file_path) and os.path.isfile(file_path):
+                    os.remove(file_path)
+
+            row_ids = [row_id for row_id, _ in rows]
+            if self.args.with_db_rows:
+                query = '''DELETE FROM {} WHERE id IN ({})'''
+            else:
+                query = '''UPDATE {} SET is_deleted = 1 WHERE id IN ({})'''
+            self.connection.execute(query.format(table_name, ', '.join(['?'] * len(row_ids))), row_ids)
+            self.connection.commit()
+        else:
+            self.connection.rollback()
+
+        print(">> {} rows released, {} snapshots{}deleted{}".format(
+            len(rows), len(removed_files), " would be " if self.args.dry_run else " ", ':' if removed_files else ''))
+        print(*removed_files, sep='\n')
+
+        if not self.args.dry_run:
+            self._drop_unreferenced_packs()
+
+    def _drop_unreferenced_packs(self) -> None:
+        """ Drops pack files of the store no row refers to anymore (except the ones still being written to). """
+
+        last_day = datetime.now().date() - timedelta(days=1)
+        dropped_pack_paths = []
+        for pack_path in HtmlStore.list_packs():
+            if HtmlStore.get_pack_day(pack_path) < last_day \
+                    and len(HtmlStore.get_pack_references(self.connection, pack_path)) == 0:
+                HtmlStore.drop_pack(pack_path)
+                dropped_pack_paths.append(pack_path)
+
+        print(">> {} pack files dropped{}".format(len(dropped_pack_paths), ':' if dropped_pack_paths else ''))
+        print(*dropped_pack_paths, sep='\n')
+
 
 if __name__ == '__main__':
     delete_html_files = DeleteHTMLFiles()
@@ -7,9 +7,8 @@ import urllib.parse as urllib
 from datetime import datetime
 from typing import List
 
-from lxml import etree
-
 from lib import utils
+from lib.html_store import HtmlStore
 from lib.parser import Parser
 
 
@@ -40,7 +39,7 @@ class FillCountsForCalendars:
         print("Loading input calendars...")
 
         query = '''
-                    SELECT id, url, html_file_path 
+                    SELECT id, url, html_file_path, encoding
                     FROM calendar 
                 '''
         cursor = self.connection.execute(query)
@@ -53,7 +52,7 @@ class FillCountsForCalendars:
         timestamp = datetime.now()
         input_tuples = []
         for index, calendar_tuple in enumerate(input_calendars):
-            _, calendar_url, _ = calendar_tuple
+            _, calendar_url, _, _ = calendar_tuple
             website_base = utils.get_base_by_url(calendar_url)
             input_tuples.append((index + 1, len(input_calendars), calendar_tuple, timestamp, website_base))
 
@@ -67,22 +66,21 @@ class FillCountsForCalendars:
         return self._get_new_counts(events_to_insert)
 
     @staticmethod
-    def _parse_calendars_process(input_tuple: (int, int, (int, str, str), datetime, dict)) -> dict:
+    def _parse_calendars_process(input_tuple: (int, int, (int, str, str, str), datetime, dict)) -> dict:
         input_index, total_length, calendar_tuple, timestamp, website_base = input_tuple
-        calendar_id, calendar_url, calendar_html_file_path = calendar_tuple
+        calendar_id, calendar_url, calendar_html_file_path, calendar_encoding = calendar_tuple
         file = os.path.basename(calendar_html_file_path)
 
         debug_output = "{}/{} | {}/{}".format(input_index, total_length, website_base["domain"], file)
 
-        if not os.path.isfile(calendar_html_file_path):
+        if not HtmlStore.exists(calendar_html_file_path):
             debug_output += " | 0 (File '{}' does not exist!)".format(calendar_html_file_path)
             print(debug_output)
             return {
                 calendar_id: []
             }
 
-        with open(calendar_html_file_path, encoding="utf-8") as html_file:
-            dom = etree.parse(html_file, etree.HTMLParser())
+        dom = HtmlStore.parse(calendar_html_file_path, calendar_encoding)
 
         parser = Parser(website_base["parser"])
         parser.set_dom(dom)
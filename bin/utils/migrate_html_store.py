@@ -0,0 +1,156 @@
+import argparse
+import os
+from typing import Dict, List
+
+from lib import utils
+from lib.html_codec import HtmlCodec
+from lib.html_store import HtmlStore
+
+
+class MigrateHtmlStore:
+    """ Moves HTML files downloaded before the pack files of the store (see lib.html_store) into today's pack
+    and points DB rows using them to their records. """
+
+    TABLES = ["calendar", "event_html"]
+    COMMIT_INTERVAL = 1000
+
+    def __init__(self) -> None:
+        self.args = self._parse_arguments()
+        self.connection = utils.create_connection()
+
+        utils.check_db_tables(self.connection, MigrateHtmlStore.TABLES + ["http_cache", "html_blob"])
+        HtmlStore.load_index(self.connection)
+
+    @staticmethod
+    def _parse_arguments() -> argparse.Namespace:
+        parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+        parser.add_argument('--dry-run', action='store_true', default=False,
+                            help="don't store anything permanently")
+        parser.add_argument('--keep-files', action='store_true', default=False,
+                            help="don't delete the migrated HTML files")
+        return parser.parse_args()
+
+    def run(self) -> None:
+        blob_paths = {}
+        for table_name in MigrateHtmlStore.TABLES:
+            input_rows = self._load_input_rows(table_name)
+            self._migrate_rows(table_name, input_rows, blob_paths)
+        print(">> {} files{}stored in the pack".format(len(blob_paths), " would be " if self.args.dry_run else " "))
+        self._update_http_cache(blob_paths)
+        self._delete_blob_references(list(sorted(blob_paths.keys())))
+        self._delete_files(list(sorted(blob_paths.keys())))
+        self.connection.close()
+
+    def _load_input_rows(self, table_name: str) -> List[tuple]:
+        print("Loading input rows of '{}' table...".format(table_name))
+
+        query = '''
+                    SELECT id, html_file_path
+                    FROM {}
+                    WHERE html_file_path IS NOT NULL
+                      AND is_deleted == 0
+                    ORDER BY id
+                '''.format(table_name)
+        cursor = self.connection.execute(query)
+        input_rows = [(row_id, html_file_path) for row_id, html_file_path in cursor.fetchall()
+                      if not HtmlStore.is_pack_path(html_file_path)]
+
+        print(">> Rows to migrate: {}".format(len(input_rows)))
+        return input_rows
+
+    def _migrate_rows(self, table_name: str, input_rows: List[tuple], blob_paths: Dict[str, str]) -> None:
+        print("Migrating rows of '{}' table...".format(table_name))
+
+        query = '''
+                    UPDATE {}
+                    SET html_file_path = ?
+                    WHERE id = ?
+                '''.format(table_name)
+
+        migrated_count = 0
+        missing_count = 0
+        for index, (row_id, html_file_path) in enumerate(input_rows):
+            if html_file_path not in blob_paths:
+                if not os.path.isfile(html_file_path):
+                    missing_count += 1
+                    continue
+                blob_paths[html_file_path] = self._store_file(html_file_path)
+
+            blob_path = blob_paths[html_file_path]
+            self.connection.execute(query, (blob_path, row_id))
+            HtmlStore.add_reference(self.connection, blob_path)
+            migrated_count += 1
+
+            if not self.args.dry_run and (index + 1) % MigrateHtmlStore.COMMIT_INTERVAL == 0:
+                self.connection.commit()
+
+        if self.args.dry_run:
+            self.connection.rollback()
+        else:
+            self.connection.commit()
+
+        print(">> Migrated rows: {}".format(migrated_count))
+        print(">> Rows with a missing file: {}".format(missing_count))
+
+    def _store_file(self, html_file_path: str) -> str:
+        if self.args.dry_run:
+            return HtmlStore.get_pack_path()
+        if HtmlStore.is_blob_path(html_file_path):
+            return HtmlStore.relocate(html_file_path)
+        with HtmlCodec.open(html_file_path) as html_file:
+            return HtmlStore.write(html_file)
+
+    def _update_http_cache(self, blob_paths: Dict[str, str]) -> None:
+        print("Updating HTTP cache...")
+
+        query = '''
+                    SELECT url, html_file_path
+                    FROM http_cache
+                '''
+        cursor = self.connection.execute(query)
+        values = [(blob_paths[html_file_path], url) for url, html_file_path in cursor.fetchall()
+                  if html_file_path in blob_paths]
+
+        query = '''
+                    UPDATE http_cache
+                    SET html_file_path = ?
+                    WHERE url = ?
+                '''
+        self.connection.executemany(query, values)
+        if self.args.dry_run:
+            self.connection.rollback()
+        else:
+            self.connection.commit()
+
+        print(">> Updated entries: {}".format(len(values)))
+
+    def _delete_blob_references(self, file_paths: List[str]) -> None:
+        """ Deletes reference counts of the migrated single blob files (rows refer to the pack's records now). """
+
+        query = '''
+                    DELETE FROM html_blob
+                    WHERE html_file_path = ?
+                '''
+        self.connection.executemany(query, [(file_path,) for file_path in file_paths
+                                            if HtmlStore.is_blob_path(file_path)])
+        if self.args.dry_run:
+            self.connection.rollback()
+        else:
+            self.connection.commit()
+
+    def _delete_files(self, file_paths: List[str]) -> None:
+        if self.args.keep_files:
+            return
+
+        print("Deleting migrated files...")
+
+        if not self.args.dry_run:
+            for file_path in file_paths:
+                os.remove(file_path)
+
+        print(">> {} files{}deleted".format(len(file_paths), " would be " if self.args.dry_run else " "))
+
+
+if __name__ == '__main__':
+    migrate_html_store = MigrateHtmlStore()
+    migrate_html_store.run()
@@ -2,11 +2,10 @@ import json
 import os
 from typing import List
 
-from lxml import etree
-
 from bin.utils.vismo_research.download_calendars import DownloadCalendars
 from lib import utils
 from lib.constants import VISMO_RESEARCH_DATA_DIR_PATH
+from lib.html_codec import HtmlCodec
 
 
 class ComputeStatistics:
@@ -67,8 +66,7 @@ class ComputeStatistics:
 
     @staticmethod
     def has_calendar(html_file_path: str) -> bool:
-        with open(html_file_path, 'r', encoding="utf-8") as content:
-            document = etree.parse(content, etree.HTMLParser(encoding="utf-8"))
+        document = HtmlCodec.parse(html_file_path)
 
         calendars = document.xpath('//div[contains(@id, "kalendarAkci")]')
         for calendar in calendars:
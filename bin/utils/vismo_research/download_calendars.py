@@ -1,12 +1,14 @@
+import argparse
+import io
 import multiprocessing
 import os
 from datetime import datetime
 from typing import List
 
-import requests
-
 from lib import utils
+from lib.cassette import Cassette
 from lib.constants import VISMO_RESEARCH_DATA_DIR_PATH
+from lib.html_codec import HtmlCodec
 
 
 class DownloadCalendars:
@@ -16,9 +18,32 @@ class DownloadCalendars:
     HTML_CONTENT_DIR_PATH = os.path.join(VISMO_RESEARCH_DATA_DIR_PATH, "html_content")
     OUTPUT_FILE_PATH = os.path.join(VISMO_RESEARCH_DATA_DIR_PATH, "download_calendars_output.json")
 
+    # a session of the worker process (see init_process)
+    session = None
+
+    def __init__(self) -> None:
+        self.args = self._parse_arguments()
+
+    @staticmethod
+    def _parse_arguments() -> argparse.Namespace:
+        parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument('--record', type=str, default=None,
+                           help="record the HTTP responses into the specified cassette file (see lib.cassette)")
+        group.add_argument('--replay', type=str, default=None,
+                           help="replay the HTTP responses from the specified cassette file")
+        parser.add_argument('--replay-latency', action='store_true', default=False,
+                            help="replay the HTTP responses with their recorded latency")
+
+        arguments = parser.parse_args()
+        if arguments.replay_latency and not arguments.replay:
+            parser.error("--replay-latency requires --replay")
+        return arguments
+
     def run(self) -> None:
         input_urls = self.load_input_urls()
-        download_info = self.download_calendars(input_urls)
+        download_info = self.download_calendars(input_urls, (self.args.record, self.args.replay,
+                                                             self.args.replay_latency))
         utils.store_to_json_file(download_info, DownloadCalendars.OUTPUT_FILE_PATH)
 
     @staticmethod
@@ -27,12 +52,16 @@ class DownloadCalendars:
             return [line.strip() for line in vismo_urls]
 
     @staticmethod
-    def download_calendars(input_urls: List[str]) -> List[dict]:
+    def download_calendars(input_urls: List[str], cassette_arguments: tuple) -> List[dict]:
         os.makedirs(DownloadCalendars.HTML_CONTENT_DIR_PATH, exist_ok=True)
 
-        with multiprocessing.Pool(32) as p:
+        with multiprocessing.Pool(32, DownloadCalendars.init_process, (cassette_arguments,)) as p:
             return p.map(DownloadCalendars.download_html_content, input_urls)
 
+    @staticmethod
+    def init_process(cassette_arguments: tuple) -> None:
+        DownloadCalendars.session = Cassette.create_session(*cassette_arguments)
+
     @staticmethod
     def download_html_content(url: str) -> dict:
         domain = utils.generate_domain_name(url)
@@ -44,15 +73,15 @@ class DownloadCalendars:
         debug_output = "Downloading URL: " + str(url)
 
         try:
-            r = requests.get(url, timeout=30)
+            r = DownloadCalendars.session.get(url, timeout=30)
             info["response_code"] = r.status_code
 
             if r.status_code == 200:
-                html_file_path = os.path.join(DownloadCalendars.HTML_CONTENT_DIR_PATH, domain + ".html")
+                html_file_path = os.path.join(DownloadCalendars.HTML_CONTENT_DIR_PATH,
+                                              domain + ".html" + HtmlCodec.get_default_extension())
                 info["html_file_path"] = html_file_path
 
-                with open(html_file_path, 'w', encoding="utf-8") as html_file:
-                    html_file.write(r.text)
+                HtmlCodec.write(html_file_path, io.BytesIO(r.text.encode("utf-8")))
 
             debug_output += " ({})".format(r.status_code)
 
@@ -7,11 +7,11 @@ import re
 import urllib.parse as urllib
 from typing import List
 
-import requests
 from lxml import etree
 
 from bin.utils.vismo_research.generate_input import GenerateInput
 from lib import utils
+from lib.cassette import Cassette
 from lib.constants import VISMO_RESEARCH_DATA_DIR_PATH
 
 
@@ -28,6 +28,9 @@ class GetDefaultGPS:
 
     SCRIPT_PARTS = ['1', '2', '3']
 
+    # a session of the worker process (see init_process)
+    session = None
+
     def __init__(self) -> None:
         self.args = self._parse_arguments()
 
@@ -36,12 +39,24 @@ class GetDefaultGPS:
         parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
         parser.add_argument('part', type=str, choices=GetDefaultGPS.SCRIPT_PARTS,
                             help='specifies a part of the scripts to be performed')
-        return parser.parse_args()
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument('--record', type=str, default=None,
+                           help="record the HTTP responses into the specified cassette file (see lib.cassette)")
+        group.add_argument('--replay', type=str, default=None,
+                           help="replay the HTTP responses from the specified cassette file")
+        parser.add_argument('--replay-latency', action='store_true', default=False,
+                            help="replay the HTTP responses with their recorded latency")
+
+        arguments = parser.parse_args()
+        if arguments.replay_latency and not arguments.replay:
+            parser.error("--replay-latency requires --replay")
+        return arguments
 
     def run(self) -> None:
         if self.args.part == "1":
             input_domains = self.load_domains()
-            found_info = self.get_addresses(input_domains)
+            found_info = self.get_addresses(input_domains, (self.args.record, self.args.replay,
+                                                            self.args.replay_latency))
             stats_output = self.compute_statistics(found_info)
             utils.store_to_json_file(stats_output, GetDefaultGPS.OUTPUT_FILE_PATH)
             self.geocode_address(found_info)
@@ -67,10 +82,14 @@ class GetDefaultGPS:
             return json.load(vismo_base_file)
 
     @staticmethod
-    def get_addresses(input_domains: List[dict]) -> List[dict]:
-        with multiprocessing.Pool(32) as p:
+    def get_addresses(input_domains: List[dict], cassette_arguments: tuple) -> List[dict]:
+        with multiprocessing.Pool(32, GetDefaultGPS.init_process, (cassette_arguments,)) as p:
             return p.map(GetDefaultGPS.get_addresses_process, input_domains)
 
+    @staticmethod
+    def init_process(cassette_arguments: tuple) -> None:
+        GetDefaultGPS.session = Cassette.create_session(*cassette_arguments)
+
     @staticmethod
     def get_addresses_process(input_website: dict) -> dict:
         parsed_url = urllib.urlparse(input_website["url"])
@@ -83,7 +102,7 @@ class GetDefaultGPS:
         }
 
         try:
-            r = requests.get(base_url, timeout=30)
+            r = GetDefaultGPS.session.get(base_url, timeout=30)
             result["status_code"] = r.status_code
 
             if r.status_code == 200:
@@ -104,7 +123,7 @@ class GetDefaultGPS:
                             href_url = element_a.get('href')
 
                     if href_url:
-                        response = requests.get(href_url)
+                        response = GetDefaultGPS.session.get(href_url)
                         parse_result = urllib.urlparse(response.url).query or urllib.urlparse(response.url).fragment
                         result_dict = dict(urllib.parse_qsl(parse_result))
 
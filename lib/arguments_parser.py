@@ -13,6 +13,23 @@ class ArgumentsParser(argparse.ArgumentParser):
                           help='set a level of logging')
         self.add_argument('--dry-run', action='store_true', default=False,
                           help="don't store anything permanently")
+        self.add_argument('--workers', type=int, default=None,
+                          help="a number of parallel workers; if not specified, derived from the number of CPUs")
+        self.add_argument('--inline-threshold', type=int, default=None,
+                          help="run tasks in the main process if there are fewer of them than this number")
 
     def set_description(self, text: str) -> None:
         self.description = text
+
+    def add_cassette_arguments(self) -> None:
+        """ Adds arguments of scripts which download pages to record their HTTP responses into a cassette
+        or to replay them from it offline (see lib.cassette). """
+
+        group = self.add_mutually_exclusive_group()
+        group.add_argument('--record', type=str, default=None,
+                           help="record the HTTP responses into the specified cassette file")
+        group.add_argument('--replay', type=str, default=None,
+                           help="replay the HTTP responses from the specified cassette file instead of "
+                                "requesting the network")
+        self.add_argument('--replay-latency', action='store_true', default=False,
+                          help="replay the HTTP responses with their recorded latency instead of at full speed")
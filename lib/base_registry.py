@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import List
+
+from lib.constants import INPUT_SITES_BASE_FILE_PATH
+
+
+class BaseRegistry:
+    """ OOP registry of input websites' base loaded once per process and indexed for constant-time lookups. """
+
+    MTIME_CHECK_INTERVAL = 1.0
+
+    _registries = {}
+    _lock = threading.Lock()
+
+    def __init__(self, base_file_path: str) -> None:
+        self.base_file_path = base_file_path
+        self.mtime = None
+        self.checked_at = None
+        self.base = []
+        self.by_url = {}
+        self.by_old_url = {}
+        self.by_domain = {}
+        self.by_parser = {}
+        self.with_key = {}
+
+    @staticmethod
+    def get(base_file_path: str = INPUT_SITES_BASE_FILE_PATH) -> 'BaseRegistry':
+        """ Gets a registry of the specified base file, (re)loading it if it has changed since the last load.
+        The file's modification time is checked at most once per MTIME_CHECK_INTERVAL seconds.
+
+        :param base_file_path: a path to the base file
+        :return: the registry with up-to-date indexes
+        """
+
+        registry_key = os.path.abspath(base_file_path)
+        with BaseRegistry._lock:
+            registry = BaseRegistry._registries.get(registry_key, None)
+            if registry is None:
+                registry = BaseRegistry(base_file_path)
+                BaseRegistry._registries[registry_key] = registry
+            registry._reload_if_changed()
+            return registry
+
+    def _reload_if_changed(self) -> None:
+        now = time.monotonic()
+        if self.checked_at is not None and now - self.checked_at < BaseRegistry.MTIME_CHECK_INTERVAL:
+            return
+        self.checked_at = now
+
+        mtime = os.stat(self.base_file_path).st_mtime_ns
+        if mtime == self.mtime:
+            return
+
+        with open(self.base_file_path, 'r') as base_file:
+            self._index(json.load(base_file))
+        self.mtime = mtime
+
+    def _index(self, base: List[dict]) -> None:
+        by_url, by_old_url, by_domain, by_parser = defaultdict(list), defaultdict(list), defaultdict(list), \
+                                                   defaultdict(list)
+        with_key = defaultdict(list)
+
+        for calendar_base in base:
+            if calendar_base.get('url', None) is not None:
+                by_url[calendar_base['url']].append(calendar_base)
+            for old_url in calendar_base.get('old_urls', []):
+                by_old_url[old_url].append(calendar_base)
+            if calendar_base.get('domain', None) is not None:
+                by_domain[calendar_base['domain']].append(calendar_base)
+            if calendar_base.get('parser', None) is not None:
+                by_parser[calendar_base['parser']].append(calendar_base)
+            for key in calendar_base:
+                with_key[key].append(calendar_base)
+
+        self.base = base
+        self.by_url = dict(by_url)
+        self.by_old_url = dict(by_old_url)
+        self.by_domain = dict(by_domain)
+        self.by_parser = dict(by_parser)
+        self.with_key = dict(with_key)
+
+    def get_by_url(self, url: str) -> List[dict]:
+        """ Gets bases of calendars with the specified active URL or, if there is none, with the specified old URL.
+
+        :param url: a calendar's URL address
+        :return: a list of matching bases
+        """
+
+        return list(self.by_url.get(url, None) or self.by_old_url.get(url, []))
+
+    def get_by_domain(self, domain: str) -> List[dict]:
+        """ Gets bases of calendars with the specified domain string.
+
+        :param domain: a calendar's domain string
+        :return: a list of matching bases
+        """
+
+        return list(self.by_domain.get(domain, []))
+
+    def get_by_parser(self, parser_name: str) -> List[dict]:
+        """ Gets bases of calendars processed by the specified parser.
+
+        :param parser_name: a name of a parser's template
+        :return: a list of matching bases
+        """
+
+        return list(self.by_parser.get(parser_name, []))
+
+    def get_with_key(self, key: str) -> List[dict]:
+        """ Gets bases of calendars containing the specified key.
+
+        :param key: a key of the base
+        :return: a list of matching bases
+        """
+
+        return list(self.with_key.get(key, []))
+
+    def get_dict_per_url(self) -> dict:
+        """ Gets bases of calendars in a form of dictionary with all their URLs (active and old ones) as keys.
+
+        :return: a dictionary with the calendars' bases
+        """
+
+        base_dict = {}
+        for calendar_base in self.base:
+            if calendar_base.get('url', None):
+                base_dict[calendar_base['url']] = calendar_base
+            for old_url in calendar_base.get('old_urls', []):
+                base_dict[old_url] = calendar_base
+        return base_dict
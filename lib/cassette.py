@@ -0,0 +1,259 @@
+import http.client
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Optional
+
+import requests
+import requests.adapters
+from urllib3 import HTTPResponse
+from urllib3._collections import HTTPHeaderDict
+
+from lib.constants import DATABASE_TIMEOUT, HTML_CONTENT_TYPES, MAX_CONTENT_SIZE
+from lib.utils import CONTENT_CHUNK_SIZE
+
+
+class Cassette:
+    """ OOP record/replay store of HTTP interactions (an SQLite file) - in the record mode, responses are captured
+    with their status, headers, body (as received, i.e. still content-encoded) and timing (failed requests with
+    their exception); in the replay mode, they are served back without any network access, at full speed
+    or with the recorded latency.
+    Each hop of a redirect is an interaction of its own; interactions of the same URL are served back in the order
+    they were recorded (the last one repeatedly), so a run replays deterministically the run which was recorded. """
+
+    RECORD = "record"
+    REPLAY = "replay"
+
+    def __init__(self, file_path: str, mode: str, with_latency: bool = False) -> None:
+        """ Sets up the cassette.
+
+        :param file_path: a path of the cassette's file
+        :param mode: Cassette.RECORD (interactions are appended to the file) or Cassette.REPLAY
+        :param with_latency: a flag that determines whether to replay the responses with their recorded latency
+        """
+
+        if mode == Cassette.REPLAY and not os.path.isfile(file_path):
+            raise Exception("Cassette '{}' doesn't exist!".format(file_path))
+
+        self.file_path = file_path
+        self.mode = mode
+        self.with_latency = with_latency
+        self.lock = threading.Lock()
+        self.connection = None
+        self.connection_pid = None
+        self.replayed_counts = defaultdict(int)
+
+    @staticmethod
+    def from_arguments(record: Optional[str], replay: Optional[str], with_latency: bool = False
+                       ) -> Optional['Cassette']:
+        """ Creates a cassette by the scripts' --record or --replay argument.
+
+        :return: the cassette; None, if neither is specified
+        """
+
+        if record:
+            return Cassette(record, Cassette.RECORD)
+        if replay:
+            return Cassette(replay, Cassette.REPLAY, with_latency)
+        return None
+
+    @staticmethod
+    def create_session(record: Optional[str], replay: Optional[str], with_latency: bool = False
+                       ) -> requests.Session:
+        """ Creates a session routed through a cassette by the scripts' --record or --replay argument
+        (e.g. in an initializer of a worker process).
+
+        :return: the session; a plain one, if neither is specified
+        """
+
+        session = requests.Session()
+        cassette = Cassette.from_arguments(record, replay, with_latency)
+        if cassette is not None:
+            cassette.mount(session)
+        return session
+
+    def mount(self, session: requests.Session, max_size: int = MAX_CONTENT_SIZE,
+              **adapter_arguments) -> requests.Session:
+        """ Routes requests of the session through the cassette.
+
+        :param session: the session
+        :param max_size: a maximal size of a recorded body in bytes (see CassetteAdapter)
+        :param adapter_arguments: arguments of the session's requests.adapters.HTTPAdapter (e.g. its pool sizes)
+        :return: the session
+        """
+
+        adapter = CassetteAdapter(self, max_size, **adapter_arguments)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _get_connection(self) -> sqlite3.Connection:
+        # a connection can't be shared with forked worker processes
+        if self.connection is None or self.connection_pid != os.getpid():
+            directory = os.path.dirname(self.file_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.connection = sqlite3.connect(self.file_path, timeout=DATABASE_TIMEOUT, check_same_thread=False)
+            self.connection_pid = os.getpid()
+            self.connection.execute('''
+                                        CREATE TABLE IF NOT EXISTS interaction
+                                        (
+                                            id              INTEGER PRIMARY KEY AUTOINCREMENT,
+                                            method          TEXT NOT NULL,
+                                            url             TEXT NOT NULL,
+                                            status          INTEGER,
+                                            reason          TEXT,
+                                            headers         TEXT,
+                                            body            BLOB,
+                                            first_byte_time REAL,
+                                            response_time   REAL,
+                                            error           TEXT,
+                                            recorded_at     TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                                        )
+                                    ''')
+            self.connection.execute('''CREATE INDEX IF NOT EXISTS idx_interaction_url ON interaction (url)''')
+        return self.connection
+
+    def record(self, method: str, url: str, raw: Optional[HTTPResponse], body: Optional[bytes],
+               first_byte_time: Optional[float], response_time: float, error: Exception = None) -> None:
+        """ Appends an interaction - a response with its body (None, if it exceeded the maximal size)
+        or an exception the request failed with. """
+
+        query = '''
+                    INSERT INTO interaction(method, url, status, reason, headers, body, first_byte_time,
+                                            response_time, error)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                '''
+        if raw is not None:
+            values = (method, url, raw.status, raw.reason, json.dumps(list(raw.headers.items())), body,
+                      first_byte_time, response_time, None)
+        else:
+            values = (method, url, None, str(error), None, None, None, response_time, type(error).__name__)
+        with self.lock:
+            connection = self._get_connection()
+            connection.execute(query, values)
+            connection.commit()
+
+    def play(self, method: str, url: str) -> Optional[dict]:
+        """ Gets the next recorded interaction of the request.
+
+        :param method: the request's method
+        :param url: the request's URL
+        :return: a dictionary with 'status', 'reason', 'headers' (a list of pairs), 'body', 'first_byte_time',
+                 'response_time' and 'error' (a name of the exception); None, if no interaction of the request
+                 was recorded
+        """
+
+        query = '''
+                    SELECT status, reason, headers, body, first_byte_time, response_time, error
+                    FROM interaction
+                    WHERE method = ?
+                      AND url = ?
+                    ORDER BY id
+                '''
+        with self.lock:
+            rows = self._get_connection().execute(query, (method, url)).fetchall()
+            if len(rows) == 0:
+                return None
+            index = min(self.replayed_counts[(method, url)], len(rows) - 1)
+            self.replayed_counts[(method, url)] += 1
+
+        status, reason, headers, body, first_byte_time, response_time, error = rows[index]
+        return {
+            'status': status,
+            'reason': reason,
+            'headers': json.loads(headers) if headers else [],
+            'body': body,
+            'first_byte_time': first_byte_time,
+            'response_time': response_time,
+            'error': error
+        }
+
+
+class CassetteAdapter(requests.adapters.HTTPAdapter):
+    """ Transport adapter of requests recording the responses into a cassette or replaying them from it.
+    A body is recorded only as far as utils.fetch_html_content would read it - not at all for a non-HTML page
+    or one whose Content-Length exceeds the maximal size, and without its content for one exceeding the size
+    while it's read (it's replayed as the maximal size of zero bytes, so it fails the same way). """
+
+    def __init__(self, cassette: Cassette, max_size: int = MAX_CONTENT_SIZE, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.cassette = cassette
+        self.max_size = max_size
+
+    def send(self, request: requests.PreparedRequest, stream: bool = False, timeout=None, verify=True, cert=None,
+             proxies=None) -> requests.Response:
+        if self.cassette.mode == Cassette.REPLAY:
+            interaction = self.cassette.play(request.method, request.url)
+            if interaction is None:
+                raise requests.exceptions.ConnectionError(
+                    "No interaction of {} {} in cassette '{}'".format(request.method, request.url,
+                                                                     self.cassette.file_path), request=request)
+            if self.cassette.with_latency:
+                time.sleep(interaction['response_time'] or 0.0)
+            if interaction['error'] is not None:
+                exception_class = getattr(requests.exceptions, interaction['error'],
+                                          requests.exceptions.ConnectionError)
+                raise exception_class(interaction['reason'], request=request)
+            return self._build_replayed_response(request, interaction['status'], interaction['reason'],
+                                                 interaction['headers'], interaction['body'])
+
+        start = time.perf_counter()
+        try:
+            response = super().send(request, stream=True, timeout=timeout, verify=verify, cert=cert,
+                                    proxies=proxies)
+        except requests.exceptions.RequestException as e:
+            self.cassette.record(request.method, request.url, None, None, None, time.perf_counter() - start, e)
+            raise
+        first_byte_time = time.perf_counter() - start
+        try:
+            body = self._read_body(response.raw)
+        finally:
+            response.close()
+        response_time = time.perf_counter() - start
+
+        self.cassette.record(request.method, request.url, response.raw, body, first_byte_time, response_time)
+        return self._build_replayed_response(request, response.raw.status, response.raw.reason,
+                                             list(response.raw.headers.items()), body)
+
+    def _read_body(self, raw: HTTPResponse) -> Optional[bytes]:
+        # the same checks as utils.fetch_html_content does before reading a page
+        if raw.status == 200:
+            content_type = raw.headers.get('Content-Type', None)
+            content_length = raw.headers.get('Content-Length', None)
+            if content_type and content_type.split(';')[0].strip().lower() not in HTML_CONTENT_TYPES:
+                return b""
+            if content_length and content_length.isdigit() and int(content_length) > self.max_size:
+                return b""
+
+        # a content-encoded body doesn't get smaller by its decoding, so it's limited before it
+        body = bytearray()
+        for chunk in raw.stream(CONTENT_CHUNK_SIZE, decode_content=False):
+            body.extend(chunk)
+            if len(body) > self.max_size:
+                return None
+        return bytes(body)
+
+    def _build_replayed_response(self, request: requests.PreparedRequest, status: int, reason: str,
+                                 headers: list, body: Optional[bytes]) -> requests.Response:
+        if body is None:
+            headers = [(name, value) for name, value in headers
+                       if name.lower() not in ['content-encoding', 'content-length']]
+            body = bytes(self.max_size + 1)
+
+        # the body is decoded by its Content-Encoding as it's read, just as a body received from the network
+        raw = HTTPResponse(body=io.BytesIO(body), headers=HTTPHeaderDict(headers), status=status, reason=reason,
+                           preload_content=False, decode_content=True, request_method=request.method,
+                           request_url=request.url)
+        # cookies are extracted into the session from the message of the original http.client response
+        message = http.client.HTTPMessage()
+        for name, value in headers:
+            message[name] = value
+        raw._original_response = http.client.HTTPResponse.__new__(http.client.HTTPResponse)
+        raw._original_response.msg = message
+        raw._original_response.fp = None
+        return self.build_response(request, raw)
@@ -0,0 +1,186 @@
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from lib.retry_queue import RetryQueue
+
+
+class CircuitState:
+    """ OOP state of one circuit - a number of consecutive failures, of times it has opened in a row
+    and a time after which it lets a probe request through. """
+
+    def __init__(self, kind: str, key: str, state: str, failures: int = 0, opens: int = 0,
+                 next_probe_at: datetime = None) -> None:
+        self.kind = kind
+        self.key = key
+        self.state = state
+        self.failures = failures
+        self.opens = opens
+        self.next_probe_at = next_probe_at
+        self.is_updated = False
+
+
+class CircuitBreaker:
+    """ OOP persistent circuit breaker of hosts and calendars - after a number of consecutive failures the circuit
+    opens and requests to it are skipped; after an exponential backoff it half-opens for a single probe request,
+    which closes it again or reopens it for a longer backoff. """
+
+    HOST = "host"
+    CALENDAR = "calendar"
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    # decisions about a request
+    ALLOW = "allow"
+    PROBE = "probe"
+    WAIT = "wait"
+    REJECT = "reject"
+
+    # kind: (number of consecutive failures opening the circuit, backoff after the first opening in seconds);
+    # backoffs are a bit shorter than a day (or its fraction), so the next daily run already probes the circuit
+    POLICIES = {
+        HOST: (5, 5 * 3600),
+        CALENDAR: (3, 20 * 3600)
+    }
+    MAX_BACKOFF = 14 * 24 * 3600
+
+    # failures of a request which say that the host is down (other ones are failures of the page only)
+    HOST_FAILURES = [RetryQueue.TIMEOUT, RetryQueue.DNS, RetryQueue.CONNECTION, RetryQueue.SERVER_ERROR]
+
+    def __init__(self, circuits: Dict[Tuple[str, str], CircuitState] = None) -> None:
+        self.circuits = circuits if circuits else {}
+
+    @staticmethod
+    def load(connection: sqlite3.Connection) -> 'CircuitBreaker':
+        """ Creates a circuit breaker with states of the circuits from previous runs.
+
+        :param connection: a connection to the database
+        :return: the circuit breaker
+        """
+
+        query = '''
+                    SELECT kind, key, state, failures, opens, next_probe_at
+                    FROM circuit_breaker
+                '''
+        circuits = {}
+        for kind, key, state, failures, opens, next_probe_at in connection.execute(query).fetchall():
+            next_probe_at = datetime.strptime(next_probe_at, "%Y-%m-%d %H:%M:%S") if next_probe_at else None
+            # a probe which hasn't finished doesn't block the circuit in the next run
+            circuits[(kind, key)] = CircuitState(kind, key, CircuitBreaker.OPEN if state == CircuitBreaker.HALF_OPEN
+                                                 else state, failures, opens, next_probe_at)
+        return CircuitBreaker(circuits)
+
+    def store(self, connection: sqlite3.Connection) -> None:
+        """ Stores states of the circuits updated by this circuit breaker for the next runs.
+
+        :param connection: a connection to the database
+        """
+
+        query = '''
+                    INSERT OR REPLACE INTO circuit_breaker(kind, key, state, failures, opens, next_probe_at,
+                                                           updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                '''
+        values = [(circuit.kind, circuit.key, circuit.state, circuit.failures, circuit.opens,
+                   "{0:%Y-%m-%d %H:%M:%S}".format(circuit.next_probe_at) if circuit.next_probe_at else None)
+                  for circuit in self.circuits.values() if circuit.is_updated]
+        connection.executemany(query, values)
+        connection.commit()
+
+    def _get_circuit(self, kind: str, key: str) -> CircuitState:
+        if (kind, key) not in self.circuits:
+            self.circuits[(kind, key)] = CircuitState(kind, key, CircuitBreaker.CLOSED)
+        return self.circuits[(kind, key)]
+
+    def is_closed(self, kind: str, key: str) -> bool:
+        return self._get_circuit(kind, key).state == CircuitBreaker.CLOSED
+
+    def allow(self, kind: str, key: str, now: datetime = None) -> str:
+        """ Decides about a request to the circuit.
+
+        :param kind: a kind of the circuit (CircuitBreaker.HOST or CircuitBreaker.CALENDAR)
+        :param key: a hostname or a calendar's URL
+        :param now: a time of the request; if None, now
+        :return: ALLOW, if the circuit is closed; PROBE, if the request is the single probe of the opened circuit;
+                 WAIT, if the probe hasn't finished yet; REJECT, if the circuit is open
+        """
+
+        circuit = self._get_circuit(kind, key)
+        if circuit.state == CircuitBreaker.CLOSED:
+            return CircuitBreaker.ALLOW
+        if circuit.state == CircuitBreaker.HALF_OPEN:
+            return CircuitBreaker.WAIT
+        if circuit.next_probe_at is not None and circuit.next_probe_at > (now if now else datetime.now()):
+            return CircuitBreaker.REJECT
+
+        circuit.state = CircuitBreaker.HALF_OPEN
+        circuit.is_updated = True
+        return CircuitBreaker.PROBE
+
+    def record(self, kind: str, key: str, is_failure: bool, now: datetime = None) -> None:
+        """ Records an outcome of a request to the circuit and opens or closes the circuit by it.
+
+        :param kind: a kind of the circuit
+        :param key: a hostname or a calendar's URL
+        :param is_failure: a flag that determines whether the request failed
+        :param now: a time of the outcome; if None, now
+        """
+
+        circuit = self._get_circuit(kind, key)
+        if not is_failure:
+            if circuit.state != CircuitBreaker.CLOSED or circuit.failures > 0:
+                circuit.state = CircuitBreaker.CLOSED
+                circuit.failures = 0
+                circuit.opens = 0
+                circuit.next_probe_at = None
+                circuit.is_updated = True
+            return
+
+        circuit.failures += 1
+        circuit.is_updated = True
+        threshold, backoff = CircuitBreaker.POLICIES[kind]
+        if circuit.state == CircuitBreaker.HALF_OPEN or \
+                (circuit.state == CircuitBreaker.CLOSED and circuit.failures >= threshold):
+            circuit.state = CircuitBreaker.OPEN
+            circuit.next_probe_at = (now if now else datetime.now()) + \
+                timedelta(seconds=min(backoff * 2 ** circuit.opens, CircuitBreaker.MAX_BACKOFF))
+            circuit.opens += 1
+
+    def cancel_probe(self, kind: str, key: str) -> None:
+        """ Gives up the probe of the circuit which wasn't sent, so the circuit is probed by the next request. """
+
+        circuit = self._get_circuit(kind, key)
+        if circuit.state == CircuitBreaker.HALF_OPEN:
+            circuit.state = CircuitBreaker.OPEN
+
+    @staticmethod
+    def is_host_failure(result: dict) -> bool:
+        """ Checks whether a failed download says that its host is down.
+
+        :param result: a result of the download (see utils.fetch_html_content)
+        :return: True, if the host didn't respond (or responded by a server error)
+        """
+
+        return RetryQueue.classify(result) in CircuitBreaker.HOST_FAILURES
+
+    @staticmethod
+    def get_open_circuits(connection: sqlite3.Connection) -> List[dict]:
+        """ Gets the circuits which aren't closed.
+
+        :param connection: a connection to the database
+        :return: a list of dictionaries with 'kind', 'key', 'state', 'failures' (consecutive ones), 'opens'
+                 (times the circuit has opened in a row), 'next_probe_at' and 'updated_at'
+        """
+
+        query = '''
+                    SELECT kind, key, state, failures, opens, next_probe_at, updated_at
+                    FROM circuit_breaker
+                    WHERE state != '{}'
+                    ORDER BY kind, key
+                '''.format(CircuitBreaker.CLOSED)
+        cursor = connection.execute(query)
+
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
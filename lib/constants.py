@@ -1,10 +1,18 @@
 DATABASE_PATH = "data/map_of_events.db"
+DATABASE_TIMEOUT = 60
 
 DATA_DIR_PATH = "data/html_content"
 VISMO_RESEARCH_DATA_DIR_PATH = "data/tmp/vismo_research"
+METRICS_DIR_PATH = "data/tmp/metrics"
+BENCHMARK_DATA_DIR_PATH = "data/tmp/benchmark"
 
 INPUT_SITES_BASE_FILE_PATH = "resources/input_websites_base.json"
 MUNICIPALITIES_OF_CR_FILE_PATH = "resources/geocoding/municipalities_cr.csv"
 EVENT_TYPES_JSON_FILE_PATH = "resources/event_types.json"
 
 SIMPLE_LOGGER_PREFIX = "[multiprocessing]"
+
+MAX_CONTENT_SIZE = 5 * 1024 * 1024
+HTML_CONTENT_TYPES = ["text/html", "application/xhtml+xml"]
+TOO_LARGE_STATUS = "TooLarge"
+NOT_HTML_STATUS = "NotHtml"
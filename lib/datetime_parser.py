@@ -4,6 +4,7 @@ from datetime import datetime
 from typing import Optional, List, Set
 
 from lib.parser import Parser
+from lib.parser_plan import ParserPlan
 
 
 class DatetimeParser:
@@ -31,9 +32,11 @@ class DatetimeParser:
         "listopad": "listopadu",
         "prosinec": "prosince"
     }
+    MONTHS_TO_REPLACE_REGEXES = [(re.compile(r"{}\b".format(month)), replacement)
+                                 for month, replacement in MONTHS_TO_REPLACE.items()]
 
     def __init__(self, parser_name: str) -> None:
-        self.metadata = Parser.load_parser_file(parser_name)
+        self.metadata = ParserPlan.get(parser_name).metadata
         self.error_messages = []
 
     def process_datetimes(self, db_datetimes: List[str]) -> List[tuple]:
@@ -65,8 +68,8 @@ class DatetimeParser:
             datetime_formats.update(datetime_metadata.get("formats", []))
             datetime_formats.add(self.DEFAULT_DATETIME_FORMAT)
         else:
-            date_metadata = self.metadata["event"].get("date", {}).get("formats", [])
-            time_metadata = self.metadata["event"].get("time", {}).get("formats", [])
+            date_metadata = list(self.metadata["event"].get("date", {}).get("formats", []))
+            time_metadata = list(self.metadata["event"].get("time", {}).get("formats", []))
 
             date_metadata.append(self.DEFAULT_DATE_FORMAT)
             time_metadata.append(self.DEFAULT_TIME_FORMAT)
@@ -115,8 +118,8 @@ class DatetimeParser:
         return result_datetime
 
     def _replace_months(self, datetime_str: str) -> str:
-        for month, replacement in self.MONTHS_TO_REPLACE.items():
-            datetime_str = re.sub(r"{}\b".format(month), replacement, datetime_str)
+        for month_regex, replacement in self.MONTHS_TO_REPLACE_REGEXES:
+            datetime_str = month_regex.sub(replacement, datetime_str)
         return datetime_str
 
     def _get_range_delimiter_from_format(self, formats: Set[str]) -> Optional[str]:
@@ -0,0 +1,77 @@
+import sqlite3
+import urllib.parse as urllib
+from datetime import datetime
+from typing import List
+
+
+class DownloadStats:
+    """ OOP collector of telemetry of downloads (latency, bytes, status and redirects of each request)
+    stored per request to tune concurrency, spot slowing hosts and size the bandwidth. """
+
+    RETENTION_DAYS = 90
+
+    def __init__(self) -> None:
+        self.rows = []
+
+    def record(self, url: str, calendar_url: str, result: dict, downloaded_at: datetime) -> None:
+        """ Records a request of the download.
+
+        :param url: the requested URL address
+        :param calendar_url: an URL address of the calendar the page belongs to
+        :param result: a result of the download (see utils.fetch_html_content)
+        :param downloaded_at: a time of the download
+        """
+
+        self.rows.append((urllib.urlparse(url).hostname, url, calendar_url, result['status'],
+                          result['response_time'], result['first_byte_time'], result['bytes'],
+                          result['redirect_count'], result['final_url'], downloaded_at))
+
+    def store(self, connection: sqlite3.Connection) -> None:
+        """ Stores the recorded requests and deletes the ones older than RETENTION_DAYS.
+
+        :param connection: a connection to the database
+        """
+
+        query = '''
+                    INSERT INTO download_stats(host, url, calendar_url, status, response_time, first_byte_time, bytes,
+                                               redirect_count, final_url, downloaded_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                '''
+        connection.executemany(query, self.rows)
+
+        query = '''
+                    DELETE FROM download_stats
+                    WHERE date(downloaded_at) < date('now', '-{} day')
+                '''.format(DownloadStats.RETENTION_DAYS)
+        connection.execute(query)
+        connection.commit()
+        self.rows.clear()
+
+    @staticmethod
+    def get_rollup_per_calendar(connection: sqlite3.Connection, last_n: int) -> List[dict]:
+        """ Sums up the requests of each calendar (its own and its events' ones) of the last days.
+
+        :param connection: a connection to the database
+        :param last_n: a number of the last days
+        :return: a list of dictionaries with 'calendar_url', 'requests_count', 'responses_count' (requests answered
+                 by the host), 'failed_count' (not 200 or 304), 'redirect_count', 'bytes', 'response_time_sum'
+                 and 'first_byte_time_sum' (of the responses) in seconds
+        """
+
+        query = '''
+                    SELECT calendar_url,
+                           count(*)                                                  AS requests_count,
+                           count(first_byte_time)                                    AS responses_count,
+                           sum(CASE WHEN status IN ('200', '304') THEN 0 ELSE 1 END) AS failed_count,
+                           sum(redirect_count)                                       AS redirect_count,
+                           sum(bytes)                                                AS bytes,
+                           total(response_time)                                      AS response_time_sum,
+                           total(first_byte_time)                                    AS first_byte_time_sum
+                    FROM download_stats
+                    WHERE date(downloaded_at) > date('now', '-{} day')
+                    GROUP BY calendar_url
+                '''.format(last_n)
+        cursor = connection.execute(query)
+
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
@@ -0,0 +1,226 @@
+import asyncio
+import concurrent.futures
+import queue
+import threading
+import time
+import urllib.parse as urllib
+from typing import Iterator, List
+
+import requests
+import requests.adapters
+
+from lib import utils
+from lib.cassette import Cassette
+from lib.circuit_breaker import CircuitBreaker
+from lib.constants import MAX_CONTENT_SIZE
+from lib.host_scheduler import HostScheduler
+from lib.html_store import HtmlStore
+from lib.http_cache import HttpCache
+from lib.metrics import StageMetrics
+
+
+class Downloader:
+    """ OOP asynchronous downloader of HTML pages limiting the number of requests in flight globally
+    and scheduling the requests to each host by a HostScheduler. """
+
+    DEFAULT_MAX_IN_FLIGHT = 32
+    DEFAULT_PER_HOST_LIMIT = 4
+    HOST_POOLS = 1024
+
+    # statuses of skipped downloads
+    DEADLINE_STATUS = "Deadline"
+    CIRCUIT_OPEN_STATUS = "CircuitOpen"
+
+    def __init__(self, max_in_flight: int = None, scheduler: HostScheduler = None, cache: HttpCache = None,
+                 dry_run: bool = False, metrics: StageMetrics = None, max_content_size: int = MAX_CONTENT_SIZE,
+                 keep_content: bool = False, archive: bool = True, breaker: CircuitBreaker = None,
+                 cassette: Cassette = None) -> None:
+        """ Sets up the downloader.
+
+        :param max_in_flight: a maximal number of requests in flight at once
+        :param scheduler: a scheduler of requests to each host;
+                          if None, a new one with the default per-host limit and rate
+        :param cache: a cache of previous snapshots to download only modified pages; if None, download all
+        :param dry_run: a flag that determines whether to download files or just to check URLs' responses
+        :param metrics: stage's metrics to record latencies of the downloads and utilization of the pool into
+        :param max_content_size: a maximal size of a page in bytes (a bigger one fails as too large)
+        :param keep_content: a flag that determines whether to hand over contents of the downloaded pages in results
+                             (so they can be processed without reading them back from the store)
+        :param archive: a flag that determines whether to write the downloaded pages into the store
+        :param breaker: a circuit breaker to skip requests to hosts which are down; if None, request all hosts
+        :param cassette: a cassette to record the responses into or to replay them from (see lib.cassette);
+                         if None, requests go to the network
+        """
+
+        self.max_in_flight = max_in_flight if max_in_flight else Downloader.DEFAULT_MAX_IN_FLIGHT
+        self.scheduler = scheduler if scheduler else HostScheduler(Downloader.DEFAULT_PER_HOST_LIMIT)
+        self.cache = cache
+        self.dry_run = dry_run
+        self.metrics = metrics
+        self.max_content_size = max_content_size
+        self.keep_content = keep_content
+        self.archive = archive
+        self.breaker = breaker
+        self.cassette = cassette
+        self.probes = {}
+
+        if cassette is not None and cassette.mode == Cassette.REPLAY and not cassette.with_latency:
+            self.scheduler.is_paced = False
+
+    def imap(self, downloads: List[tuple], deadline: float = None) -> Iterator:
+        """ Downloads all the pages and yields results as soon as they are completed.
+        The downloads run on an event loop in a background thread, so the caller can e.g. store the results
+        into the database while the rest is still being downloaded.
+
+        :param downloads: a list of tuples (URL, encoding, verify) to download
+        :param deadline: a time (of time.monotonic) after which no other download is started; if None, no limit
+        :return: an iterator over tuples (index of the download, result of utils.fetch_html_content);
+                 the result's 'html_file_path' is a path of the snapshot in lib.html_store (a new or the reused one)
+                 or None, if the download failed, was skipped ('is_skipped' flag, 'status' is DEADLINE_STATUS
+                 or CIRCUIT_OPEN_STATUS) or wasn't archived,
+                 and its 'content' are bytes of the modified page if keep_content, otherwise None
+        """
+
+        if len(downloads) == 0:
+            return
+
+        results = queue.Queue()
+        start = time.perf_counter()
+        loop_thread = threading.Thread(target=self._run_loop, args=(downloads, deadline, results), daemon=True)
+        loop_thread.start()
+
+        busy_time = 0.0
+        for _ in range(len(downloads)):
+            result = results.get()
+            if isinstance(result, BaseException):
+                loop_thread.join()
+                raise result
+
+            index, fetch_result, duration = result
+            busy_time += duration
+            if self.metrics is not None and not fetch_result['is_skipped']:
+                self.metrics.record_task(downloads[index][0], duration)
+            yield index, fetch_result
+
+        loop_thread.join()
+        if self.metrics is not None:
+            self.metrics.record_pool(min(self.max_in_flight, len(downloads)), time.perf_counter() - start,
+                                     busy_time, 0.0)
+
+    def _run_loop(self, downloads: List[tuple], deadline: float, results: queue.Queue) -> None:
+        try:
+            asyncio.run(self._download_all(downloads, deadline, results))
+        except BaseException as e:
+            results.put(e)
+
+    async def _download_all(self, downloads: List[tuple], deadline: float, results: queue.Queue) -> None:
+        global_semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        # blocking requests run in threads; a shared session keeps alive connections to each host
+        with concurrent.futures.ThreadPoolExecutor(self.max_in_flight) as thread_pool, \
+                requests.Session() as session:
+            if self.cassette is not None:
+                self.cassette.mount(session, self.max_content_size, pool_connections=Downloader.HOST_POOLS,
+                                    pool_maxsize=self.scheduler.max_concurrency)
+            else:
+                adapter = requests.adapters.HTTPAdapter(pool_connections=Downloader.HOST_POOLS,
+                                                        pool_maxsize=self.scheduler.max_concurrency)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+
+            await asyncio.gather(*[self._download(index, download, deadline, session, thread_pool, global_semaphore,
+                                                  results)
+                                   for index, download in enumerate(downloads)])
+
+    async def _download(self, index: int, download: tuple, deadline: float, session: requests.Session,
+                        thread_pool: concurrent.futures.Executor, global_semaphore: asyncio.Semaphore,
+                        results: queue.Queue) -> None:
+        url, encoding, verify = download
+        host = urllib.urlparse(url).hostname
+
+        if deadline is not None and time.monotonic() > deadline:
+            results.put((index, Downloader._get_skipped_result(Downloader.DEADLINE_STATUS), 0.0))
+            return
+
+        # the host's slot is taken first so that requests waiting for a busy host don't block the others
+        while True:
+            decision = await self._admit(host)
+            if decision == CircuitBreaker.REJECT:
+                results.put((index, Downloader._get_skipped_result(Downloader.CIRCUIT_OPEN_STATUS), 0.0))
+                return
+            is_probe = decision == CircuitBreaker.PROBE
+
+            # the host's circuit may have opened while the request was waiting for its turn
+            timeout = await self.scheduler.acquire(
+                host, lambda: is_probe or self.breaker is None or self.breaker.is_closed(CircuitBreaker.HOST, host))
+            if timeout is not None:
+                break
+
+        if deadline is not None and time.monotonic() > deadline:
+            await self.scheduler.cancel(host)
+            if is_probe:
+                self.breaker.cancel_probe(CircuitBreaker.HOST, host)
+                self.probes.pop(host).set()
+            results.put((index, Downloader._get_skipped_result(Downloader.DEADLINE_STATUS), 0.0))
+            return
+        cached = self.cache.get(url) if self.cache is not None else None
+        async with global_semaphore:
+            start = time.perf_counter()
+            result = await asyncio.get_running_loop().run_in_executor(
+                thread_pool, lambda: self._fetch_and_store(url, encoding, verify, session, timeout, cached))
+            duration = time.perf_counter() - start
+        await self.scheduler.release(host, duration, result['status'])
+        if self.breaker is not None:
+            self.breaker.record(CircuitBreaker.HOST, host, CircuitBreaker.is_host_failure(result))
+            if is_probe:
+                self.probes.pop(host).set()
+
+        if self.cache is not None:
+            self.cache.update(url, result, result['html_file_path'])
+        results.put((index, result, duration))
+
+    async def _admit(self, host: str) -> str:
+        """ Decides about a request to the host by its circuit (see lib.circuit_breaker), waiting for the outcome
+        of the circuit's probe if there is one in flight.
+
+        :param host: a hostname
+        :return: CircuitBreaker.ALLOW, PROBE or REJECT
+        """
+
+        if self.breaker is None:
+            return CircuitBreaker.ALLOW
+
+        decision = self.breaker.allow(CircuitBreaker.HOST, host)
+        while decision == CircuitBreaker.WAIT:
+            await self.probes[host].wait()
+            decision = self.breaker.allow(CircuitBreaker.HOST, host)
+        if decision == CircuitBreaker.PROBE:
+            # other requests to the host wait for the probe's outcome
+            self.probes[host] = asyncio.Event()
+        return decision
+
+    def _fetch_and_store(self, url: str, encoding: str, verify: bool, session: requests.Session,
+                         timeout: tuple, cached: dict) -> dict:
+        result = utils.fetch_html_content(url, encoding=encoding, verify=verify, session=session, timeout=timeout,
+                                          cached=cached, max_size=self.max_content_size)
+        content_file = result['content']
+        result['content'] = None
+        result['is_skipped'] = False
+
+        if not result['is_modified']:
+            result['html_file_path'] = cached['html_file_path']
+        elif content_file is not None:
+            with content_file:
+                if self.keep_content:
+                    result['content'] = content_file.read()
+                    content_file.seek(0)
+                result['html_file_path'] = HtmlStore.write(content_file, result['content_hash'], self.dry_run) \
+                    if self.archive else None
+        else:
+            result['html_file_path'] = None
+        return result
+
+    @staticmethod
+    def _get_skipped_result(status: str) -> dict:
+        return {'status': status, 'etag': None, 'last_modified': None, 'content': None, 'content_hash': None,
+                'encoding': None, 'is_modified': True, 'error': None, 'html_file_path': None, 'is_skipped': True}
@@ -0,0 +1,96 @@
+import sqlite3
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+
+class EventFrontier:
+    """ OOP frontier of pending downloads of events ordered by their priority, so a run cut short by its time budget
+    downloads the most valuable events first. The priority combines the event's position in its calendar's listing
+    (calendars list the soonest events first), the calendar's yield of valid events in the last YIELD_DAYS and,
+    for failed downloads, the number of attempts made so far.
+
+    The position is absolute, so it's comparable across calendars - the first event of any listing scores the most
+    and events from LISTING_DEPTH on the least. """
+
+    YIELD_DAYS = 30
+    LISTING_DEPTH = 50
+    POSITION_WEIGHT = 0.6
+    YIELD_WEIGHT = 0.4
+    DEFAULT_YIELD = 0.5
+
+    def __init__(self, yields: Dict[str, float] = None, attempts: Dict[int, int] = None) -> None:
+        self.yields = yields if yields else {}
+        self.attempts = attempts if attempts else {}
+
+    @staticmethod
+    def load(connection: sqlite3.Connection) -> 'EventFrontier':
+        """ Creates a frontier with the calendars' yields and the retry state of failed downloads.
+
+        :param connection: a connection to the database
+        :return: the frontier
+        """
+
+        # an event is valid if it was parsed with its start date
+        query = '''
+                    SELECT c.url,
+                           count(DISTINCT eh.id),
+                           count(DISTINCT edd.event_data_id)
+                    FROM event_html eh
+                         INNER JOIN event_url eu ON eh.event_url_id = eu.id
+                         INNER JOIN calendar c ON eu.calendar_id = c.id
+                         LEFT OUTER JOIN event_data ed ON eh.id = ed.event_html_id
+                         LEFT OUTER JOIN event_data_datetime edd ON ed.id = edd.event_data_id
+                                                                AND edd.start_date IS NOT NULL
+                    WHERE eh.is_parsed == 1
+                      AND date(eh.downloaded_at) > date('now', '-{} day')
+                    GROUP BY c.url
+                '''.format(EventFrontier.YIELD_DAYS)
+        yields = {calendar_url: valid_count / events_count
+                  for calendar_url, events_count, valid_count in connection.execute(query).fetchall()
+                  if events_count > 0}
+
+        query = '''
+                    SELECT event_url_id, attempts
+                    FROM event_retry
+                '''
+        attempts = dict(connection.execute(query).fetchall())
+        return EventFrontier(yields, attempts)
+
+    def get_priority(self, event_url_id: int, calendar_url: str, position: int) -> float:
+        """ Scores a pending download of the event.
+
+        :param event_url_id: an ID of the event's URL
+        :param calendar_url: an URL address of the event's calendar
+        :param position: a position of the event in the calendar's listing (from 0)
+        :return: the priority between 0 and 1; the higher, the sooner the event should be downloaded
+        """
+
+        listing_score = 1 - min(position, EventFrontier.LISTING_DEPTH) / EventFrontier.LISTING_DEPTH
+        yield_score = self.yields.get(calendar_url, EventFrontier.DEFAULT_YIELD)
+        priority = EventFrontier.POSITION_WEIGHT * listing_score + EventFrontier.YIELD_WEIGHT * yield_score
+        return priority / (1 + self.attempts.get(event_url_id, 0))
+
+    def prioritize(self, events: List[tuple], listing_positions: Dict[int, Optional[int]] = None) -> List[tuple]:
+        """ Orders the pending downloads by their priority.
+
+        :param events: a list of tuples (event_url ID, event's URL, calendar's URL)
+        :param listing_positions: positions of the events in their calendars' listings by event_url IDs;
+                                  an unknown one (of an URL stored before the positions were) is estimated
+                                  by the event's order among the calendar's pending events (URLs are stored
+                                  in the listing's order)
+        :return: the list ordered from the highest priority
+        """
+
+        listing_positions = listing_positions if listing_positions else {}
+        ids_per_calendar = defaultdict(list)
+        for event_url_id, _, calendar_url in events:
+            ids_per_calendar[calendar_url].append(event_url_id)
+
+        priorities = {}
+        for calendar_url, event_url_ids in ids_per_calendar.items():
+            for pending_position, event_url_id in enumerate(sorted(event_url_ids)):
+                position = listing_positions.get(event_url_id, None)
+                priorities[event_url_id] = self.get_priority(
+                    event_url_id, calendar_url, pending_position if position is None else position)
+
+        return sorted(events, key=lambda event: priorities[event[0]], reverse=True)
@@ -0,0 +1,195 @@
+import multiprocessing
+import multiprocessing.pool
+import os
+import time
+from typing import Any, Callable, Iterator, List, Optional
+
+from lib import worker_state
+from lib.metrics import StageMetrics
+
+
+class Executor:
+    """ OOP executor encapsulating the logic of running tasks of a stage in parallel. """
+
+    PROCESS = "process"
+    THREAD = "thread"
+    INLINE = "inline"
+
+    DEFAULT_THREAD_WORKERS = 32
+    DEFAULT_INLINE_THRESHOLD = 8
+    CHUNKS_PER_WORKER = 4
+
+    def __init__(self, mode: str, workers: int = None, inline_threshold: int = None,
+                 worker_states: dict = None, metrics: StageMetrics = None) -> None:
+        """ Sets up the executor.
+
+        :param mode: 'process' for CPU-bound tasks, 'thread' for I/O-bound tasks or 'inline'
+        :param workers: a number of workers; if None, derived from the number of CPUs
+        :param inline_threshold: a number of tasks below which they run in the calling process
+        :param worker_states: read-only inputs shared by all the tasks (see lib.worker_state)
+        :param metrics: stage's metrics to record latencies of the tasks and utilization of the pool into
+        """
+
+        if mode not in [Executor.PROCESS, Executor.THREAD, Executor.INLINE]:
+            exception_msg = "Unknown executor mode: '{}'".format(mode)
+            raise Exception(exception_msg)
+
+        self.mode = mode
+        self.workers = workers if workers else self._get_default_workers(mode)
+        self.inline_threshold = inline_threshold if inline_threshold is not None \
+            else Executor.DEFAULT_INLINE_THRESHOLD
+        self.worker_states = worker_states if worker_states else {}
+        self.metrics = metrics
+
+        self._pool = None
+        self._results = []
+        self._busy_time, self._cpu_time = 0.0, 0.0
+        self._start = None
+
+    @staticmethod
+    def _get_default_workers(mode: str) -> int:
+        cpu_count = os.cpu_count() or 1
+        if mode == Executor.THREAD:
+            return max(Executor.DEFAULT_THREAD_WORKERS, cpu_count)
+        return cpu_count
+
+    def map(self, function: Callable, input_tuples: List[tuple], labels: List[str] = None) -> List:
+        """ Runs the function for all the input tuples.
+
+        :param function: a (static) function to run for each input tuple
+        :param input_tuples: a list of inputs for the function
+        :param labels: labels of the input tuples (usually URLs) reported with the slowest tasks in metrics
+        :return: a list of results in the order of the input tuples
+        """
+
+        results = [None] * len(input_tuples)
+        for index, result in self._imap_indexed(function, input_tuples, labels):
+            results[index] = result
+        return results
+
+    def imap(self, function: Callable, input_tuples: List[tuple], labels: List[str] = None) -> Iterator:
+        """ Runs the function for all the input tuples and yields results as soon as they are completed.
+
+        :param function: a (static) function to run for each input tuple
+        :param input_tuples: a list of inputs for the function
+        :param labels: labels of the input tuples (usually URLs) reported with the slowest tasks in metrics
+        :return: an iterator over results in the order of completion
+        """
+
+        for _, result in self._imap_indexed(function, input_tuples, labels):
+            yield result
+
+    def _imap_indexed(self, function: Callable, input_tuples: List[tuple], labels: Optional[List[str]]) -> Iterator:
+        tasks = [(function, index, input_tuple) for index, input_tuple in enumerate(input_tuples)]
+        workers = min(self.workers, len(input_tuples))
+        inline = self.mode == Executor.INLINE or workers <= 1 or len(input_tuples) < self.inline_threshold
+
+        start = time.perf_counter()
+        busy_time, cpu_time = 0.0, 0.0
+        for index, result, duration, task_cpu_time in self._imap_tasks(tasks, workers, inline):
+            busy_time += duration
+            cpu_time += task_cpu_time
+            if self.metrics is not None:
+                self.metrics.record_task(labels[index] if labels else str(index + 1), duration)
+            yield index, result
+
+        if self.metrics is not None:
+            # CPU time of inline tasks is already measured as the stage's thread time
+            self.metrics.record_pool(1 if inline else workers, time.perf_counter() - start, busy_time,
+                                     0.0 if inline else cpu_time)
+
+    def start(self) -> None:
+        """ Starts a pool of workers for tasks submitted one by one as their inputs come (see submit). """
+
+        self._results = []
+        self._busy_time, self._cpu_time = 0.0, 0.0
+        self._start = time.perf_counter()
+        if self.mode == Executor.INLINE or self.workers <= 1:
+            self._pool = None
+            worker_state.set_up(self.worker_states)
+        elif self.mode == Executor.THREAD:
+            self._pool = multiprocessing.pool.ThreadPool(self.workers, initializer=worker_state.set_up,
+                                                         initargs=(self.worker_states,))
+        else:
+            self._pool = multiprocessing.Pool(self.workers, initializer=worker_state.set_up,
+                                              initargs=(self.worker_states,))
+
+    def submit(self, function: Callable, input_tuple: tuple, label: str = None) -> None:
+        """ Runs the function for the input tuple in the background, so the caller can go on producing inputs
+        (e.g. downloading pages) while the previous ones are processed.
+
+        :param function: a (static) function to run
+        :param input_tuple: an input for the function
+        :param label: a label of the input tuple (usually an URL) reported with the slowest tasks in metrics
+        """
+
+        task = (function, len(self._results), input_tuple)
+        self._results.append(None)
+        if self._pool is None:
+            self._complete_task(label, Executor._run_task(task))
+        else:
+            self._results[-1] = self._pool.apply_async(Executor._run_task, (task,),
+                                                       callback=lambda result: self._complete_task(label, result))
+
+    def finish(self) -> List:
+        """ Waits for all the submitted tasks and stops the pool.
+
+        :return: a list of results in the order of submission
+        """
+
+        if self._pool is not None:
+            with self._pool:
+                self._results = [async_result.get() for async_result in self._results]
+        if self._pool is None or self.mode == Executor.THREAD:
+            worker_state.clear(list(self.worker_states.keys()))
+
+        if self.metrics is not None:
+            self.metrics.record_pool(1 if self._pool is None else self.workers, time.perf_counter() - self._start,
+                                     self._busy_time, 0.0 if self._pool is None else self._cpu_time)
+        return [result for _, result, _, _ in self._results]
+
+    def _complete_task(self, label: Optional[str], task_result: (int, Any, float, float)) -> None:
+        index, _, duration, task_cpu_time = task_result
+        self._busy_time += duration
+        self._cpu_time += task_cpu_time
+        if self.metrics is not None:
+            self.metrics.record_task(label, duration)
+        if self._pool is None:
+            self._results[index] = task_result
+
+    def _imap_tasks(self, tasks: List[tuple], workers: int, inline: bool) -> Iterator:
+        if inline:
+            yield from self._imap_inline(tasks)
+            return
+
+        if self.mode == Executor.THREAD:
+            pool = multiprocessing.pool.ThreadPool(workers, initializer=worker_state.set_up,
+                                                   initargs=(self.worker_states,))
+            chunksize = 1
+        else:
+            pool = multiprocessing.Pool(workers, initializer=worker_state.set_up, initargs=(self.worker_states,))
+            chunksize = max(1, len(tasks) // (workers * Executor.CHUNKS_PER_WORKER))
+
+        try:
+            with pool:
+                yield from pool.imap_unordered(Executor._run_task, tasks, chunksize)
+        finally:
+            if self.mode == Executor.THREAD:
+                worker_state.clear(list(self.worker_states.keys()))
+
+    def _imap_inline(self, tasks: List[tuple]) -> Iterator:
+        worker_state.set_up(self.worker_states)
+        try:
+            for task in tasks:
+                yield Executor._run_task(task)
+        finally:
+            worker_state.clear(list(self.worker_states.keys()))
+
+    @staticmethod
+    def _run_task(task: (Callable, int, tuple)) -> (int, Any, float, float):
+        function, index, input_tuple = task
+
+        start_wall_time = time.perf_counter()
+        start_cpu_time = time.thread_time()
+        result = function(input_tuple)
+        return index, result, time.perf_counter() - start_wall_time, time.thread_time() - start_cpu_time
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import sqlite3
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from lib.constants import TOO_LARGE_STATUS, NOT_HTML_STATUS
+
+
+class HostState:
+    """ OOP state of one host - its token bucket, current concurrency and recently observed latencies. """
+
+    def __init__(self, host: str, concurrency: float, rate: float, latencies: List[float] = None) -> None:
+        self.host = host
+        self.concurrency = concurrency
+        self.rate = rate
+        self.latencies = deque(latencies if latencies else [], maxlen=HostScheduler.LATENCY_SAMPLES)
+        self.tokens = HostScheduler.BURST
+        self.refilled_at = time.monotonic()
+        self.in_flight = 0
+        self.condition = None
+        self.condition_loop = None
+        self.is_updated = False
+
+    def reserve_token(self) -> float:
+        """ Takes a token from the bucket, possibly in advance.
+
+        :return: a number of seconds to wait before the token is really available
+        """
+
+        now = time.monotonic()
+        self.tokens = min(HostScheduler.BURST, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+        self.tokens -= 1
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def get_latency_percentile(self, percentile: int) -> Optional[float]:
+        if len(self.latencies) < HostScheduler.MIN_LATENCY_SAMPLES:
+            return None
+        sorted_latencies = sorted(self.latencies)
+        return sorted_latencies[min(len(sorted_latencies) - 1, len(sorted_latencies) * percentile // 100)]
+
+
+class HostScheduler:
+    """ OOP scheduler of requests to hosts pacing them by token buckets and adapting their concurrency (AIMD)
+    and timeouts to the latencies and responses observed on each host. """
+
+    DEFAULT_CONCURRENCY = 2
+    DEFAULT_MAX_RATE = 5.0
+    MIN_RATE = 0.2
+    RATE_INCREASE = 0.1
+    BURST = 2.0
+
+    LATENCY_SAMPLES = 100
+    MIN_LATENCY_SAMPLES = 10
+    SLOW_LATENCY_MULTIPLIER = 3
+    TIMEOUT_MULTIPLIER = 4
+    DEFAULT_TIMEOUT = (10.0, 30.0)
+    MIN_TIMEOUT = (3.0, 5.0)
+
+    THROTTLING_RESULTS = ["429", "503"]
+
+    def __init__(self, max_concurrency: int, max_rate: float = None, profiles: Dict[str, HostState] = None) -> None:
+        """ Sets up the scheduler.
+
+        :param max_concurrency: a maximal number of requests in flight to one host at once
+        :param max_rate: a maximal number of requests per second to one host
+        :param profiles: states of hosts learned in previous runs
+        """
+
+        self.max_concurrency = max_concurrency
+        self.max_rate = max_rate if max_rate else HostScheduler.DEFAULT_MAX_RATE
+        self.hosts = profiles if profiles else {}
+        # requests replayed from a cassette at full speed don't need to be paced
+        self.is_paced = True
+
+    @staticmethod
+    def load(connection: sqlite3.Connection, max_concurrency: int, max_rate: float = None) -> 'HostScheduler':
+        """ Creates a scheduler with states of hosts learned in previous runs.
+
+        :param connection: a connection to the database
+        :param max_concurrency: a maximal number of requests in flight to one host at once
+        :param max_rate: a maximal number of requests per second to one host
+        :return: the scheduler
+        """
+
+        max_rate = max_rate if max_rate else HostScheduler.DEFAULT_MAX_RATE
+        query = '''
+                    SELECT host, concurrency, rate, latencies
+                    FROM host_profile
+                '''
+        profiles = {}
+        for host, concurrency, rate, latencies in connection.execute(query).fetchall():
+            profiles[host] = HostState(host, min(concurrency, max_concurrency), min(rate, max_rate),
+                                       json.loads(latencies))
+        return HostScheduler(max_concurrency, max_rate, profiles)
+
+    def store(self, connection: sqlite3.Connection) -> None:
+        """ Stores states of the hosts requested by this scheduler for the next runs.
+
+        :param connection: a connection to the database
+        """
+
+        query = '''
+                    INSERT OR REPLACE INTO host_profile(host, concurrency, rate, latencies, updated_at)
+                    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                '''
+        values = [(state.host, state.concurrency, state.rate, json.dumps([round(latency, 4)
+                                                                          for latency in state.latencies]))
+                  for state in self.hosts.values() if state.is_updated]
+        connection.executemany(query, values)
+        connection.commit()
+
+    def _get_state(self, host: str) -> HostState:
+        if host not in self.hosts:
+            self.hosts[host] = HostState(host, min(HostScheduler.DEFAULT_CONCURRENCY, self.max_concurrency),
+                                         self.max_rate)
+        return self.hosts[host]
+
+    async def acquire(self, host: str, admit: Callable[[], bool] = None) -> Optional[Tuple[float, float]]:
+        """ Waits until a request to the host may be sent.
+
+        :param host: a hostname
+        :param admit: a check whether the request should still be sent, run once it's its turn
+                      (e.g. the host's circuit may have opened in the meantime)
+        :return: a tuple of (connect, read) timeouts for the request; None, if the request wasn't admitted
+        """
+
+        state = self._get_state(host)
+        if state.condition_loop is not asyncio.get_running_loop():
+            state.condition = asyncio.Condition()
+            state.condition_loop = asyncio.get_running_loop()
+
+        async with state.condition:
+            await state.condition.wait_for(lambda: state.in_flight < int(state.concurrency))
+            if admit is not None and not admit():
+                return None
+            state.in_flight += 1
+
+        delay = state.reserve_token() if self.is_paced else 0.0
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self.get_timeout(host)
+
+    async def release(self, host: str, latency: float, result: str) -> None:
+        """ Finishes a request to the host and adapts the host's concurrency and rate to its outcome.
+
+        :param host: a hostname
+        :param latency: a duration of the request in seconds
+        :param result: a result of the request (a status code or a name of an exception)
+        """
+
+        self._adapt(self._get_state(host), latency, result)
+        await self.cancel(host)
+
+    async def cancel(self, host: str) -> None:
+        """ Gives up a request to the host acquired but not sent.
+
+        :param host: a hostname
+        """
+
+        state = self._get_state(host)
+        async with state.condition:
+            state.in_flight -= 1
+            state.condition.notify_all()
+
+    def _adapt(self, state: HostState, latency: float, result: str) -> None:
+        state.is_updated = True
+
+        if result in HostScheduler.THROTTLING_RESULTS:
+            state.concurrency = max(1.0, state.concurrency / 2)
+            state.rate = max(HostScheduler.MIN_RATE, state.rate / 2)
+            return
+
+        if result in [TOO_LARGE_STATUS, NOT_HTML_STATUS]:
+            # the host responded well, just with an unsupported content
+            result = "200"
+
+        if not result.isdigit() or result.startswith("5"):
+            state.concurrency = max(1.0, state.concurrency / 2)
+            return
+
+        typical_latency = state.get_latency_percentile(50)
+        state.latencies.append(latency)
+        if typical_latency is not None and latency > HostScheduler.SLOW_LATENCY_MULTIPLIER * typical_latency:
+            state.concurrency = max(1.0, state.concurrency / 2)
+        else:
+            state.concurrency = min(float(self.max_concurrency), state.concurrency + 1 / state.concurrency)
+            state.rate = min(self.max_rate, state.rate + HostScheduler.RATE_INCREASE)
+
+    def get_timeout(self, host: str) -> Tuple[float, float]:
+        """ Derives timeouts of a request to the host from its historical latencies.
+
+        :param host: a hostname
+        :return: a tuple of (connect, read) timeouts
+        """
+
+        state = self._get_state(host)
+        typical_latency = state.get_latency_percentile(50)
+        tail_latency = state.get_latency_percentile(99)
+        if typical_latency is None or tail_latency is None:
+            return HostScheduler.DEFAULT_TIMEOUT
+
+        connect_timeout = HostScheduler.TIMEOUT_MULTIPLIER * typical_latency
+        read_timeout = HostScheduler.TIMEOUT_MULTIPLIER * tail_latency
+        return (min(max(connect_timeout, HostScheduler.MIN_TIMEOUT[0]), HostScheduler.DEFAULT_TIMEOUT[0]),
+                min(max(read_timeout, HostScheduler.MIN_TIMEOUT[1]), HostScheduler.DEFAULT_TIMEOUT[1]))
@@ -0,0 +1,116 @@
+import gzip
+import io
+import shutil
+from typing import BinaryIO
+
+from lxml import etree
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class HtmlCodec:
+    """ Compression of stored HTML files - the codec of a file is given by its extension
+    (zstd if the 'zstandard' package is installed, otherwise gzip; files without one are read as they are). """
+
+    GZIP_EXTENSION = ".gz"
+    ZSTD_EXTENSION = ".zst"
+    GZIP_LEVEL = 6
+    ZSTD_LEVEL = 10
+
+    @staticmethod
+    def get_default_extension() -> str:
+        return HtmlCodec.ZSTD_EXTENSION if zstandard is not None else HtmlCodec.GZIP_EXTENSION
+
+    @staticmethod
+    def get_extensions() -> list:
+        """ Gets extensions of all the codecs files can be stored with, starting with the default one. """
+
+        extensions = [HtmlCodec.get_default_extension(), HtmlCodec.GZIP_EXTENSION, HtmlCodec.ZSTD_EXTENSION, ""]
+        return list(dict.fromkeys(extensions))
+
+    @staticmethod
+    def compress(content_file: BinaryIO, output_file: BinaryIO, file_path: str) -> None:
+        """ Compresses the content chunk by chunk by the codec of the file it will be stored to.
+
+        :param content_file: a binary file object with a content of an HTML page
+        :param output_file: a binary file object to write the compressed content to
+        :param file_path: a path of the file
+        """
+
+        if file_path.endswith(HtmlCodec.ZSTD_EXTENSION):
+            if zstandard is None:
+                raise Exception("Package 'zstandard' is required to write '{}'!".format(file_path))
+            zstandard.ZstdCompressor(level=HtmlCodec.ZSTD_LEVEL).copy_stream(content_file, output_file)
+        elif file_path.endswith(HtmlCodec.GZIP_EXTENSION):
+            with gzip.GzipFile(fileobj=output_file, mode='wb', compresslevel=HtmlCodec.GZIP_LEVEL) as gzip_file:
+                shutil.copyfileobj(content_file, gzip_file)
+        else:
+            shutil.copyfileobj(content_file, output_file)
+
+    @staticmethod
+    def write(file_path: str, content_file: BinaryIO) -> None:
+        with open(file_path, 'wb') as html_file:
+            HtmlCodec.compress(content_file, html_file, file_path)
+
+    @staticmethod
+    def open(file_path: str) -> BinaryIO:
+        """ Opens the file for reading of its decompressed content (decompressed on the fly).
+
+        :param file_path: a path of the file
+        :return: a binary file object
+        """
+
+        if file_path.endswith(HtmlCodec.ZSTD_EXTENSION):
+            if zstandard is None:
+                raise Exception("Package 'zstandard' is required to read '{}'!".format(file_path))
+            return zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb'), closefd=True)
+        if file_path.endswith(HtmlCodec.GZIP_EXTENSION):
+            return gzip.open(file_path, 'rb')
+        return open(file_path, 'rb')
+
+    @staticmethod
+    def open_content(content: bytes, file_path: str) -> BinaryIO:
+        """ Opens the compressed content (e.g. a record of a pack file) for reading of its decompressed content.
+
+        :param content: the compressed content
+        :param file_path: a path determining the codec of the content
+        :return: a binary file object
+        """
+
+        raw_file = io.BytesIO(content)
+        if file_path.endswith(HtmlCodec.ZSTD_EXTENSION):
+            if zstandard is None:
+                raise Exception("Package 'zstandard' is required to read '{}'!".format(file_path))
+            return zstandard.ZstdDecompressor().stream_reader(raw_file)
+        if file_path.endswith(HtmlCodec.GZIP_EXTENSION):
+            return gzip.GzipFile(fileobj=raw_file, mode='rb')
+        return raw_file
+
+    @staticmethod
+    def read(file_path: str) -> bytes:
+        with HtmlCodec.open(file_path) as html_file:
+            return html_file.read()
+
+    @staticmethod
+    def parse(file_path: str, encoding: str = "utf-8") -> etree.ElementTree:
+        """ Parses the stored HTML file streaming its decompressed content straight into lxml's parser.
+
+        :param file_path: a path of the file
+        :param encoding: an encoding of the content
+        :return: a DOM of the HTML page
+        """
+
+        with HtmlCodec.open(file_path) as html_file:
+            return HtmlCodec.parse_stream(html_file, encoding)
+
+    @staticmethod
+    def parse_stream(html_file: BinaryIO, encoding: str = "utf-8") -> etree.ElementTree:
+        try:
+            parser = etree.HTMLParser(encoding=encoding)
+        except LookupError:
+            # an encoding unknown to libxml2 (e.g. 'mac-roman') is left for the parser to detect
+            parser = etree.HTMLParser()
+        return etree.parse(html_file, parser)
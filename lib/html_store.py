@@ -0,0 +1,313 @@
+import fcntl
+import hashlib
+import io
+import mmap
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import BinaryIO, List, Optional, Tuple
+
+from lxml import etree
+
+from lib.constants import DATA_DIR_PATH
+from lib.html_codec import HtmlCodec
+
+
+class HtmlStore:
+    """ OOP store of HTML snapshots - each snapshot is appended (compressed by HtmlCodec) to a pack file of the day
+    and its path is a locator of the record '<pack file path>/<offset>-<length>.html<codec extension>'.
+    DB rows referring to a snapshot are counted, so a pack can be dropped as a whole when no row refers to it.
+
+    Each distinct content is written only once - contents stored by previous runs are indexed by their hash
+    (see load_index); snapshots stored as single files ('blobs') before the pack files are read as they are. """
+
+    BLOBS_DIR_PATH = os.path.join(DATA_DIR_PATH, "blobs")
+    PACKS_DIR_PATH = os.path.join(DATA_DIR_PATH, "packs")
+    PACK_EXTENSION = ".pack"
+    RECORD_EXTENSION = ".html"
+    MAX_MAPPED_PACKS = 64
+    CHUNK_SIZE = 64 * 1024
+    SPOOL_SIZE = 1024 * 1024
+    LEGACY_ENCODING = "utf-8"
+
+    _lock = threading.Lock()
+    _written_paths = {}
+    _written_hashes = {}
+    _mapped_packs = OrderedDict()
+
+    @staticmethod
+    def get_content_hash(content_file: BinaryIO) -> str:
+        content_hash = hashlib.sha256()
+        for chunk in iter(lambda: content_file.read(HtmlStore.CHUNK_SIZE), b''):
+            content_hash.update(chunk)
+        content_file.seek(0)
+        return content_hash.hexdigest()
+
+    @staticmethod
+    def get_pack_path(day: date = None) -> str:
+        if day is None:
+            day = date.today()
+        return os.path.join(HtmlStore.PACKS_DIR_PATH, "{0:%Y-%m-%d}".format(day) + HtmlStore.PACK_EXTENSION)
+
+    @staticmethod
+    def get_pack_day(pack_path: str) -> date:
+        return datetime.strptime(os.path.basename(pack_path)[:-len(HtmlStore.PACK_EXTENSION)], "%Y-%m-%d").date()
+
+    @staticmethod
+    def list_packs() -> List[str]:
+        if not os.path.isdir(HtmlStore.PACKS_DIR_PATH):
+            return []
+        return [os.path.join(HtmlStore.PACKS_DIR_PATH, file) for file in sorted(os.listdir(HtmlStore.PACKS_DIR_PATH))
+                if file.endswith(HtmlStore.PACK_EXTENSION)]
+
+    @staticmethod
+    def is_pack_path(html_file_path: Optional[str]) -> bool:
+        return html_file_path is not None and \
+               os.path.normpath(html_file_path).startswith(os.path.normpath(HtmlStore.PACKS_DIR_PATH) + os.sep) and \
+               HtmlStore.PACK_EXTENSION + os.sep in html_file_path
+
+    @staticmethod
+    def is_blob_path(html_file_path: Optional[str]) -> bool:
+        """ Checks whether the path refers to a snapshot in the store (a pack record or a single blob file). """
+
+        return html_file_path is not None and (
+                HtmlStore.is_pack_path(html_file_path) or
+                os.path.normpath(html_file_path).startswith(os.path.normpath(HtmlStore.BLOBS_DIR_PATH) + os.sep))
+
+    @staticmethod
+    def split_pack_path(html_file_path: str) -> Tuple[str, int, int]:
+        """ Splits a locator of a pack record.
+
+        :param html_file_path: the locator
+        :return: a tuple of (pack file path, offset, length) of the record
+        """
+
+        pack_path, _, record = html_file_path.rpartition(os.sep)
+        offset, _, length = record.partition('.')[0].partition('-')
+        return pack_path, int(offset), int(length)
+
+    @staticmethod
+    def load_index(connection: sqlite3.Connection) -> None:
+        """ Loads locators of the snapshots still referred to by their content hashes, so a content stored
+        by a previous run (e.g. the same page of another URL) isn't written again.
+
+        :param connection: a connection to the database
+        """
+
+        query = '''
+                    SELECT content_hash, html_file_path
+                    FROM html_blob
+                    WHERE content_hash IS NOT NULL
+                      AND ref_count > 0
+                '''
+        rows = connection.execute(query).fetchall()
+        with HtmlStore._lock:
+            for content_hash, html_file_path in rows:
+                HtmlStore._written_paths.setdefault(content_hash, html_file_path)
+                HtmlStore._written_hashes[html_file_path] = content_hash
+
+    @staticmethod
+    def write(content_file: BinaryIO, content_hash: str = None, dry_run: bool = False) -> str:
+        """ Appends the compressed content to today's pack unless the same content has already been written.
+
+        :param content_file: a binary file object with a content of an HTML page
+        :param content_hash: a SHA-256 hash of the content; if None, it's computed
+        :param dry_run: a flag that determines whether to write the content or just to get a path of the pack
+        :return: the locator of the record
+        """
+
+        if content_hash is None:
+            content_hash = HtmlStore.get_content_hash(content_file)
+        with HtmlStore._lock:
+            html_file_path = HtmlStore._written_paths.get(content_hash, None)
+        # an indexed snapshot's pack may have been dropped since
+        if html_file_path is not None and HtmlStore.exists(html_file_path):
+            return html_file_path
+        if dry_run:
+            return HtmlStore.get_pack_path()
+
+        codec_extension = HtmlCodec.get_default_extension()
+        with tempfile.SpooledTemporaryFile(max_size=HtmlStore.SPOOL_SIZE) as compressed_file:
+            HtmlCodec.compress(content_file, compressed_file, codec_extension)
+            compressed_file.seek(0)
+            html_file_path = HtmlStore._append(compressed_file, codec_extension)
+        with HtmlStore._lock:
+            HtmlStore._written_paths[content_hash] = html_file_path
+            HtmlStore._written_hashes[html_file_path] = content_hash
+        return html_file_path
+
+    @staticmethod
+    def relocate(html_file_path: str) -> str:
+        """ Copies the stored snapshot (as it's compressed) to today's pack.
+
+        :param html_file_path: the snapshot's path
+        :return: the locator of the new record
+        """
+
+        codec_extension = next(extension for extension in HtmlCodec.get_extensions()
+                               if html_file_path.endswith(HtmlStore.RECORD_EXTENSION + extension))
+        if HtmlStore.is_pack_path(html_file_path):
+            return HtmlStore._append(io.BytesIO(HtmlStore._read_record(html_file_path)), codec_extension)
+        with open(html_file_path, 'rb') as html_file:
+            return HtmlStore._append(html_file, codec_extension)
+
+    @staticmethod
+    def _append(compressed_file: BinaryIO, codec_extension: str) -> str:
+        pack_path = HtmlStore.get_pack_path()
+        os.makedirs(HtmlStore.PACKS_DIR_PATH, exist_ok=True)
+
+        # the lock keeps the offset right even if other processes append to the pack at the same time
+        with open(pack_path, 'ab') as pack_file:
+            fcntl.flock(pack_file, fcntl.LOCK_EX)
+            try:
+                offset = pack_file.seek(0, os.SEEK_END)
+                shutil.copyfileobj(compressed_file, pack_file)
+                pack_file.flush()
+                length = pack_file.tell() - offset
+            finally:
+                fcntl.flock(pack_file, fcntl.LOCK_UN)
+
+        return os.path.join(pack_path, "{}-{}".format(offset, length) +
+                            HtmlStore.RECORD_EXTENSION + codec_extension)
+
+    @staticmethod
+    def exists(html_file_path: Optional[str]) -> bool:
+        if not html_file_path:
+            return False
+        if not HtmlStore.is_pack_path(html_file_path):
+            return os.path.isfile(html_file_path)
+
+        pack_path, offset, length = HtmlStore.split_pack_path(html_file_path)
+        return os.path.isfile(pack_path) and os.path.getsize(pack_path) >= offset + length
+
+    @staticmethod
+    def open(html_file_path: str) -> BinaryIO:
+        """ Opens the stored snapshot for reading of its decompressed content.
+
+        :param html_file_path: the snapshot's path
+        :return: a binary file object
+        """
+
+        if not HtmlStore.is_pack_path(html_file_path):
+            return HtmlCodec.open(html_file_path)
+        return HtmlCodec.open_content(HtmlStore._read_record(html_file_path), html_file_path)
+
+    @staticmethod
+    def parse(html_file_path: str, encoding: Optional[str] = None) -> etree.ElementTree:
+        """ Parses the stored snapshot by lxml straight from its bytes.
+
+        :param html_file_path: the snapshot's path
+        :param encoding: an encoding of the content recorded with the snapshot;
+                         if None, the snapshot was stored before encodings were recorded (decoded into UTF-8)
+        :return: a DOM of the HTML page
+        """
+
+        with HtmlStore.open(html_file_path) as html_file:
+            return HtmlCodec.parse_stream(html_file, encoding or HtmlStore.LEGACY_ENCODING)
+
+    @staticmethod
+    def _read_record(html_file_path: str) -> bytes:
+        pack_path, offset, length = HtmlStore.split_pack_path(html_file_path)
+
+        with HtmlStore._lock:
+            pack_map = HtmlStore._mapped_packs.pop(pack_path, None)
+            if pack_map is None or len(pack_map) < offset + length:
+                # the pack has grown since it was mapped
+                if pack_map is not None:
+                    pack_map.close()
+                with open(pack_path, 'rb') as pack_file:
+                    pack_map = mmap.mmap(pack_file.fileno(), 0, access=mmap.ACCESS_READ)
+            HtmlStore._mapped_packs[pack_path] = pack_map
+            while len(HtmlStore._mapped_packs) > HtmlStore.MAX_MAPPED_PACKS:
+                HtmlStore._mapped_packs.popitem(last=False)[1].close()
+
+            return pack_map[offset:offset + length]
+
+    @staticmethod
+    def drop_pack(pack_path: str) -> None:
+        with HtmlStore._lock:
+            pack_map = HtmlStore._mapped_packs.pop(pack_path, None)
+            if pack_map is not None:
+                pack_map.close()
+        if os.path.isfile(pack_path):
+            os.remove(pack_path)
+
+    @staticmethod
+    def get_pack_references(connection: sqlite3.Connection, pack_path: str) -> List[str]:
+        """ Gets locators of the pack's records still referred to by any DB row.
+
+        :param connection: a connection to the database
+        :param pack_path: a path of the pack file
+        :return: the locators
+        """
+
+        # a range instead of LIKE lets SQLite use the primary key's index (the next character after the separator)
+        query = '''
+                    SELECT html_file_path
+                    FROM html_blob
+                    WHERE html_file_path > ?
+                      AND html_file_path < ?
+                      AND ref_count > 0
+                '''
+        cursor = connection.execute(query, (pack_path + os.sep, pack_path + chr(ord(os.sep) + 1)))
+        return [html_file_path for html_file_path, in cursor.fetchall()]
+
+    @staticmethod
+    def add_reference(connection: sqlite3.Connection, html_file_path: str, count: int = 1) -> None:
+        """ Counts a new DB row referring to the snapshot.
+
+        :param connection: a connection to the database
+        :param html_file_path: the snapshot's path
+        :param count: a number of the new rows
+        """
+
+        if not HtmlStore.is_blob_path(html_file_path):
+            return
+
+        with HtmlStore._lock:
+            content_hash = HtmlStore._written_hashes.get(html_file_path, None)
+        query = '''
+                    INSERT INTO html_blob(html_file_path, ref_count, content_hash)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(html_file_path) DO UPDATE SET ref_count = ref_count + excluded.ref_count,
+                                                              content_hash = coalesce(content_hash,
+                                                                                      excluded.content_hash)
+                '''
+        connection.execute(query, (html_file_path, count, content_hash))
+
+    @staticmethod
+    def remove_references(connection: sqlite3.Connection, html_file_paths: List[str]) -> List[str]:
+        """ Uncounts DB rows referring to the snapshots (one row per item, so a path can be listed more times).
+
+        :param connection: a connection to the database
+        :param html_file_paths: paths the rows referred to
+        :return: paths no longer referred to (including files outside the store);
+                 files among them can be deleted, pack records are dropped with their whole pack
+        """
+
+        unreferenced_paths = []
+        for html_file_path in html_file_paths:
+            if not HtmlStore.is_blob_path(html_file_path):
+                unreferenced_paths.append(html_file_path)
+                continue
+
+            query = '''
+                        UPDATE html_blob
+                        SET ref_count = ref_count - 1
+                        WHERE html_file_path = ?
+                    '''
+            connection.execute(query, (html_file_path,))
+
+            query = '''
+                        DELETE FROM html_blob
+                        WHERE html_file_path = ?
+                          AND ref_count <= 0
+                    '''
+            if connection.execute(query, (html_file_path,)).rowcount > 0:
+                unreferenced_paths.append(html_file_path)
+
+        return unreferenced_paths
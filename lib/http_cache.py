@@ -0,0 +1,101 @@
+import sqlite3
+from typing import List, Optional
+
+from lib.html_store import HtmlStore
+
+
+class HttpCache:
+    """ OOP persistent cache of HTTP validators (ETag, Last-Modified) and content hashes of downloaded pages
+    used to download a page only if it has changed since its previous snapshot. """
+
+    QUERY_CHUNK_SIZE = 500
+
+    def __init__(self, entries: dict = None) -> None:
+        self.entries = entries if entries else {}
+        self.updated_urls = set()
+
+    @staticmethod
+    def load(connection: sqlite3.Connection, urls: List[str]) -> 'HttpCache':
+        """ Loads cached entries of the specified URLs.
+
+        :param connection: a connection to the database
+        :param urls: URLs to load the entries of
+        :return: the cache
+        """
+
+        entries = {}
+        for chunk_start in range(0, len(urls), HttpCache.QUERY_CHUNK_SIZE):
+            chunk = urls[chunk_start:chunk_start + HttpCache.QUERY_CHUNK_SIZE]
+            query = '''
+                        SELECT url, etag, last_modified, content_hash, encoding, html_file_path
+                        FROM http_cache
+                        WHERE url IN ({})
+                    '''.format(', '.join(['?'] * len(chunk)))
+            for url, etag, last_modified, content_hash, encoding, html_file_path in connection.execute(query, chunk):
+                entries[url] = {
+                    'etag': etag,
+                    'last_modified': last_modified,
+                    'content_hash': content_hash,
+                    'encoding': encoding,
+                    'html_file_path': html_file_path
+                }
+        return HttpCache(entries)
+
+    def get(self, url: str) -> Optional[dict]:
+        """ Gets a cached entry of the URL if its snapshot still exists and can be reused.
+        An entry of a page that wasn't archived (see download_events --no-archive) has no snapshot,
+        but its validators and content hash still tell whether the page has changed.
+
+        :param url: an URL address
+        :return: a dictionary with 'etag', 'last_modified', 'content_hash', 'encoding' and 'html_file_path'
+                 of the snapshot ('html_file_path' is None, if the page wasn't archived);
+                 None, if there is no usable entry
+        """
+
+        entry = self.entries.get(url, None)
+        if entry is None:
+            return None
+        if entry['html_file_path'] is not None and not HtmlStore.exists(entry['html_file_path']):
+            return None
+        return entry
+
+    def update(self, url: str, result: dict, html_file_path: Optional[str]) -> None:
+        """ Updates the entry of the URL with a result of its download (see utils.fetch_html_content).
+
+        :param url: an URL address
+        :param result: a result of the download
+        :param html_file_path: a path of the snapshot the URL now refers to; None, if the page wasn't archived
+        """
+
+        if result['content_hash'] is None:
+            # the download failed, so the previous entry is still the last known content
+            return
+
+        entry = self.entries.get(url, {})
+        self.entries[url] = {
+            'etag': result['etag'] or entry.get('etag', None),
+            'last_modified': result['last_modified'] or entry.get('last_modified', None),
+            'content_hash': result['content_hash'],
+            'encoding': result['encoding'],
+            'html_file_path': html_file_path
+        }
+        self.updated_urls.add(url)
+
+    def store(self, connection: sqlite3.Connection) -> None:
+        """ Stores the updated entries.
+
+        :param connection: a connection to the database
+        """
+
+        query = '''
+                    INSERT OR REPLACE INTO http_cache(url, etag, last_modified, content_hash, encoding,
+                                                      html_file_path, checked_at)
+                    VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                '''
+        values = [(url, self.entries[url]['etag'], self.entries[url]['last_modified'],
+                   self.entries[url]['content_hash'], self.entries[url]['encoding'],
+                   self.entries[url]['html_file_path'])
+                  for url in self.updated_urls]
+        connection.executemany(query, values)
+        connection.commit()
+        self.updated_urls.clear()
@@ -1,11 +1,12 @@
 import logging
+import os
 import sys
 
 
 def set_up_script_logger(script_name: str, log_file: str = None, log_level: str = "WARNING") -> logging.LoggerAdapter:
     logger = logging.getLogger(script_name)
     if script_name[-3:] == ".py":
-        script_name = script_name[:-3].replace('/', '.')
+        script_name = os.path.relpath(script_name)[:-3].replace('/', '.')
     extra = {'scriptName': script_name}
     log_format = "%(asctime)s - %(scriptName)s.%(funcName)s:%(lineno)s - %(levelname)s: %(message)s"
     logger = _set_up_logger(logger, log_format, log_file, log_level)
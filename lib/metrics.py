@@ -0,0 +1,174 @@
+import logging
+import math
+import os
+import time
+from typing import List, Optional
+
+from lib import utils
+from lib.constants import METRICS_DIR_PATH
+
+PROMETHEUS_PREFIX = "map_of_events_stage"
+LATENCY_BUCKETS = [0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300]
+
+
+class StageMetrics:
+    """ OOP collector of performance metrics of one stage of the tool. """
+
+    SLOWEST_TASKS_COUNT = 10
+
+    def __init__(self, script_name: str, mode: str = None) -> None:
+        """ Starts measuring the stage's wall-clock and CPU time.
+
+        :param script_name: a file path of the stage's script (usually __file__)
+        :param mode: a mode of the stage stored apart from its regular runs (e.g. 'pipeline'); if None, regular
+        """
+
+        self.stage = os.path.basename(script_name)[:-3] + ("_" + mode if mode else "")
+        self.counts = {}
+        self.task_durations = []
+        self.task_labels = []
+        self.tasks_cpu_time = 0.0
+        self.pool_busy_time = 0.0
+        self.pool_capacity_time = 0.0
+
+        self._start_wall_time = time.perf_counter()
+        self._start_cpu_time = time.thread_time()
+
+    def set_count(self, name: str, value: int) -> None:
+        """ Sets a named counter (e.g. a number of input or failed items).
+
+        :param name: a name of the counter
+        :param value: a value of the counter
+        """
+
+        self.counts[name] = value
+
+    def record_task(self, label: Optional[str], duration: float) -> None:
+        """ Records a latency of one task.
+
+        :param label: a label of the task (usually an URL) to identify stragglers
+        :param duration: a wall-clock duration of the task in seconds
+        """
+
+        self.task_durations.append(duration)
+        self.task_labels.append(label)
+
+    def record_pool(self, workers: int, wall_time: float, busy_time: float, cpu_time: float) -> None:
+        """ Records a utilization of a pool of workers which ran the stage's tasks.
+
+        :param workers: a number of workers of the pool
+        :param wall_time: a wall-clock time the pool was running
+        :param busy_time: a sum of durations of all the tasks run by the pool
+        :param cpu_time: a CPU time consumed by the tasks outside of the stage's thread
+        """
+
+        self.pool_capacity_time += workers * wall_time
+        self.pool_busy_time += busy_time
+        self.tasks_cpu_time += cpu_time
+
+    def get_summary(self) -> dict:
+        """ Summarizes the metrics collected so far.
+
+        :return: a dictionary with the summarized metrics
+        """
+
+        wall_time = time.perf_counter() - self._start_wall_time
+        cpu_time = time.thread_time() - self._start_cpu_time + self.tasks_cpu_time
+        sorted_durations = sorted(self.task_durations)
+        slowest_tasks = sorted(zip(self.task_durations, self.task_labels), key=lambda task: task[0], reverse=True)
+
+        return {
+            'stage': self.stage,
+            'timestamp': int(time.time()),
+            'counts': self.counts,
+            'wall_time': wall_time,
+            'cpu_time': cpu_time,
+            'tasks': {
+                'count': len(sorted_durations),
+                'sum': sum(sorted_durations),
+                'p50': StageMetrics._get_percentile(sorted_durations, 50),
+                'p95': StageMetrics._get_percentile(sorted_durations, 95),
+                'max': sorted_durations[-1] if sorted_durations else None,
+                'histogram': {str(bucket): len([duration for duration in sorted_durations if duration <= bucket])
+                              for bucket in LATENCY_BUCKETS}
+            },
+            'pool_utilization': self.pool_busy_time / self.pool_capacity_time if self.pool_capacity_time else None,
+            'slowest_tasks': [{'label': label, 'duration': duration}
+                              for duration, label in slowest_tasks[:StageMetrics.SLOWEST_TASKS_COUNT]]
+        }
+
+    @staticmethod
+    def _get_percentile(sorted_values: List[float], percentile: int) -> Optional[float]:
+        if len(sorted_values) == 0:
+            return None
+        rank = max(math.ceil(percentile / 100 * len(sorted_values)), 1)
+        return sorted_values[rank - 1]
+
+    def store(self, script_logger: logging.Logger, dry_run: bool = False) -> None:
+        """ Logs the summarized metrics and stores them into a json file and a Prometheus textfile.
+
+        :param script_logger: a logger to log the summary with
+        :param dry_run: if True, the metrics are only logged
+        """
+
+        summary = self.get_summary()
+        script_logger.info(">> Metrics: {:.2f} s wall-clock, {:.2f} s CPU, {} tasks (p50: {}, p95: {}, max: {})".format(
+            summary['wall_time'], summary['cpu_time'], summary['tasks']['count'],
+            *[StageMetrics._format_duration(summary['tasks'][key]) for key in ['p50', 'p95', 'max']]))
+        if summary['slowest_tasks']:
+            script_logger.debug(">> Slowest tasks: {}".format(
+                ", ".join(["{} ({:.2f} s)".format(task['label'], task['duration'])
+                           for task in summary['slowest_tasks']])))
+
+        if dry_run:
+            return
+
+        os.makedirs(METRICS_DIR_PATH, exist_ok=True)
+        utils.store_to_json_file(summary, os.path.join(METRICS_DIR_PATH, "{}.json".format(self.stage)))
+
+        prometheus_file_path = os.path.join(METRICS_DIR_PATH, "{}.prom".format(self.stage))
+        with open(prometheus_file_path + ".tmp", 'w') as prometheus_file:
+            prometheus_file.write(StageMetrics._format_prometheus(summary))
+        os.replace(prometheus_file_path + ".tmp", prometheus_file_path)
+
+    @staticmethod
+    def _format_duration(duration: Optional[float]) -> str:
+        return "-" if duration is None else "{:.2f} s".format(duration)
+
+    @staticmethod
+    def _format_prometheus(summary: dict) -> str:
+        stage_label = 'stage="{}"'.format(summary['stage'])
+        lines = ["# TYPE {}_wall_seconds gauge".format(PROMETHEUS_PREFIX),
+                 "{}_wall_seconds{{{}}} {}".format(PROMETHEUS_PREFIX, stage_label, summary['wall_time']),
+                 "# TYPE {}_cpu_seconds gauge".format(PROMETHEUS_PREFIX),
+                 "{}_cpu_seconds{{{}}} {}".format(PROMETHEUS_PREFIX, stage_label, summary['cpu_time']),
+                 "# TYPE {}_last_run_timestamp_seconds gauge".format(PROMETHEUS_PREFIX),
+                 "{}_last_run_timestamp_seconds{{{}}} {}".format(PROMETHEUS_PREFIX, stage_label,
+                                                                summary['timestamp'])]
+
+        lines.append("# TYPE {}_items gauge".format(PROMETHEUS_PREFIX))
+        for name, value in summary['counts'].items():
+            lines.append('{}_items{{{},name="{}"}} {}'.format(PROMETHEUS_PREFIX, stage_label, name, value))
+
+        tasks = summary['tasks']
+        lines.append("# TYPE {}_task_duration_seconds histogram".format(PROMETHEUS_PREFIX))
+        for bucket, count in tasks['histogram'].items():
+            lines.append('{}_task_duration_seconds_bucket{{{},le="{}"}} {}'.format(PROMETHEUS_PREFIX, stage_label,
+                                                                                  bucket, count))
+        lines.append('{}_task_duration_seconds_bucket{{{},le="+Inf"}} {}'.format(PROMETHEUS_PREFIX, stage_label,
+                                                                                tasks['count']))
+        lines.append("{}_task_duration_seconds_sum{{{}}} {}".format(PROMETHEUS_PREFIX, stage_label, tasks['sum']))
+        lines.append("{}_task_duration_seconds_count{{{}}} {}".format(PROMETHEUS_PREFIX, stage_label, tasks['count']))
+
+        lines.append("# TYPE {}_task_duration_quantile_seconds gauge".format(PROMETHEUS_PREFIX))
+        for key, quantile in [('p50', "0.5"), ('p95', "0.95"), ('max', "1")]:
+            if tasks[key] is not None:
+                lines.append('{}_task_duration_quantile_seconds{{{},quantile="{}"}} {}'.format(
+                    PROMETHEUS_PREFIX, stage_label, quantile, tasks[key]))
+
+        if summary['pool_utilization'] is not None:
+            lines.append("# TYPE {}_pool_utilization_ratio gauge".format(PROMETHEUS_PREFIX))
+            lines.append("{}_pool_utilization_ratio{{{}}} {}".format(PROMETHEUS_PREFIX, stage_label,
+                                                                    summary['pool_utilization']))
+
+        return "\n".join(lines) + "\n"
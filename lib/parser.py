@@ -1,17 +1,19 @@
 import json
-import os
 import re
 from typing import List, Union
 
 from lxml import etree
 
 from lib import logger
+from lib.parser_plan import ParserPlan
+
+LOGGER = logger.set_up_script_logger(__name__)
 
 
 class Parser:
     """ OOP parser encapsulating the logic of data parsing from the specified DOM according to a specific template. """
 
-    PARSERS_DIR_PATH = "resources/parsers"
+    PARSERS_DIR_PATH = ParserPlan.PARSERS_DIR_PATH
     ORDINATION = ["title", "perex", "datetime", "location", "gps", "organizer", "types"]
     DATE_TIME_DELIMITER = "%;"
     COORDINATE_REGEX = re.compile(r'-?\d+.\d+')
@@ -19,18 +21,21 @@ class Parser:
     def __init__(self, parser_name: str) -> None:
         self.name = parser_name
         self.dom = None
-        self.metadata = self.load_parser_file(parser_name)
+        self.plan = ParserPlan.get(parser_name)
+        self.metadata = self.plan.metadata
+        self.roots = {}
         self.error_messages = []
-        self.logger = logger.set_up_script_logger(__name__)
+        self.logger = LOGGER
 
     def set_dom(self, dom: etree.ElementTree) -> None:
         self.dom = dom
+        self.roots = {}
 
     @staticmethod
     def load_parser_file(parser_name: str) -> dict:
-        parser_file_path = os.path.join(Parser.PARSERS_DIR_PATH, parser_name + ".json")
-        with open(parser_file_path) as parser_file:
-            return json.load(parser_file)
+        """ Loads a parser's template. The returned dictionary is shared and must not be modified. """
+
+        return ParserPlan.get(parser_name).metadata
 
     def _get_roots(self, page: str) -> List[etree._Element]:
         if page not in self.metadata:
@@ -43,11 +48,20 @@ class Parser:
             self.logger.critical(exception_msg)
             raise Exception(exception_msg)
 
-        page_metadata = self.metadata[page]
-        root_xpath_data = page_metadata["root"]["xpath"]
+        if page in self.roots:
+            return self.roots[page]
+
+        invalid_selectors = self.plan.get_invalid_selectors(page, "root")
+        if len(invalid_selectors) != 0:
+            exception_msg = "Invalid root selectors of '{}' page in '{}' parser: {}".format(page, self.name,
+                                                                                        invalid_selectors)
+            self.logger.critical(exception_msg)
+            raise Exception(exception_msg)
+
+        root_xpath_data = self.metadata[page]["root"]["xpath"]
         root_elements = []
-        for selector in root_xpath_data["selectors"]:
-            found_elements = self.dom.xpath(selector)
+        for selector in self.plan.get_selectors(page, "root"):
+            found_elements = selector(self.dom)
             root_elements.extend(found_elements)
 
         if len(root_elements) == 0:
@@ -59,6 +73,7 @@ class Parser:
             if root_match == "FIRST":
                 root_elements = [root_elements[0]]
 
+        self.roots[page] = root_elements
         return root_elements
 
     def get_event_urls(self) -> List[str]:
@@ -92,15 +107,15 @@ class Parser:
         if len(page_roots) == 0:
             return []
 
-        page_metadata = self.metadata[page]
-        data_key_xpath_data = page_metadata[data_key]["xpath"]
-        data_key_selectors = data_key_xpath_data["selectors"]
+        data_key_selectors = self.plan.get_selectors(page, data_key)
 
         data_key_elements = []
         for root in page_roots:
             for selector in data_key_selectors:
+                if selector is None:
+                    continue
                 try:
-                    found_elements = root.xpath(selector)
+                    found_elements = selector(root)
                     found_elements = self._remove_html_tags(found_elements)
                     data_key_elements.extend(found_elements)
                 except etree.XPathEvalError:
@@ -167,14 +182,13 @@ class Parser:
             return xpath_values
 
         regex_data = event_key_data["regex"]
-        expressions = regex_data["expressions"]
+        regexes = self.plan.get_regexes("event", data_key)
         groups = regex_data["group"] if "group" in regex_data else None
         match = regex_data["match"] if "match" in regex_data else "ALL"
 
         regexed_values = []
         for data in xpath_values:
-            for expression in expressions:
-                regex = re.compile(expression)
+            for regex in regexes:
                 matched_value = regex.search(str(data))
                 if matched_value:
                     result = {}
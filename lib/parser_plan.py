@@ -0,0 +1,75 @@
+import functools
+import json
+import os
+import re
+from typing import List, Optional
+
+from lxml import etree
+
+
+class ParserPlan:
+    """ OOP plan of a parser's template compiled once per process into XPath objects and regular expressions. """
+
+    PARSERS_DIR_PATH = "resources/parsers"
+    CACHE_SIZE = 32
+
+    def __init__(self, parser_name: str, metadata: dict) -> None:
+        self.name = parser_name
+        self.metadata = metadata
+        self.pages = {page: ParserPlan._compile_page(page_metadata) for page, page_metadata in metadata.items()}
+
+    @staticmethod
+    def get(parser_name: str) -> 'ParserPlan':
+        """ Gets a compiled plan of the specified parser, compiling it again only if its template file has changed.
+
+        :param parser_name: a name of a parser's template
+        :return: the compiled plan
+        """
+
+        parser_file_path = ParserPlan.get_file_path(parser_name)
+        return ParserPlan._compile(parser_name, os.stat(parser_file_path).st_mtime_ns)
+
+    @staticmethod
+    def get_file_path(parser_name: str) -> str:
+        return os.path.join(ParserPlan.PARSERS_DIR_PATH, parser_name + ".json")
+
+    @staticmethod
+    @functools.lru_cache(maxsize=CACHE_SIZE)
+    def _compile(parser_name: str, _mtime: int) -> 'ParserPlan':
+        with open(ParserPlan.get_file_path(parser_name)) as parser_file:
+            return ParserPlan(parser_name, json.load(parser_file))
+
+    @staticmethod
+    def _compile_page(page_metadata: dict) -> dict:
+        compiled_page = {}
+        for data_key, data_key_metadata in page_metadata.items():
+            xpath_data = data_key_metadata["xpath"]
+            regex_data = data_key_metadata.get("regex", None)
+
+            selectors = [ParserPlan._compile_xpath(selector) for selector in xpath_data["selectors"]]
+            compiled_page[data_key] = {
+                'selectors': selectors,
+                'invalid_selectors': [selector for selector, compiled in zip(xpath_data["selectors"], selectors)
+                                      if compiled is None],
+                'regexes': [re.compile(expression) for expression in regex_data["expressions"]]
+                if regex_data else None
+            }
+        return compiled_page
+
+    @staticmethod
+    def _compile_xpath(selector: str) -> Optional[etree.XPath]:
+        # invalid selectors of data keys are skipped the same way as those failing during evaluation,
+        # invalid selectors of a root are reported when the root is searched (see Parser._get_roots)
+        try:
+            return etree.XPath(selector)
+        except etree.XPathError:
+            return None
+
+    def get_selectors(self, page: str, data_key: str) -> List[etree.XPath]:
+        return self.pages[page][data_key]['selectors']
+
+    def get_invalid_selectors(self, page: str, data_key: str) -> List[str]:
+        return self.pages[page][data_key]['invalid_selectors']
+
+    def get_regexes(self, page: str, data_key: str) -> Optional[List[re.Pattern]]:
+        return self.pages[page][data_key]['regexes']
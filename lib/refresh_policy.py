@@ -0,0 +1,48 @@
+from datetime import date, datetime
+from typing import Optional
+
+
+class RefreshPolicy:
+    """ Policy of refreshing already downloaded pages of future events (to pick up their postponements
+    and cancellations) - the closer an event's start, the more often its page is downloaded again. """
+
+    # maximal number of days until the event's start: number of days between two downloads of its page
+    INTERVALS = [
+        (3, 1),
+        (14, 2),
+        (60, 7)
+    ]
+    DISTANT_INTERVAL = 14
+
+    @staticmethod
+    def get_interval(start_date: date, day: date = None) -> int:
+        """ Gets a number of days after which the event's page should be downloaded again.
+
+        :param start_date: a day of the event's next start
+        :param day: a day of the download; if None, today
+        :return: the number of days
+        """
+
+        days_to_start = (start_date - (day if day else date.today())).days
+        for max_days_to_start, interval in RefreshPolicy.INTERVALS:
+            if days_to_start <= max_days_to_start:
+                return interval
+        return RefreshPolicy.DISTANT_INTERVAL
+
+    @staticmethod
+    def is_due(start_date: str, checked_at: Optional[str], day: date = None) -> bool:
+        """ Checks whether the event's page should be downloaded again.
+
+        :param start_date: a day of the event's next start (as stored, 'YYYY-MM-DD')
+        :param checked_at: a time of the last successful download of the page; if None, it's due
+        :param day: a day of the download; if None, today
+        :return: True, if the interval for the event has passed since the last download
+        """
+
+        if checked_at is None:
+            return True
+
+        day = day if day else date.today()
+        start_date = datetime.strptime(str(start_date)[:10], "%Y-%m-%d").date()
+        checked_day = datetime.strptime(str(checked_at)[:10], "%Y-%m-%d").date()
+        return (day - checked_day).days >= RefreshPolicy.get_interval(start_date, day)
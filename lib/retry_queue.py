@@ -0,0 +1,125 @@
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Optional
+
+from lib.constants import TOO_LARGE_STATUS, NOT_HTML_STATUS
+
+
+class RetryQueue:
+    """ OOP persistent queue of failed downloads of events to retry - each failure is classified
+    and retried after an exponential backoff until the attempt limit of its class is reached. """
+
+    TIMEOUT = "timeout"
+    DNS = "dns"
+    CONNECTION = "connection"
+    SERVER_ERROR = "5xx"
+    CLIENT_ERROR = "4xx"
+    TOO_LARGE = "too_large"
+    NOT_HTML = "not_html"
+
+    # error class: (maximal number of attempts, backoff after the first attempt in seconds)
+    POLICIES = {
+        TIMEOUT: (5, 3600),
+        DNS: (3, 6 * 3600),
+        CONNECTION: (5, 3600),
+        SERVER_ERROR: (5, 3600),
+        CLIENT_ERROR: (2, 24 * 3600),
+        TOO_LARGE: (1, 0),
+        NOT_HTML: (1, 0)
+    }
+    MAX_BACKOFF = 7 * 24 * 3600
+
+    # statuses of responses which are rather temporary although they're not server errors
+    TRANSIENT_STATUSES = ["408", "429"]
+    TIMEOUT_EXCEPTIONS = ["Timeout", "ConnectTimeout", "ReadTimeout", "timeout"]
+    DNS_ERROR_MESSAGES = ["NameResolutionError", "Name or service not known", "nodename nor servname",
+                          "getaddrinfo failed", "Temporary failure in name resolution", "No address associated"]
+
+    @staticmethod
+    def classify(result: dict) -> Optional[str]:
+        """ Classifies a failure of a download.
+
+        :param result: a result of the download (see utils.fetch_html_content)
+        :return: a class of the failure (one of RetryQueue.POLICIES); None, if the download didn't fail
+        """
+
+        if result.get('html_file_path', None) is not None or result.get('content', None) is not None:
+            return None
+        if not result.get('is_modified', True):
+            # the page hasn't changed since its previous download, which may not have been archived
+            return None
+
+        status = result['status']
+        if status is None:
+            return RetryQueue.CONNECTION
+        if status == TOO_LARGE_STATUS:
+            return RetryQueue.TOO_LARGE
+        if status == NOT_HTML_STATUS:
+            return RetryQueue.NOT_HTML
+        if status.isdigit():
+            if status.startswith("5") or status in RetryQueue.TRANSIENT_STATUSES:
+                return RetryQueue.SERVER_ERROR
+            return RetryQueue.CLIENT_ERROR
+        if status in RetryQueue.TIMEOUT_EXCEPTIONS:
+            return RetryQueue.TIMEOUT
+
+        error = result.get('error', None) or ""
+        if any(message in error for message in RetryQueue.DNS_ERROR_MESSAGES):
+            return RetryQueue.DNS
+        return RetryQueue.CONNECTION
+
+    @staticmethod
+    def get_backoff(error_class: str, attempts: int) -> Optional[timedelta]:
+        """ Gets a time to wait before the next attempt.
+
+        :param error_class: a class of the last failure
+        :param attempts: a number of the attempts made so far
+        :return: the time to wait; None, if no attempt is left
+        """
+
+        max_attempts, backoff = RetryQueue.POLICIES[error_class]
+        if attempts >= max_attempts:
+            return None
+        return timedelta(seconds=min(backoff * 2 ** (attempts - 1), RetryQueue.MAX_BACKOFF))
+
+    @staticmethod
+    def record_failure(connection: sqlite3.Connection, event_url_id: int, error_class: str, status: str,
+                       failed_at: datetime) -> bool:
+        """ Enqueues the failed event's download or schedules its next attempt.
+
+        :param connection: a connection to the database
+        :param event_url_id: an ID of the event's URL
+        :param error_class: a class of the failure
+        :param status: a status of the failed download
+        :param failed_at: a time of the failure
+        :return: True, if the download will be retried
+        """
+
+        query = '''
+                    SELECT attempts
+                    FROM event_retry
+                    WHERE event_url_id = ?
+                '''
+        row = connection.execute(query, (event_url_id,)).fetchone()
+        attempts = (row[0] if row else 0) + 1
+
+        backoff = RetryQueue.get_backoff(error_class, attempts)
+        next_attempt_at = failed_at + backoff if backoff is not None else None
+
+        query = '''
+                    INSERT OR REPLACE INTO event_retry(event_url_id, error_class, status, attempts, next_attempt_at,
+                                                       updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                '''
+        connection.execute(query, (event_url_id, error_class, status, attempts,
+                                   "{0:%Y-%m-%d %H:%M:%S}".format(next_attempt_at) if next_attempt_at else None,
+                                   "{0:%Y-%m-%d %H:%M:%S}".format(failed_at)))
+        return next_attempt_at is not None
+
+    @staticmethod
+    def record_success(connection: sqlite3.Connection, event_url_id: int) -> None:
+        query = '''
+                    DELETE FROM event_retry
+                    WHERE event_url_id = ?
+                '''
+        connection.execute(query, (event_url_id,))
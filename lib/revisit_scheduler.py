@@ -0,0 +1,98 @@
+import sqlite3
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+
+class RevisitScheduler:
+    """ OOP scheduler of calendars' downloads - each calendar is revisited after an interval inverse to its change
+    rate estimated from its snapshots of the last HISTORY_DAYS: how often they brought new event URLs and,
+    with a lower weight, how often only their content changed (a not modified snapshot keeps the previous path).
+    Fast-changing calendars are downloaded daily, dormant ones are backed off up to MAX_INTERVAL days. """
+
+    HISTORY_DAYS = 60
+    MIN_INTERVAL = 1
+    MAX_INTERVAL = 7
+    CONTENT_CHANGE_WEIGHT = 0.5
+
+    def __init__(self, last_visits: Dict[str, date] = None, intervals: Dict[str, int] = None) -> None:
+        self.last_visits = last_visits if last_visits else {}
+        self.intervals = intervals if intervals else {}
+
+    @staticmethod
+    def load(connection: sqlite3.Connection) -> 'RevisitScheduler':
+        """ Creates a scheduler from the history of the calendars' snapshots.
+
+        :param connection: a connection to the database
+        :return: the scheduler
+        """
+
+        query = '''
+                    SELECT url, html_file_path, new_event_url_count, downloaded_at
+                    FROM calendar
+                    WHERE date(downloaded_at) > date('now', '-{} day')
+                    ORDER BY url, downloaded_at
+                '''.format(RevisitScheduler.HISTORY_DAYS)
+        snapshots_per_url = defaultdict(list)
+        for url, html_file_path, new_event_url_count, downloaded_at in connection.execute(query).fetchall():
+            snapshots_per_url[url].append((html_file_path, new_event_url_count,
+                                           datetime.strptime(str(downloaded_at)[:10], "%Y-%m-%d").date()))
+
+        last_visits = {url: snapshots[-1][2] for url, snapshots in snapshots_per_url.items()}
+        intervals = {url: RevisitScheduler.get_interval(snapshots) for url, snapshots in snapshots_per_url.items()}
+        return RevisitScheduler(last_visits, intervals)
+
+    @staticmethod
+    def get_interval(snapshots: List[tuple]) -> int:
+        """ Estimates a number of days after which the calendar should be revisited.
+
+        :param snapshots: a list of tuples (file path, number of new event URLs, day of the download) ordered by time
+        :return: the number of days
+        """
+
+        observed_days = (snapshots[-1][2] - snapshots[0][2]).days
+        if len(snapshots) < 2 or observed_days == 0:
+            return RevisitScheduler.MIN_INTERVAL
+
+        changes = 0.0
+        for previous_snapshot, snapshot in zip(snapshots, snapshots[1:]):
+            html_file_path, new_event_url_count, _ = snapshot
+            if new_event_url_count:
+                changes += 1
+            elif html_file_path != previous_snapshot[0]:
+                changes += RevisitScheduler.CONTENT_CHANGE_WEIGHT
+
+        if changes == 0:
+            return RevisitScheduler.MAX_INTERVAL
+        return max(RevisitScheduler.MIN_INTERVAL, min(RevisitScheduler.MAX_INTERVAL, round(observed_days / changes)))
+
+    def get_next_visit(self, url: str) -> Optional[date]:
+        if url not in self.last_visits:
+            return None
+        return self.last_visits[url] + timedelta(days=self.intervals[url])
+
+    def is_due(self, url: str, day: date = None) -> bool:
+        """ Checks whether the calendar should be downloaded.
+
+        :param url: an URL address of the calendar
+        :param day: a day of the download; if None, today
+        :return: True, if the calendar was never downloaded or its interval since the last download has passed
+        """
+
+        next_visit = self.get_next_visit(url)
+        return next_visit is None or next_visit <= (day if day else date.today())
+
+    def store(self, connection: sqlite3.Connection) -> None:
+        """ Stores the schedule of the calendars (shown by the crawler's status).
+
+        :param connection: a connection to the database
+        """
+
+        query = '''
+                    INSERT OR REPLACE INTO calendar_revisit(url, interval_days, next_visit_at, updated_at)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                '''
+        values = [(url, self.intervals[url], "{0:%Y-%m-%d}".format(self.get_next_visit(url)))
+                  for url in self.last_visits]
+        connection.executemany(query, values)
+        connection.commit()
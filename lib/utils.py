@@ -1,18 +1,31 @@
+import codecs
+import hashlib
 import json
 import os
+import re
 import sqlite3
 import sys
+import tempfile
+import time
 import urllib.parse as urllib
-from typing import Union, Optional, List
+from typing import BinaryIO, Union, Optional, List, Tuple
 
 import requests
 import urllib3
 
-from lib.constants import DATABASE_PATH, INPUT_SITES_BASE_FILE_PATH
+from lib.base_registry import BaseRegistry
+from lib.constants import DATABASE_PATH, DATABASE_TIMEOUT, INPUT_SITES_BASE_FILE_PATH, MAX_CONTENT_SIZE, \
+    HTML_CONTENT_TYPES, TOO_LARGE_STATUS, NOT_HTML_STATUS
+from lib.html_codec import HtmlCodec
 from lib.logger import set_up_script_logger
 
 LOGGER = set_up_script_logger(__name__)
 
+CONTENT_CHUNK_SIZE = 64 * 1024
+CONTENT_SPOOL_SIZE = 1024 * 1024
+CHARSET_REGEX = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+META_CHARSET_REGEX = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+
 
 def create_connection() -> sqlite3.Connection:
     """ Creates SQLite3 Connection to the database.
@@ -21,7 +34,7 @@ def create_connection() -> sqlite3.Connection:
     """
 
     try:
-        connection = sqlite3.connect(DATABASE_PATH)
+        connection = sqlite3.connect(DATABASE_PATH, timeout=DATABASE_TIMEOUT)
         return connection
 
     except sqlite3.Error as e:
@@ -44,62 +57,33 @@ def generate_domain_name(url: str) -> str:
 
 def load_base() -> List[dict]:
     """ Loads a base file with input websites' basic information.
+    The file is loaded only once per process (and again only if it changes), see lib.base_registry.
 
     :return: a list of dictionaries with input website's information
     """
 
-    with open(INPUT_SITES_BASE_FILE_PATH, 'r') as base_file:
-        return json.load(base_file)
-
-
-def _get_base_by(attr: str, value: str = None) -> List[dict]:
-    """ Gets base information for the specified value of the specified attribute.
-
-    :param attr: a key to search by
-    :param value: a value for the key;
-                  if None, fetches dictionary containing the key
-    :return: a list of dictionaries with the base
-    """
-
-    result = []
-    for obj in load_base():
-        if value is None:
-            if attr in obj:
-                result.append(obj)
-        else:
-            attr_value = obj.get(attr, None)
-            if attr_value is not None and (attr_value == value or value in attr_value):
-                result.append(obj)
-    return result
+    return list(BaseRegistry.get().base)
 
 
 def get_active_base() -> List[dict]:
     """ Gets base information of active calendars (containing 'url' key). """
 
-    return _get_base_by('url')
+    return BaseRegistry.get().get_with_key('url')
 
 
 def get_base_with_default_gps() -> List[dict]:
     """ Gets base information of calendars with default GPS (containing 'default_gps' key). """
 
-    return _get_base_by("default_gps")
+    return BaseRegistry.get().get_with_key("default_gps")
 
 
 def get_base_with_default_location() -> List[dict]:
     """ Gets base information of calendars with default location (containing 'default_location' key). """
 
-    return _get_base_by("default_location")
-
+    return BaseRegistry.get().get_with_key("default_location")
 
-def get_base_by_domain(value: str) -> Optional[dict]:
-    """ Gets base information of a calendar with the specified domain string.
-
-    :param value: a calendar's domain string
-    :return: a dictionary with the calendar's base;
-             None, if the specified domain is incorrect or not unique
-    """
 
-    base_list = _get_base_by("domain", value)
+def _get_unique_base(base_list: List[dict], value: str) -> Optional[dict]:
     if len(base_list) == 0:
         return None
     elif len(base_list) == 1:
@@ -110,37 +94,48 @@ def get_base_by_domain(value: str) -> Optional[dict]:
         raise Exception(exception_msg)
 
 
+def get_base_by_domain(value: str) -> Optional[dict]:
+    """ Gets base information of a calendar with the specified domain string.
+
+    :param value: a calendar's domain string
+    :return: a dictionary with the calendar's base;
+             None, if the specified domain is incorrect or not unique
+    """
+
+    return _get_unique_base(BaseRegistry.get().get_by_domain(value), value)
+
+
 def get_base_by_url(value: str) -> Optional[dict]:
     """ Gets base information of a calendar with the specified URL address.
 
-    :param value: a calendar's URL address
+    :param value: a calendar's URL address (an active or an old one)
     :return: a dictionary with the calendar's base;
              None, if the specified URL is incorrect or not unique
     """
 
-    base_list = _get_base_by("url", value)
-    if len(base_list) == 0:
-        base_list = _get_base_by("old_urls", value)
+    return _get_unique_base(BaseRegistry.get().get_by_url(value), value)
 
-    if len(base_list) == 0:
-        return None
-    elif len(base_list) == 1:
-        return base_list[0]
-    else:
-        exception_msg = "Value wasn't correctly specified or is not unique: {}".format(value)
-        LOGGER.critical(exception_msg)
-        raise Exception(exception_msg)
+
+def get_base_by_parser(value: str) -> List[dict]:
+    """ Gets base information of calendars processed by the specified parser.
+
+    :param value: a name of a parser's template
+    :return: a list of dictionaries with the calendars' bases
+    """
+
+    return BaseRegistry.get().get_by_parser(value)
 
 
 def get_base_dict_per_url(base: list = None) -> dict:
     """ Gets base information of input calendars in a form of dictionary with their URLs as keys.
 
-    :param base: a list of dictionaries to use as a base
+    :param base: a list of dictionaries to use as a base;
+                 if None, the input websites' base
     :return: a dictionary with the calendars' bases
     """
 
     if base is None:
-        base = load_base()
+        return BaseRegistry.get().get_dict_per_url()
 
     base_dict = {}
     for calendar_base in base:
@@ -155,43 +150,180 @@ def get_base_dict_per_url(base: list = None) -> dict:
 
 
 def download_html_content(url: str, html_file_path: str, encoding: str = None, verify: bool = True,
-                          dry_run: bool = False) -> str:
-    """ Downloads an HTML content from the specified URL to the specified file path.
+                          dry_run: bool = False, session: requests.Session = None,
+                          timeout: Union[float, Tuple[float, float]] = 30, max_size: int = MAX_CONTENT_SIZE) -> str:
+    """ Downloads an HTML content from the specified URL to the specified file path (as the bytes received).
 
     :param url: an URL address from where an HTML will be downloaded
-    :param html_file_path: a path for a file to be created
+    :param html_file_path: a path for a file to be created (compressed by the codec of its extension, see HtmlCodec)
     :param encoding: a desired encoding for the request specified in the base file
     :param verify: a boolean to determine if a request to the URL should verify a website's certificate
     :param dry_run: a flag that determines whether to download a file or just to check URL response
+    :param session: a session to reuse pooled connections of; if None, a new connection is opened
+    :param timeout: a timeout of the request in seconds or a tuple of (connect, read) timeouts
+    :param max_size: a maximal size of the content in bytes
     :return: a result of the download process (request's status code)
     """
 
-    try:
-        if not verify:
-            urllib3.disable_warnings()
+    result = fetch_html_content(url, encoding, verify, session, timeout, max_size=max_size)
+    if result['content'] is not None:
+        with result['content'] as content_file:
+            if not dry_run:
+                HtmlCodec.write(html_file_path, content_file)
+    return result['status']
 
-        r = requests.get(url, timeout=30, verify=verify, allow_redirects=True)
 
-        if len(r.history) > 1:
-            LOGGER.warning("URL redirected: [{}]".format(", ".join([redirected_r.url for redirected_r in r.history])))
+def fetch_html_content(url: str, encoding: str = None, verify: bool = True, session: requests.Session = None,
+                       timeout: Union[float, Tuple[float, float]] = 30, cached: dict = None,
+                       max_size: int = MAX_CONTENT_SIZE) -> dict:
+    """ Fetches an HTML content from the specified URL unless it hasn't changed since its previous snapshot.
+    The content is streamed as the bytes received into a temporary file, which stays in memory only while it's small,
+    and its download is stopped as soon as it exceeds the maximal size. Its encoding is resolved from the first chunk
+    (see resolve_encoding), so the content is never decoded.
 
-        if encoding is not None:
-            r.encoding = encoding
+    :param url: an URL address from where an HTML will be downloaded
+    :param encoding: a desired encoding for the request specified in the base file
+    :param verify: a boolean to determine if a request to the URL should verify a website's certificate
+    :param session: a session to reuse pooled connections of; if None, a new connection is opened
+    :param timeout: a timeout of the request in seconds or a tuple of (connect, read) timeouts
+    :param cached: 'etag', 'last_modified', 'content_hash' and 'encoding' of the previous snapshot
+                   (see lib.http_cache)
+    :param max_size: a maximal size of the content in bytes
+    :return: a dictionary with a 'status' (request's status code, exception's name, TOO_LARGE_STATUS
+             or NOT_HTML_STATUS, if the response has a Content-Type out of HTML_CONTENT_TYPES), 'etag',
+             'last_modified', 'is_modified' flag (False, if the previous snapshot can be reused), 'error' message
+             of an exception, if the page was downloaded, its 'content_hash', 'encoding' and, if the page was
+             modified, its 'content' (a binary file object to be closed by the caller) and telemetry of the request:
+             'response_time' and 'first_byte_time' (till the headers of the final response) in seconds, 'bytes'
+             received of the final response's body, 'redirect_count' and 'final_url'
+    """
 
-        if not dry_run and r.status_code == 200:
-            with open(html_file_path, 'w', encoding="utf-8") as f:
-                f.write(r.text)
+    result = {'status': None, 'etag': None, 'last_modified': None, 'content': None, 'content_hash': None,
+              'encoding': None, 'is_modified': True, 'error': None, 'response_time': None, 'first_byte_time': None,
+              'bytes': 0, 'redirect_count': 0, 'final_url': None}
+    headers = {}
+    if cached:
+        if cached.get('etag', None):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified', None):
+            headers['If-Modified-Since'] = cached['last_modified']
+
+    start = time.perf_counter()
+    try:
+        if not verify:
+            urllib3.disable_warnings()
 
-        result = str(r.status_code)
+        with (session if session is not None else requests).get(url, timeout=timeout, verify=verify,
+                                                                 allow_redirects=True, headers=headers,
+                                                                 stream=True) as r:
+            result['first_byte_time'] = time.perf_counter() - start
+            result['redirect_count'] = len(r.history)
+            result['final_url'] = r.url
+            if len(r.history) > 1:
+                LOGGER.warning("URL redirected: [{}]".format(
+                    ", ".join([redirected_r.url for redirected_r in r.history])))
+
+            result['status'] = str(r.status_code)
+            result['etag'] = r.headers.get('ETag', None)
+            result['last_modified'] = r.headers.get('Last-Modified', None)
+
+            if r.status_code == 304 and cached:
+                result['content_hash'] = cached.get('content_hash', None)
+                result['encoding'] = cached.get('encoding', None)
+                result['is_modified'] = False
+
+            elif r.status_code == 200:
+                content_type = r.headers.get('Content-Type', None)
+                content_length = r.headers.get('Content-Length', None)
+                if content_type and content_type.split(';')[0].strip().lower() not in HTML_CONTENT_TYPES:
+                    result['status'] = NOT_HTML_STATUS
+                    result['error'] = "Content-Type: {}".format(content_type)
+                elif content_length and content_length.isdigit() and int(content_length) > max_size:
+                    result['status'] = TOO_LARGE_STATUS
+                    result['error'] = "Content-Length: {}".format(content_length)
+                else:
+                    content_file, result['content_hash'], result['encoding'] = _stream_content(r, encoding, max_size)
+                    if content_file is None:
+                        result['status'] = TOO_LARGE_STATUS
+                        result['error'] = "Content exceeded {} bytes".format(max_size)
+                    elif not cached or result['content_hash'] != cached.get('content_hash', None):
+                        result['content'] = content_file
+                    else:
+                        content_file.close()
+                        result['is_modified'] = False
+
+            if result['status'] in [TOO_LARGE_STATUS, NOT_HTML_STATUS]:
+                LOGGER.error("Unsupported content of '{}': {}".format(url, result['error']))
+            result['bytes'] = r.raw.tell()
 
     except Exception as e:
-        result = type(e).__name__
+        result['status'] = type(e).__name__
         error_msg = getattr(e, 'message', repr(e))
+        result['error'] = error_msg
         LOGGER.error("Exception: {}".format(error_msg))
 
+    result['response_time'] = time.perf_counter() - start
     return result
 
 
+def _stream_content(r: requests.Response, encoding: Optional[str],
+                    max_size: int) -> Tuple[Optional[BinaryIO], Optional[str], Optional[str]]:
+    content_file = tempfile.SpooledTemporaryFile(max_size=CONTENT_SPOOL_SIZE)
+    content_hash = hashlib.sha256()
+    content_size = 0
+
+    for chunk in r.iter_content(chunk_size=CONTENT_CHUNK_SIZE):
+        content_size += len(chunk)
+        if content_size > max_size:
+            content_file.close()
+            return None, None, None
+
+        if content_size == len(chunk):
+            encoding = resolve_encoding(chunk, r.headers.get('Content-Type', None), encoding)
+        content_hash.update(chunk)
+        content_file.write(chunk)
+
+    content_file.seek(0)
+    return content_file, content_hash.hexdigest(), encoding
+
+
+def resolve_encoding(first_chunk: bytes, content_type: str = None, encoding: str = None) -> str:
+    """ Resolves an encoding of an HTML content cheaply - without decoding it - in this order: the specified one,
+    a charset of the Content-Type header, a charset of the <meta> tag at the beginning of the content, UTF-8,
+    if the beginning is valid UTF-8, and a guess of the charset from the beginning.
+
+    :param first_chunk: the beginning of the content
+    :param content_type: a value of the Content-Type header
+    :param encoding: a desired encoding specified in the base file
+    :return: a Python's name of the encoding
+    """
+
+    candidates = [encoding]
+    if content_type:
+        candidates.extend(CHARSET_REGEX.findall(content_type))
+    candidates.extend([charset.decode('ascii') for charset in META_CHARSET_REGEX.findall(first_chunk)])
+    for candidate in candidates:
+        if candidate:
+            try:
+                return codecs.lookup(candidate).name
+            except LookupError:
+                continue
+
+    try:
+        first_chunk.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as e:
+        # a multi-byte character can be split by the end of the chunk
+        if e.start >= len(first_chunk) - 3 and e.reason == "unexpected end of data":
+            return "utf-8"
+
+    guessed_encoding = requests.compat.chardet.detect(first_chunk)['encoding']
+    try:
+        return codecs.lookup(guessed_encoding).name
+    except (LookupError, TypeError):
+        return "utf-8"
+
+
 def store_to_json_file(output: Union[list, dict], file_path: str) -> None:
     """ Saves the output into a json file at the specified file path.
 
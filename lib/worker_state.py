@@ -0,0 +1,38 @@
+from typing import List
+
+_STATES = {}
+
+
+def set_up(states: dict) -> None:
+    """ Stores large read-only inputs to be shared by all tasks of a worker process.
+    Used as an initializer of a multiprocessing pool, so the inputs are handed over once per worker
+    (inherited on fork) instead of being pickled into every task.
+
+    :param states: a dictionary with a namespace (usually a name of the class using it) as a key
+                   and a dictionary with its read-only inputs as a value
+    """
+
+    _STATES.update(states)
+
+
+def get(namespace: str) -> dict:
+    """ Gets read-only inputs stored for the specified namespace.
+
+    :param namespace: a namespace the inputs were stored under
+    :return: a dictionary with the read-only inputs
+    """
+
+    if namespace not in _STATES:
+        exception_msg = "Worker state '{}' wasn't set up!".format(namespace)
+        raise Exception(exception_msg)
+    return _STATES[namespace]
+
+
+def clear(namespaces: List[str]) -> None:
+    """ Removes read-only inputs stored for the specified namespaces.
+
+    :param namespaces: namespaces to remove
+    """
+
+    for namespace in namespaces:
+        _STATES.pop(namespace, None)
@@ -10,6 +10,8 @@ CREATE TABLE IF NOT EXISTS calendar
     is_deleted          INTEGER   DEFAULT 0
 );
 
+CREATE INDEX IF NOT EXISTS idx_calendar_html_file_path ON calendar (html_file_path);
+
 CREATE TABLE IF NOT EXISTS event_url
 (
     id           INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -34,6 +36,8 @@ CREATE TABLE IF NOT EXISTS event_html
     FOREIGN KEY (event_url_id) REFERENCES event_url (id)
 );
 
+CREATE INDEX IF NOT EXISTS idx_event_html_html_file_path ON event_html (html_file_path);
+
 CREATE TABLE IF NOT EXISTS event_data
 (
     id            INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -92,6 +96,94 @@ CREATE TABLE IF NOT EXISTS event_data_types
     FOREIGN KEY (event_data_id) REFERENCES event_data (id)
 );
 
+CREATE TABLE IF NOT EXISTS host_profile
+(
+    host        TEXT PRIMARY KEY,
+    concurrency REAL,
+    rate        REAL,
+    latencies   TEXT,
+    updated_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS http_cache
+(
+    url            TEXT PRIMARY KEY,
+    etag           TEXT,
+    last_modified  TEXT,
+    content_hash   TEXT,
+    html_file_path TEXT,
+    encoding       TEXT,
+    checked_at     TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_http_cache_html_file_path ON http_cache (html_file_path);
+
+CREATE TABLE IF NOT EXISTS html_blob
+(
+    html_file_path TEXT PRIMARY KEY,
+    ref_count      INTEGER   DEFAULT 0,
+    content_hash   TEXT,
+    created_at     TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_html_blob_content_hash ON html_blob (content_hash);
+
+CREATE TABLE IF NOT EXISTS event_retry
+(
+    event_url_id    INTEGER PRIMARY KEY,
+    error_class     TEXT NOT NULL,
+    status          TEXT,
+    attempts        INTEGER   DEFAULT 0,
+    next_attempt_at TIMESTAMP,
+    updated_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (event_url_id) REFERENCES event_url (id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_event_retry_next_attempt_at ON event_retry (next_attempt_at);
+
+CREATE TABLE IF NOT EXISTS calendar_revisit
+(
+    url           TEXT PRIMARY KEY,
+    interval_days INTEGER NOT NULL,
+    next_visit_at DATE,
+    updated_at    TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS circuit_breaker
+(
+    kind          TEXT NOT NULL,
+    key           TEXT NOT NULL,
+    state         TEXT NOT NULL,
+    failures      INTEGER   DEFAULT 0,
+    opens         INTEGER   DEFAULT 0,
+    next_probe_at TIMESTAMP,
+    updated_at    TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (kind, key)
+);
+
+CREATE TABLE IF NOT EXISTS download_stats
+(
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    host            TEXT,
+    url             TEXT NOT NULL,
+    calendar_url    TEXT,
+    status          TEXT,
+    response_time   REAL,
+    first_byte_time REAL,
+    bytes           INTEGER   DEFAULT 0,
+    redirect_count  INTEGER   DEFAULT 0,
+    final_url       TEXT,
+    downloaded_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_download_stats_downloaded_at ON download_stats (downloaded_at);
+
+ALTER TABLE calendar ADD COLUMN encoding TEXT;
+
+ALTER TABLE event_html ADD COLUMN encoding TEXT;
+
+ALTER TABLE event_url ADD COLUMN listing_position INTEGER;
+
 DROP VIEW IF EXISTS event_data_view;
 CREATE VIEW event_data_view AS
     SELECT c.id              AS calendar__id,
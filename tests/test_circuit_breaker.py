@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from lib.circuit_breaker import CircuitBreaker
+
+NOW = datetime(2026, 1, 1, 8, 0)
+
+
+def replay(breaker: CircuitBreaker, kind: str, steps: str) -> None:
+    """ Replays requests to a circuit at NOW: 'F' is a failed request, 'S' a successful one, 'A' asks to be allowed
+    once the circuit may be probed and 'C' gives the probe up. """
+
+    for step in steps:
+        if step == "A":
+            breaker.allow(kind, "key", breaker.circuits[(kind, "key")].next_probe_at)
+        elif step == "C":
+            breaker.cancel_probe(kind, "key")
+        else:
+            breaker.record(kind, "key", step == "F", NOW)
+
+
+@pytest.mark.parametrize("kind, steps, state, decisions", [
+    (CircuitBreaker.HOST, "", CircuitBreaker.CLOSED, [(0, CircuitBreaker.ALLOW)]),
+    (CircuitBreaker.HOST, "FFFF", CircuitBreaker.CLOSED, [(0, CircuitBreaker.ALLOW)]),
+    (CircuitBreaker.HOST, "FFFFSF", CircuitBreaker.CLOSED, [(0, CircuitBreaker.ALLOW)]),
+    (CircuitBreaker.HOST, "FFFFF", CircuitBreaker.OPEN, [(4, CircuitBreaker.REJECT), (5, CircuitBreaker.PROBE),
+                                                        (5, CircuitBreaker.WAIT)]),
+    (CircuitBreaker.CALENDAR, "FFF", CircuitBreaker.OPEN, [(19, CircuitBreaker.REJECT), (20, CircuitBreaker.PROBE)]),
+    (CircuitBreaker.HOST, "FFFFFAF", CircuitBreaker.OPEN, [(9, CircuitBreaker.REJECT), (10, CircuitBreaker.PROBE)]),
+    (CircuitBreaker.HOST, "FFFFFAS", CircuitBreaker.CLOSED, [(0, CircuitBreaker.ALLOW)]),
+    (CircuitBreaker.HOST, "FFFFFAC", CircuitBreaker.OPEN, [(5, CircuitBreaker.PROBE)]),
+])
+def test_transitions(kind, steps, state, decisions):
+    breaker = CircuitBreaker()
+
+    replay(breaker, kind, steps)
+
+    assert breaker._get_circuit(kind, "key").state == state
+    for hours, decision in decisions:
+        assert breaker.allow(kind, "key", NOW + timedelta(hours=hours)) == decision
+
+
+def test_backoff_is_bounded():
+    breaker = CircuitBreaker()
+
+    replay(breaker, CircuitBreaker.HOST, "FFFFF" + "AF" * 10)
+
+    assert breaker.circuits[(CircuitBreaker.HOST, "key")].next_probe_at == \
+           NOW + timedelta(seconds=CircuitBreaker.MAX_BACKOFF)
+
+
+@pytest.mark.parametrize("status, error, is_host_failure", [
+    ("ReadTimeout", None, True),
+    ("ConnectionError", "Connection refused", True),
+    ("503", None, True),
+    ("404", None, False),
+    ("NotHtml", None, False),
+])
+def test_is_host_failure(status, error, is_host_failure):
+    result = {'status': status, 'error': error, 'html_file_path': None, 'content': None, 'is_modified': True}
+
+    assert CircuitBreaker.is_host_failure(result) == is_host_failure
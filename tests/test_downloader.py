@@ -0,0 +1,153 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from lib.downloader import Downloader
+from lib.host_scheduler import HostScheduler
+from lib.html_store import HtmlStore
+from lib.http_cache import HttpCache
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """ Handler of a local stand-in of calendar websites tracking the number of requests in flight. """
+
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+
+    def do_GET(self) -> None:
+        with StandInHandler.lock:
+            StandInHandler.in_flight += 1
+            StandInHandler.max_in_flight = max(StandInHandler.max_in_flight, StandInHandler.in_flight)
+        try:
+            if self.path.startswith("/slow"):
+                time.sleep(0.5)
+                self._send(200, "text/html", "<html><body>{}</body></html>".format(self.path).encode())
+            elif self.path.startswith("/page"):
+                time.sleep(0.1)
+                self._send(200, "text/html; charset=utf-8", "<html><body>{}</body></html>".format(self.path).encode())
+            elif self.path == "/document.pdf":
+                self._send(200, "application/pdf", b"%PDF-1.4")
+            elif self.path == "/big":
+                self._send(200, "text/html", b"<html>" + b"x" * 2048 + b"</html>")
+            else:
+                self._send(404, "text/html", b"<html>Not Found</html>")
+        finally:
+            with StandInHandler.lock:
+                StandInHandler.in_flight -= 1
+
+    def _send(self, status: int, content_type: str, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    # the downloaded pages are stored relatively to the working directory, so none of them is stored yet
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(HtmlStore, "_written_paths", {})
+    monkeypatch.setattr(HtmlStore, "_written_hashes", {})
+    StandInHandler.in_flight = 0
+    StandInHandler.max_in_flight = 0
+
+    http_server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    http_server.daemon_threads = True
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    yield http_server.server_address[1]
+    http_server.shutdown()
+    http_server.server_close()
+
+
+def download(downloads: list, max_in_flight: int = 8, per_host_limit: int = 2, **kwargs) -> dict:
+    downloader = Downloader(max_in_flight, HostScheduler(per_host_limit, 100.0), **kwargs)
+    return {index: result for index, result in downloader.imap([(url, None, True) for url in downloads])}
+
+
+def test_imap_yields_results_as_they_complete(server):
+    downloads = ["http://127.0.0.1:{}/slow".format(server)] + \
+                ["http://localhost:{}/page/{}".format(server, index) for index in range(3)]
+    downloader = Downloader(8, HostScheduler(4, 100.0))
+
+    indexes = [index for index, _ in downloader.imap([(url, None, True) for url in downloads])]
+
+    assert sorted(indexes) == [0, 1, 2, 3]
+    assert indexes[-1] == 0
+
+
+def test_results_refer_to_stored_pages(server):
+    downloads = ["http://127.0.0.1:{}/page/{}".format(server, index) for index in range(3)]
+
+    results = download(downloads, keep_content=True)
+
+    for index, url in enumerate(downloads):
+        assert results[index]['status'] == "200"
+        assert results[index]['encoding'] == "utf-8"
+        assert results[index]['content'] == "<html><body>/page/{}</body></html>".format(index).encode()
+        assert HtmlStore.exists(results[index]['html_file_path'])
+        with HtmlStore.open(results[index]['html_file_path']) as html_file:
+            assert html_file.read() == results[index]['content']
+
+
+def test_per_host_limit(server):
+    downloads = ["http://127.0.0.1:{}/page/{}".format(server, index) for index in range(6)]
+
+    results = download(downloads, per_host_limit=1)
+
+    assert all(result['status'] == "200" for result in results.values())
+    assert StandInHandler.max_in_flight == 1
+
+
+def test_global_in_flight_limit(server):
+    downloads = ["http://{}:{}/page/{}".format(host, server, index)
+                 for index in range(4) for host in ["127.0.0.1", "localhost"]]
+
+    results = download(downloads, max_in_flight=1)
+
+    assert all(result['status'] == "200" for result in results.values())
+    assert StandInHandler.max_in_flight == 1
+
+
+def test_error_results(server):
+    downloads = ["http://127.0.0.1:{}/missing".format(server),
+                 "http://127.0.0.1:{}/document.pdf".format(server),
+                 "http://127.0.0.1:{}/big".format(server),
+                 "http://127.0.0.1:1/unreachable"]
+
+    results = download(downloads, max_content_size=1024)
+
+    assert [results[index]['status'] for index in range(len(downloads))] == \
+           ["404", "NotHtml", "TooLarge", "ConnectionError"]
+    assert all(result['html_file_path'] is None for result in results.values())
+    assert results[3]['error'] is not None
+
+
+def test_deadline_skips_remaining_downloads(server):
+    downloads = ["http://127.0.0.1:{}/page/{}".format(server, index) for index in range(3)]
+    downloader = Downloader(8, HostScheduler(1, 100.0))
+
+    results = dict(downloader.imap([(url, None, True) for url in downloads], deadline=time.monotonic() - 1))
+
+    assert all(result['is_skipped'] and result['status'] == Downloader.DEADLINE_STATUS
+               for result in results.values())
+    assert StandInHandler.max_in_flight == 0
+
+
+def test_unarchived_page_is_recognized_as_not_modified(server):
+    downloads = [("http://127.0.0.1:{}/page/{}".format(server, index), None, True) for index in range(2)]
+    cache = HttpCache()
+
+    first_results = dict(Downloader(8, HostScheduler(2, 100.0), cache, archive=False).imap(downloads))
+    cache.entries["http://127.0.0.1:{}/page/1".format(server)]['content_hash'] = "changed"
+    second_results = dict(Downloader(8, HostScheduler(2, 100.0), cache).imap(downloads))
+
+    assert all(result['is_modified'] and result['html_file_path'] is None for result in first_results.values())
+    assert not second_results[0]['is_modified'] and second_results[0]['html_file_path'] is None
+    assert second_results[1]['is_modified'] and HtmlStore.exists(second_results[1]['html_file_path'])
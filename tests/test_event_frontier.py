@@ -0,0 +1,33 @@
+import pytest
+
+from lib.event_frontier import EventFrontier
+
+
+@pytest.mark.parametrize("event_url_id, calendar_url, position, priority", [
+    (1, "https://productive.cz", 0, 1.0),
+    (1, "https://productive.cz", 25, 0.7),
+    (1, "https://productive.cz", EventFrontier.LISTING_DEPTH, 0.4),
+    (1, "https://productive.cz", 2 * EventFrontier.LISTING_DEPTH, 0.4),
+    (1, "https://barren.cz", 0, 0.6),
+    (1, "https://unknown.cz", 0, 0.8),
+    (2, "https://productive.cz", 0, 0.5),
+])
+def test_get_priority(event_url_id, calendar_url, position, priority):
+    frontier = EventFrontier({"https://productive.cz": 1.0, "https://barren.cz": 0.0}, {2: 1})
+
+    assert frontier.get_priority(event_url_id, calendar_url, position) == pytest.approx(priority)
+
+
+@pytest.mark.parametrize("listing_positions, order", [
+    (None, [1, 2, 3, 4]),
+    ({1: 40, 2: 0, 3: None, 4: None}, [2, 3, 4, 1]),
+    ({1: 0, 2: 1, 3: 40, 4: 0}, [1, 2, 4, 3]),
+])
+def test_prioritize(listing_positions, order):
+    frontier = EventFrontier({"https://productive.cz": 1.0, "https://barren.cz": 0.0})
+    events = [(4, "https://barren.cz/event/4", "https://barren.cz"),
+              (3, "https://productive.cz/event/3", "https://productive.cz"),
+              (2, "https://productive.cz/event/2", "https://productive.cz"),
+              (1, "https://productive.cz/event/1", "https://productive.cz")]
+
+    assert [event[0] for event in frontier.prioritize(events, listing_positions)] == order
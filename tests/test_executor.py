@@ -0,0 +1,28 @@
+import time
+
+import pytest
+
+from lib.executor import Executor
+
+
+def sleep_and_return(input_tuple: tuple) -> int:
+    index, = input_tuple
+    # the first tasks take the longest, so they complete last
+    time.sleep(0.01 * (10 - index))
+    return index
+
+
+@pytest.mark.parametrize("mode", [Executor.PROCESS, Executor.THREAD, Executor.INLINE])
+def test_map_keeps_order_of_inputs(mode):
+    input_tuples = [(index,) for index in range(10)]
+
+    assert Executor(mode, workers=4, inline_threshold=0).map(sleep_and_return, input_tuples) == list(range(10))
+
+
+def test_imap_yields_results_as_they_complete():
+    input_tuples = [(index,) for index in range(10)]
+
+    results = list(Executor(Executor.THREAD, workers=10, inline_threshold=0).imap(sleep_and_return, input_tuples))
+
+    assert sorted(results) == list(range(10))
+    assert results[-1] == 0
@@ -0,0 +1,60 @@
+import pytest
+
+from lib.constants import TOO_LARGE_STATUS
+from lib.host_scheduler import HostScheduler, HostState
+
+
+@pytest.mark.parametrize("result, concurrency, rate", [
+    ("200", 2.5, 1.1),
+    ("404", 2.5, 1.1),
+    (TOO_LARGE_STATUS, 2.5, 1.1),
+    ("429", 1.0, 0.5),
+    ("503", 1.0, 0.5),
+    ("500", 1.0, 1.0),
+    ("ConnectionError", 1.0, 1.0),
+])
+def test_adapt_to_result(result, concurrency, rate):
+    scheduler = HostScheduler(4, 5.0)
+    state = HostState("example.com", 2.0, 1.0)
+
+    scheduler._adapt(state, 0.1, result)
+
+    assert state.concurrency == pytest.approx(concurrency)
+    assert state.rate == pytest.approx(rate)
+    assert state.is_updated
+
+
+@pytest.mark.parametrize("latency, concurrency", [
+    (0.2, 2.5),
+    (1.0, 1.0),
+])
+def test_adapt_to_latency(latency, concurrency):
+    scheduler = HostScheduler(4, 5.0)
+    state = HostState("example.com", 2.0, 1.0, [0.1] * HostScheduler.MIN_LATENCY_SAMPLES)
+
+    scheduler._adapt(state, latency, "200")
+
+    assert state.concurrency == pytest.approx(concurrency)
+
+
+def test_adapt_is_bounded_by_maximums():
+    scheduler = HostScheduler(2, 1.0)
+    state = HostState("example.com", 2.0, 1.0)
+
+    scheduler._adapt(state, 0.1, "200")
+
+    assert (state.concurrency, state.rate) == (2.0, 1.0)
+
+
+@pytest.mark.parametrize("latencies, timeout", [
+    ([], HostScheduler.DEFAULT_TIMEOUT),
+    ([0.1] * (HostScheduler.MIN_LATENCY_SAMPLES - 1), HostScheduler.DEFAULT_TIMEOUT),
+    ([0.1] * HostScheduler.MIN_LATENCY_SAMPLES, HostScheduler.MIN_TIMEOUT),
+    ([2.0] * HostScheduler.MIN_LATENCY_SAMPLES, (8.0, 8.0)),
+    ([1.0] * 19 + [5.0], (4.0, 20.0)),
+    ([20.0] * HostScheduler.MIN_LATENCY_SAMPLES, HostScheduler.DEFAULT_TIMEOUT),
+])
+def test_get_timeout(latencies, timeout):
+    scheduler = HostScheduler(4, 5.0, {"example.com": HostState("example.com", 2.0, 1.0, latencies)})
+
+    assert scheduler.get_timeout("example.com") == pytest.approx(timeout)
@@ -0,0 +1,35 @@
+import json
+
+import pytest
+from lxml import etree
+
+from lib.parser import Parser
+from lib.parser_plan import ParserPlan
+
+HTML = "<html><body><div id='event'><h1>Concert</h1></div></body></html>"
+
+
+def make_parser(tmp_path, monkeypatch, parser_name: str, root_selectors: list, title_selectors: list) -> Parser:
+    monkeypatch.setattr(ParserPlan, "PARSERS_DIR_PATH", str(tmp_path))
+    metadata = {"event": {"root": {"xpath": {"selectors": root_selectors}},
+                          "title": {"xpath": {"selectors": title_selectors, "match": "FIRST"}}}}
+    with open(ParserPlan.get_file_path(parser_name), 'w') as parser_file:
+        json.dump(metadata, parser_file)
+
+    parser = Parser(parser_name)
+    parser.set_dom(etree.ElementTree(etree.HTML(HTML)))
+    return parser
+
+
+def test_invalid_data_key_selectors_are_skipped(tmp_path, monkeypatch):
+    parser = make_parser(tmp_path, monkeypatch, "invalid_title", ["//div[@id='event']"], [".//h1[", ".//h1/text()"])
+
+    assert parser.plan.get_invalid_selectors("event", "title") == [".//h1["]
+    assert parser._get_xpath_results("event", "title") == ["Concert"]
+
+
+def test_invalid_root_selectors_raise(tmp_path, monkeypatch):
+    parser = make_parser(tmp_path, monkeypatch, "invalid_root", ["//div[@id='event'", "//div"], [".//h1/text()"])
+
+    with pytest.raises(Exception, match="Invalid root selectors of 'event' page"):
+        parser._get_roots("event")
@@ -0,0 +1,22 @@
+from datetime import date
+
+import pytest
+
+from lib.refresh_policy import RefreshPolicy
+
+DAY = date(2026, 1, 1)
+
+
+@pytest.mark.parametrize("start_date, checked_at, is_due", [
+    ("2026-01-02", None, True),
+    ("2026-01-02", "2026-01-01 06:00:00", False),
+    ("2026-01-02", "2025-12-31 23:00:00", True),
+    ("2026-01-10", "2025-12-31 06:00:00", False),
+    ("2026-01-10", "2025-12-30 06:00:00", True),
+    ("2026-02-15", "2025-12-26 06:00:00", False),
+    ("2026-02-15", "2025-12-25 06:00:00", True),
+    ("2026-06-01", "2025-12-19 06:00:00", False),
+    ("2026-06-01", "2025-12-18 06:00:00", True),
+])
+def test_is_due(start_date, checked_at, is_due):
+    assert RefreshPolicy.is_due(start_date, checked_at, DAY) == is_due
@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+import pytest
+
+from lib.constants import NOT_HTML_STATUS, TOO_LARGE_STATUS
+from lib.retry_queue import RetryQueue
+
+
+def make_result(status: str, error: str = None, html_file_path: str = None, is_modified: bool = True) -> dict:
+    return {'status': status, 'error': error, 'html_file_path': html_file_path, 'content': None,
+            'is_modified': is_modified}
+
+
+@pytest.mark.parametrize("result, error_class", [
+    (make_result("200", html_file_path="data/html/page.html.gz"), None),
+    (make_result("304", is_modified=False), None),
+    (make_result(None), RetryQueue.CONNECTION),
+    (make_result(TOO_LARGE_STATUS), RetryQueue.TOO_LARGE),
+    (make_result(NOT_HTML_STATUS), RetryQueue.NOT_HTML),
+    (make_result("500"), RetryQueue.SERVER_ERROR),
+    (make_result("429"), RetryQueue.SERVER_ERROR),
+    (make_result("408"), RetryQueue.SERVER_ERROR),
+    (make_result("404"), RetryQueue.CLIENT_ERROR),
+    (make_result("ReadTimeout"), RetryQueue.TIMEOUT),
+    (make_result("ConnectionError", "NameResolutionError: Failed to resolve 'example.com'"), RetryQueue.DNS),
+    (make_result("ConnectionError", "Connection refused"), RetryQueue.CONNECTION),
+])
+def test_classify(result, error_class):
+    assert RetryQueue.classify(result) == error_class
+
+
+@pytest.mark.parametrize("error_class, attempts, backoff", [
+    (RetryQueue.TIMEOUT, 1, timedelta(hours=1)),
+    (RetryQueue.TIMEOUT, 2, timedelta(hours=2)),
+    (RetryQueue.SERVER_ERROR, 4, timedelta(hours=8)),
+    (RetryQueue.SERVER_ERROR, 5, None),
+    (RetryQueue.DNS, 2, timedelta(hours=12)),
+    (RetryQueue.CLIENT_ERROR, 1, timedelta(days=1)),
+    (RetryQueue.CLIENT_ERROR, 2, None),
+    (RetryQueue.TOO_LARGE, 1, None),
+    (RetryQueue.NOT_HTML, 1, None),
+])
+def test_get_backoff(error_class, attempts, backoff):
+    assert RetryQueue.get_backoff(error_class, attempts) == backoff
+
+
+def test_backoff_is_bounded(monkeypatch):
+    monkeypatch.setitem(RetryQueue.POLICIES, RetryQueue.CLIENT_ERROR, (10, 24 * 3600))
+
+    assert RetryQueue.get_backoff(RetryQueue.CLIENT_ERROR, 9) == timedelta(seconds=RetryQueue.MAX_BACKOFF)
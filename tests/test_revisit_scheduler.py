@@ -0,0 +1,43 @@
+from datetime import date, timedelta
+
+import pytest
+
+from lib.revisit_scheduler import RevisitScheduler
+
+DAY = date(2026, 1, 1)
+
+
+def make_snapshots(changes: list) -> list:
+    """ Makes daily snapshots of a calendar: 'N' brings new event URLs, 'C' only changes the content,
+    '-' is not modified (keeps the previous snapshot). """
+
+    snapshots = [("page_0", 0, DAY)]
+    for day, change in enumerate(changes, start=1):
+        html_file_path = snapshots[-1][0] if change == "-" else "page_{}".format(day)
+        snapshots.append((html_file_path, 1 if change == "N" else 0, DAY + timedelta(days=day)))
+    return snapshots
+
+
+@pytest.mark.parametrize("snapshots, interval", [
+    ([("page_0", 0, DAY)], RevisitScheduler.MIN_INTERVAL),
+    ([("page_0", 0, DAY), ("page_1", 1, DAY)], RevisitScheduler.MIN_INTERVAL),
+    (make_snapshots("NNNN"), 1),
+    (make_snapshots("-N-N-N"), 2),
+    (make_snapshots("CCCC"), 2),
+    (make_snapshots("---N---N"), 4),
+    (make_snapshots("------------N"), RevisitScheduler.MAX_INTERVAL),
+    (make_snapshots("--------"), RevisitScheduler.MAX_INTERVAL),
+])
+def test_get_interval(snapshots, interval):
+    assert RevisitScheduler.get_interval(snapshots) == interval
+
+
+@pytest.mark.parametrize("url, day, is_due", [
+    ("https://unknown.cz", DAY, True),
+    ("https://calendar.cz", DAY + timedelta(days=2), False),
+    ("https://calendar.cz", DAY + timedelta(days=3), True),
+])
+def test_is_due(url, day, is_due):
+    scheduler = RevisitScheduler({"https://calendar.cz": DAY}, {"https://calendar.cz": 3})
+
+    assert scheduler.is_due(url, day) == is_due
@@ -299,8 +299,139 @@ function initializeFailingCalendarsTable() {
     });
 }
 
+function initializeOpenCircuitsTable() {
+    const openCircuitsTable = $('#failures__circuits--open__table').DataTable({
+        data: GLB_OPEN_CIRCUITS,
+        columns: [
+            {data: null},
+            {data: 'kind'},
+            {data: 'key'},
+            {data: 'state'},
+            {data: 'failures'},
+            {data: 'opens'},
+            {data: 'next_probe_at'}
+        ],
+        dom: 'ltipr',
+        order: [[6, "asc"]],
+        responsive: true,
+        columnDefs: [
+            {
+                targets: 0,
+                orderable: false,
+                width: 20
+            },
+            {
+                targets: 2,
+                className: "shorten-cell",
+                orderable: true,
+                render: function (data, type, row) {
+                    if (row.kind === 'calendar')
+                        return `<a href="${data}" target="_blank">${data}</a>`;
+                    else
+                        return data;
+                }
+            },
+            {
+                targets: 6,
+                orderable: true,
+                defaultContent: '-'
+            }
+        ]
+    });
+
+    openCircuitsTable.on('order.dt search.dt', function () {
+        openCircuitsTable.column(0, {
+            search: 'applied',
+            order: 'applied'
+        }).nodes().each(function (cell, i) {
+            cell.innerHTML = i + 1;
+        });
+    }).draw();
+}
+
+function initializeDownloadsPerCalendarTable() {
+    const downloadsPerCalendarTable = $('#statistics__calendars--downloads__table').DataTable({
+        data: GLB_DOWNLOADS_PER_CALENDAR,
+        columns: [
+            {data: null},
+            {data: null},
+            {data: 'calendar_url'},
+            {data: 'requests_count'},
+            {data: 'failure_percentage'},
+            {data: 'redirect_count'},
+            {data: 'megabytes'},
+            {data: 'avg_response_time'},
+            {data: 'avg_first_byte_time'}
+        ],
+        dom: 'ltipr',
+        order: [[7, "desc"]],
+        responsive: true,
+        columnDefs: [
+            {
+                targets: 0,
+                className: 'details-control',
+                orderable: false,
+                width: 20,
+                defaultContent: '',
+                render: function () {
+                    return '<i class="fa fa-plus-circle" aria-hidden="true"></i>';
+                }
+            },
+            {
+                targets: 1,
+                orderable: false,
+                width: 20
+            },
+            {
+                targets: 2,
+                className: "shorten-cell",
+                orderable: true,
+                render: function (data) {
+                    return `<a href="${data}" target="_blank">${data}</a>`;
+                }
+            },
+            {
+                targets: 4,
+                orderable: true,
+                render: function (data, type) {
+                    if (type === 'display')
+                        return `${data.toFixed(0)}%`;
+                    else
+                        return data;
+                }
+            },
+            {
+                targets: [7, 8],
+                orderable: true,
+                defaultContent: '-',
+                render: function (data, type) {
+                    if (type === 'display' && data !== null)
+                        return `${data.toFixed(2)} s`;
+                    else
+                        return data;
+                }
+            }
+        ]
+    });
+
+    downloadsPerCalendarTable.on('order.dt search.dt', function () {
+        downloadsPerCalendarTable.column(1, {
+            search: 'applied',
+            order: 'applied'
+        }).nodes().each(function (cell, i) {
+            cell.innerHTML = i + 1;
+        });
+    }).draw();
+
+    $('#statistics__calendars--downloads__table tbody').on('click', 'td.details-control', function () {
+        return toggleDetails(this, downloadsPerCalendarTable);
+    });
+}
+
 function initializeCrawlerStatusTables() {
+    initializeDownloadsPerCalendarTable();
     initializeFailingCalendarsTable();
+    initializeOpenCircuitsTable();
     initializeEmptyCalendarsTable();
     initializeCalendarsWithFailedEventsTable();
     initializeFailedEventsTable();
@@ -311,6 +311,70 @@ const localizationStrings = {
         'en': "per Parser",
         'cs': "na analyzátor"
     },
+    'crawler_table_open_circuits_title': {
+        'en': "Open Circuits",
+        'cs': "Rozpojené okruhy"
+    },
+    'crawler_table_open_circuits_details': {
+        'en': "Hosts and calendars skipped after their consecutive failures until a probe request succeeds.",
+        'cs': "Hostitelé a kalendáře vynechávané po opakovaných selháních, dokud neuspěje zkušební požadavek."
+    },
+    'crawler_table_open_circuits_column_kind': {
+        'en': "Kind",
+        'cs': "Druh"
+    },
+    'crawler_table_open_circuits_column_key': {
+        'en': "Host / Calendar URL",
+        'cs': "Hostitel / URL kalendáře"
+    },
+    'crawler_table_open_circuits_column_state': {
+        'en': "State",
+        'cs': "Stav"
+    },
+    'crawler_table_open_circuits_column_failures': {
+        'en': "Failures",
+        'cs': "Selhání"
+    },
+    'crawler_table_open_circuits_column_opens': {
+        'en': "Openings",
+        'cs': "Rozpojení"
+    },
+    'crawler_table_open_circuits_column_next_probe': {
+        'en': "Next Probe",
+        'cs': "Další zkouška"
+    },
+    'crawler_table_downloads_title': {
+        'en': "Downloads per Calendar",
+        'cs': "Stahování na kalendář"
+    },
+    'crawler_table_downloads_timespan': {
+        'en': "last week",
+        'cs': "poslední týden"
+    },
+    'crawler_table_downloads_details': {
+        'en': "Requests for the calendar and its events with their average response time and time to the first byte.",
+        'cs': "Požadavky na kalendář a jeho akce s jejich průměrnou dobou odezvy a dobou do prvního bajtu."
+    },
+    'crawler_table_downloads_column_requests': {
+        'en': "Requests",
+        'cs': "Požadavky"
+    },
+    'crawler_table_downloads_column_failures': {
+        'en': "Failures",
+        'cs': "Selhání"
+    },
+    'crawler_table_downloads_column_redirects': {
+        'en': "Redirects",
+        'cs': "Přesměrování"
+    },
+    'crawler_table_downloads_column_response': {
+        'en': "Response",
+        'cs': "Odezva"
+    },
+    'crawler_table_downloads_column_first_byte': {
+        'en': "First Byte",
+        'cs': "První bajt"
+    },
     'crawler_failures_header': {
         'en': "Failures",
         'cs': "Selhání"